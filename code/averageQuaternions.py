@@ -33,36 +33,29 @@
 #
 
 import numpy
-import numpy.matlib as npm
 
 def averageQuaternions(Q):
     """!
     Average an arbitrary number of quaternions given as rows of a matrix.
 
     The quaternions are arranged as (w,x,y,z), with w being the scalar.
-    The result will be the average quaternion of the input. Note that the signs
-    of the output quaternion can be reversed, since q and -q describe the same orientation
+    The result will be the average quaternion of the input. Since q and -q
+    describe the same orientation, the sign of the output quaternion is chosen
+    so that it points into the same hemisphere as the majority of the input.
 
-    @param Q numpy array: a Nx4 numpy matrix containing the quaternions to average in the rows.
-    @return The average of the input quaternions
+    A stack of quaternion sets with the same number of quaternions can be
+    averaged at once by passing a KxNx4 array, see 'segmentAverageQuaternions'
+    for sets of different sizes.
+
+    @param Q numpy array: a Nx4 (or KxNx4) numpy matrix containing the quaternions to average in the rows.
+    @return The average of the input quaternions (4 or Kx4)
     """
+    Q = numpy.asarray(Q, dtype=float)
     # Number of quaternions to average
-    M = Q.shape[0]
-    A = npm.zeros(shape=(4,4))
-
-    for i in range(0,M):
-        q = Q[i,:]
-        # multiply q with its transposed version q' and add A
-        A = numpy.outer(q,q) + A
-
-    # scale
-    A = (1.0/M)*A
-    # compute eigenvalues and -vectors
-    eigenValues, eigenVectors = numpy.linalg.eig(A)
-    # Sort by largest eigenvalue
-    eigenVectors = eigenVectors[:,eigenValues.argsort()[::-1]]
-    # return the real part of the largest eigenvector (has only real part)
-    return numpy.real(eigenVectors[:,0].A1)
+    M = Q.shape[-2]
+    # sum of the products of each q with its transposed version q'
+    A = numpy.matmul(numpy.swapaxes(Q, -1, -2), Q)
+    return largestEigenVector(A / M, numpy.sum(Q, axis=-2))
 
 def weightedAverageQuaternions(Q, w):
     """!
@@ -70,33 +63,53 @@ def weightedAverageQuaternions(Q, w):
     with individual weights for each quaternion.
 
     The quaternions are arranged as (w,x,y,z), with w being the scalar.
-    The result will be the average quaternion of the input. Note that the signs
-    of the output quaternion can be reversed, since q and -q describe the same orientation.
+    The result will be the average quaternion of the input. Since q and -q
+    describe the same orientation, the sign of the output quaternion is chosen
+    so that it points into the same hemisphere as the majority of the input.
     The weight vector w must be of the same length as the number of rows in the
     quaternion maxtrix Q.
 
-    @param Q numpy array: a Nx4 numpy matrix containing the quaternions to average in the rows.
-    @param w list: The list with the weight of each quaternion.
-    @return The average of the input quaternions
+    @param Q numpy array: a Nx4 (or KxNx4) numpy matrix containing the quaternions to average in the rows.
+    @param w list: The list with the weight of each quaternion (N or KxN).
+    @return The average of the input quaternions (4 or Kx4)
     """
-    # Number of quaternions to average
-    M = Q.shape[0]
-    A = npm.zeros(shape=(4,4))
-    weightSum = 0
-
-    for i in range(0,M):
-        q = Q[i,:]
-        A = w[i] * numpy.outer(q,q) + A
-        weightSum += w[i]
+    Q = numpy.asarray(Q, dtype=float)
+    w = numpy.asarray(w, dtype=float)
+    weighted = Q * w[...,None]
+    A = numpy.matmul(numpy.swapaxes(weighted, -1, -2), Q)
+    weightSum = numpy.sum(w, axis=-1)
+    return largestEigenVector(A / numpy.asarray(weightSum)[...,None,None], numpy.sum(weighted, axis=-2))
 
-    # scale
-    A = (1.0/weightSum)*A
+def segmentAverageQuaternions(Q, offsets, w=None):
+    """!
+    Average consecutive sets of quaternions of different sizes at once,
+    e.g. the rotations of all motions of a folder concatenated into one array.
 
-    # compute eigenvalues and -vectors
-    eigenValues, eigenVectors = numpy.linalg.eig(A)
+    @param Q numpy array: a Nx4 numpy matrix containing the quaternions of all sets in the rows.
+    @param offsets numpy array: The index of the first row of each set, in increasing order.
+    @param w list: The weight of each quaternion, optional
+    @return The averages of the sets as a Kx4 array
+    """
+    Q = numpy.asarray(Q, dtype=float)
+    offsets = numpy.asarray(offsets, dtype=numpy.intp)
+    if w is None:
+        w = numpy.ones(len(Q))
+    weighted = Q * numpy.asarray(w, dtype=float)[:,None]
+    # outer product of each quaternion, summed up for each set
+    A = numpy.add.reduceat(weighted[:,:,None] * Q[:,None,:], offsets, axis=0)
+    weightSum = numpy.add.reduceat(w, offsets)
+    return largestEigenVector(A / weightSum[:,None,None], numpy.add.reduceat(weighted, offsets, axis=0))
 
-    # Sort by largest eigenvalue
-    eigenVectors = eigenVectors[:,eigenValues.argsort()[::-1]]
+def largestEigenVector(A, direction):
+    """!
+    Find the eigenvector with the largest eigenvalue of symmetric 4x4 matrices.
 
-    # return the real part of the largest eigenvector (has only real part)
-    return numpy.real(eigenVectors[:,0].A1)
+    @param A numpy array: The symmetric matrix (4x4 or Kx4x4)
+    @param direction numpy array: The sign of each eigenvector is chosen to point in this direction (4 or Kx4)
+    @return The eigenvectors (4 or Kx4)
+    """
+    # eigenvalues of symmetric matrices are real and sorted in ascending order
+    eigenValues, eigenVectors = numpy.linalg.eigh(A)
+    v = eigenVectors[...,:,-1]
+    sign = numpy.where(numpy.sum(v * direction, axis=-1) < 0, -1.0, 1.0)
+    return v * numpy.asarray(sign)[...,None]
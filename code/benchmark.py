@@ -0,0 +1,263 @@
+# This file implements a benchmark of the processing pipeline with synthetic
+# motions.
+#
+# Synthetic recordings in the csv format of the controller recordings are
+# generated with a given number of frames and files. Then each stage
+# (reading, cleaning, translation, rotation, scaling, quaternion averaging,
+# HMM training and scoring) is timed on its own, together with the complete
+# normalization. The results are written as json, together with the commit
+# and the versions used, so that the results of different commits can be
+# compared.
+#
+# Run the benchmark from the code directory, e.g.:
+#
+#   python benchmark.py --frames 1000 100000 10000000 --files 1 100 10000 --output ../benchmark.json
+#
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy
+import input
+import cache
+import cleaning
+import translation
+import rotation
+import scaling
+import normalization
+import quaternion
+import learning
+from averageQuaternions import averageQuaternions
+from hmmlearn import hmm
+
+def generateMotion(frames, generator, duplicates=0.01):
+    """!
+    Create a synthetic motion, similar to a recording of a controller.
+
+    The positions follow a smooth random path, and the rotations turn
+    smoothly around a random axis. Some poses are repeated, as in the
+    recordings when the controller isn't tracked.
+
+    @param frames Int: The number of poses
+    @param generator numpy.random.Generator: The random number generator
+    @param duplicates Number: The part of the poses which repeat the previous pose, default 1%
+    @return The motion in the format | Frame | x | y | z | RotW | RotX | RotY | RotZ |
+    """
+    t = numpy.linspace(0, 1, frames)[:, None]
+    motion = numpy.empty((frames, 8))
+    motion[:, 0] = numpy.arange(frames)
+    # a few sine waves for each dimension
+    frequencies = generator.uniform(0.5, 3, (3, 3))
+    phases = generator.uniform(0, 2 * numpy.pi, (3, 3))
+    amplitudes = generator.uniform(0.05, 0.5, (3, 3))
+    motion[:, 1:4] = generator.uniform(-1, 1, 3)
+    for k in range(3):
+        motion[:, 1:4] += amplitudes[k] * numpy.sin(2 * numpy.pi * frequencies[k] * t + phases[k])
+    # rotation around an axis by a smoothly changing angle, after a random start rotation
+    axis = generator.normal(size=3)
+    axis /= numpy.linalg.norm(axis)
+    angles = generator.uniform(0.2, 1.5) * numpy.sin(2 * numpy.pi * generator.uniform(0.5, 2) * t)
+    turn = numpy.hstack((numpy.cos(angles / 2), numpy.sin(angles / 2) * axis))
+    start = generator.normal(size=4)
+    motion[:, 4:8] = quaternion.multiply(start / numpy.linalg.norm(start), turn)
+    repeated = numpy.flatnonzero(generator.random(frames - 1) < duplicates) + 1
+    motion[repeated, 1:8] = motion[repeated - 1, 1:8]
+    return motion
+
+def writeMotion(file, motion):
+    """!
+    Write a motion as a csv file in the format of the recordings.
+
+    @param file String: The path of the file
+    @param motion numpy.array: The motion
+    """
+    with open(file, 'w') as f:
+        f.write('Recording for Right controller\n')
+        f.write('Frame,PosX, PosY, PosZ, RotW, RotX, RotY, RotZ\n')
+        numpy.savetxt(f, motion, fmt=['%d'] + ['%.7g'] * 7, delimiter=',')
+
+def generateFiles(directory, count, frames, generator):
+    """!
+    Write synthetic motions into a directory.
+
+    @param directory String: The directory for the files
+    @param count Int: The number of files
+    @param frames Int: The number of poses of each motion
+    @param generator numpy.random.Generator: The random number generator
+    @return The paths of the files
+    """
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for i in range(count):
+        file = os.path.join(directory, 'motion{:05d}.csv'.format(i))
+        writeMotion(file, generateMotion(frames, generator))
+        files.append(file)
+    return files
+
+def measure(function, repeat=3, setup=None):
+    """!
+    Measure the time of a function.
+
+    @param function: The function to measure, which gets the result of 'setup' (if any)
+    @param repeat Int: The number of measurements, default 3
+    @param setup: A function preparing the argument of each measurement (not measured), optional
+    @return The minimum and the median of the times in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        if setup is not None:
+            function(argument)
+        else:
+            function()
+        times.append(time.perf_counter() - start)
+    return min(times), float(numpy.median(times))
+
+def result(benchmark, stage, frames, files, times, repeat):
+    """!
+    Create the result of a measurement.
+
+    @param benchmark String: The name of the benchmark
+    @param stage String: The name of the stage
+    @param frames Int: The number of poses processed
+    @param files Int: The number of files processed
+    @param times tuple: The minimum and median time in seconds
+    @param repeat Int: The number of measurements
+    @return A dictionary with the result
+    """
+    print('{:<8} {:<24} {:>10} frames {:>6} files {:10.4f} s'.format(benchmark, stage, frames, files, times[0]))
+    return {'benchmark': benchmark, 'stage': stage, 'frames': frames, 'files': files, 'repeat': repeat,
+        'min': times[0], 'median': times[1], 'framesPerSecond': frames / times[0] if times[0] > 0 else None}
+
+def benchmarkStages(file, repeat=3, hmmFrames=100000, states=5, mixtures=2, iterations=5):
+    """!
+    Time each stage of the pipeline for a single motion file.
+
+    @param file String: The motion file
+    @param repeat Int: The number of measurements of each stage
+    @param hmmFrames Int: The maximum number of poses for training and scoring a HMM
+    @param states Int: The number of HMM states
+    @param mixtures Int: The number of mixture components of each state
+    @param iterations Int: The number of training iterations
+    @return A list of results
+    """
+    results = []
+    motion = input.read(file)
+    frames = len(motion)
+    def stage(name, function, setup=None):
+        results.append(result('stages', name, frames, 1, measure(function, repeat, setup), repeat))
+    stage('read', lambda: input.read(file))
+    stage('clean', lambda m: cleaning.clean(m), lambda: motion.copy())
+    stage('translate', lambda m: translation.translate(m[:, 1:4], 'median'), lambda: motion.copy())
+    stage('rotate', lambda m: rotation.rotate(m[:, 1:8], 'mean'), lambda: motion.copy())
+    stage('scale', lambda m: scaling.scale(m[:, 1:4], 'largest'), lambda: motion.copy())
+    stage('averageQuaternions', lambda: averageQuaternions(motion[:, 4:8]))
+    stage('normalize', lambda: normalization.normalize(motion, 'median', 'mean', 'largest'))
+    stage('end to end', lambda: normalization.readNormalized(file, 'median', 'mean', 'largest'))
+    if frames <= hmmFrames:
+        normalized, _, _, _ = normalization.normalize(motion, 'median', 'mean', 'largest')
+        def fit():
+            model = hmm.GMMHMM(n_components=states, n_mix=mixtures, n_iter=iterations, init_params='smt')
+            return model.fit(normalized, [len(normalized)])
+        stage('hmm fit', fit)
+        model = fit()
+        stage('hmm score', lambda: learning.scoreAllModels([model], normalized))
+    return results
+
+def benchmarkFiles(files, repeat=3):
+    """!
+    Time reading and normalizing many motion files.
+
+    @param files list: The motion files
+    @param repeat Int: The number of measurements
+    @return A list of results
+    """
+    frames = sum(len(input.read(file)) for file in files)
+    results = []
+    def stage(name, function):
+        results.append(result('files', name, frames, len(files), measure(function, repeat), repeat))
+    stage('read', lambda: [input.read(file) for file in files])
+    stage('normalize each', lambda: [normalization.readNormalized(file, 'median', 'mean', 'largest') for file in files])
+    stage('normalize batch', lambda: normalization.readNormalizedBatch(files, 'median', 'mean', 'largest'))
+    return results
+
+def commit():
+    """!
+    Get the current git commit of the code.
+
+    @return The commit hash, or an empty string if it isn't available
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def run(frameCounts, fileCounts, fileFrames=300, repeat=3, hmmFrames=100000, seed=0, directory=''):
+    """!
+    Run all benchmarks with synthetic motions.
+
+    @param frameCounts list: The numbers of poses of the motions for timing the stages
+    @param fileCounts list: The numbers of files for timing reading and normalizing many files
+    @param fileFrames Int: The number of poses of each of the many files, default 300
+    @param repeat Int: The number of measurements of each stage, default 3
+    @param hmmFrames Int: The maximum number of poses for training and scoring a HMM, default 100000
+    @param seed Int: The seed of the synthetic motions, default 0
+    @param directory String: The directory for the synthetic files, default a temporary directory
+    @return A dictionary with the settings, the environment and the results
+    """
+    # the cache would hide the cost of parsing
+    cache.setCacheDirectory('')
+    temporary = directory == ''
+    if temporary:
+        directory = tempfile.mkdtemp(prefix='benchmark')
+    generator = numpy.random.default_rng(seed)
+    results = []
+    try:
+        for frames in frameCounts:
+            file, = generateFiles(os.path.join(directory, 'frames' + str(frames)), 1, frames, generator)
+            results.extend(benchmarkStages(file, repeat, hmmFrames))
+            os.remove(file)
+        for count in fileCounts:
+            files = generateFiles(os.path.join(directory, 'files' + str(count)), count, fileFrames, generator)
+            results.extend(benchmarkFiles(files, repeat))
+            for file in files:
+                os.remove(file)
+    finally:
+        if temporary:
+            shutil.rmtree(directory, ignore_errors=True)
+    return {'commit': commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'settings': {'frames': list(frameCounts), 'files': list(fileCounts), 'fileFrames': fileFrames,
+            'repeat': repeat, 'hmmFrames': hmmFrames, 'seed': seed},
+        'results': results}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the motion processing with synthetic motions')
+    parser.add_argument('--frames', type=int, nargs='*', default=[10**3, 10**4, 10**5, 10**6],
+        help='Numbers of poses of a single motion, up to 10^7')
+    parser.add_argument('--files', type=int, nargs='*', default=[1, 10, 100, 1000],
+        help='Numbers of files, up to 10^4')
+    parser.add_argument('--file-frames', type=int, default=300, help='Number of poses of each of the many files')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--hmm-frames', type=int, default=100000, help='Largest motion used for training and scoring a HMM')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--directory', default='', help='Directory for the synthetic files, default a temporary directory')
+    parser.add_argument('--output', default='../benchmark.json')
+    arguments = parser.parse_args()
+
+    report = run(arguments.frames, arguments.files, arguments.file_frames, arguments.repeat,
+        arguments.hmm_frames, arguments.seed, arguments.directory)
+    with open(arguments.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to ' + arguments.output, file=sys.stderr)
@@ -0,0 +1,144 @@
+import os
+import io
+import hashlib
+import numpy
+
+"""!
+The directory containing the cached motions, caching is disabled if empty
+"""
+cacheDirectory = ''
+
+"""!
+The maximum size of all cached motions in bytes
+"""
+cacheSize = 0
+
+"""!
+The approximate size of all cached motions in bytes
+"""
+usedSize = 0
+
+def setCacheDirectory(directory, maxSize=1024**3):
+    """!
+    Set the directory for caching parsed motions.
+
+    Motions read with 'input.read' are stored in the directory as binary
+    numpy files, and are loaded from there as long as the size and
+    modification time of the original file don't change.
+    The least recently used motions are removed when the cache grows larger
+    than the given size.
+
+    @param directory String: The directory to use, an empty string disables the cache
+    @param maxSize Int: The maximum size of the cache in bytes, default 1 GB
+    """
+    global cacheDirectory, cacheSize
+    if directory != '' and not os.path.isdir(directory):
+        os.makedirs(directory)
+    cacheDirectory = directory
+    cacheSize = maxSize
+    if directory != '':
+        evict()
+
+def entryPath(file, separator):
+    """!
+    Get the path of the cache entry for a motion file.
+
+    @param file String: The path of the motion file
+    @param separator String: The separator used to parse the file
+    @return The path of the cache entry
+    """
+    key = os.path.abspath(file) + '\n' + separator
+    return os.path.join(cacheDirectory, hashlib.sha1(key.encode()).hexdigest() + '.npz')
+
+def load(file, separator=','):
+    """!
+    Load a previously parsed motion from the cache.
+
+    Outdated entries (the size or modification time of the file changed)
+    are removed.
+
+    @param file String: The path of the motion file
+    @param separator String: The separator used to parse the file
+    @return The motion, or None if the cache is disabled or has no valid entry
+    """
+    global usedSize
+    if cacheDirectory == '':
+        return None
+    entry = entryPath(file, separator)
+    try:
+        with numpy.load(entry) as data:
+            stat = os.stat(file)
+            if int(data['size']) != stat.st_size or int(data['mtime']) != stat.st_mtime_ns:
+                usedSize -= os.path.getsize(entry)
+                os.remove(entry)
+                return None
+            motion = data['motion']
+    except (OSError, KeyError, ValueError):
+        return None
+    # mark entry as recently used
+    os.utime(entry)
+    return motion
+
+def store(file, motion, separator=','):
+    """!
+    Save a parsed motion in the cache.
+
+    Does nothing if the cache is disabled.
+
+    @param file String: The path of the motion file
+    @param motion numpy array: The parsed motion
+    @param separator String: The separator used to parse the file
+    """
+    global usedSize
+    if cacheDirectory == '':
+        return
+    stat = os.stat(file)
+    entry = entryPath(file, separator)
+    buffer = io.BytesIO()
+    numpy.savez(buffer, motion=motion, size=stat.st_size, mtime=stat.st_mtime_ns)
+    # write to a temporary file first, so that other runs never see partial entries
+    temporary = entry + '.' + str(os.getpid())
+    with open(temporary, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(temporary, entry)
+    usedSize += len(buffer.getvalue())
+    if usedSize > cacheSize:
+        evict()
+
+def evict():
+    """!
+    Remove the least recently used entries until the cache is within its size limit.
+    """
+    global usedSize
+    entries = []
+    total = 0
+    for name in os.listdir(cacheDirectory):
+        if name.endswith('.npz'):
+            path = os.path.join(cacheDirectory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total += stat.st_size
+    for _, size, path in sorted(entries):
+        if total <= cacheSize:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+    usedSize = total
+
+def clear():
+    """!
+    Remove all entries from the cache.
+    """
+    global usedSize
+    if cacheDirectory == '':
+        return
+    for name in os.listdir(cacheDirectory):
+        if name.endswith('.npz'):
+            os.remove(os.path.join(cacheDirectory, name))
+    usedSize = 0
@@ -1,17 +1,24 @@
 
 import numpy
+import instrumentation
 
 def clean(motion, correctFrames=True, threshold= 1E-7, factor=3):
     """!
     Clean a motion.
 
+    The duplicate points are removed first, and the largest part between
+    jumps is selected from the remaining points (earlier versions selected
+    the part from the original motion, so that the duplicates were kept).
+
     @param correctFrames Boolean: If the frame numbering should be corrected, defaults to True
     @param threshold Number: The distance between two points to be considered equal, default 1E-7
     @param factor Number: The threshold for detecting jumps as a multiple of the mean distance between all points, default 3
     @return The largest section of the motion without dublicate points, and the number of removed points
     """
-    out, count1 = removeDoublePoints(motion)
-    out, count2 = removeInvalidParts(motion)
+    out, count1 = removeDoublePoints(motion, correctFrames, threshold)
+    out, count2 = removeInvalidParts(out, correctFrames, factor)
+    instrumentation.count('clean.duplicates', count1)
+    instrumentation.count('clean.invalid', count2)
     return out, count1 + count2
 
 def removeDoublePoints(motion, correctFrames = True, threshold = 1E-7):
@@ -32,24 +39,13 @@ def removeDoublePoints(motion, correctFrames = True, threshold = 1E-7):
 
     @return A copy of the motion with the dublicate points (rows) removed, and the number of removed points
     """
-    outMotion = []
-    p = numpy.array([0.0, 0.0, 0.0])
-    # count number of skipped items
-    count = 0
-    for item in motion:
-        distance = numpy.sqrt((p[0]-item[1])**2 + (p[1]-item[2])**2 + (p[2]-item[3])**2)
-        if distance > 1E-7:
-            outMotion.append(item)
-            p = item[1:4]
-        else:
-            count += 1
-
-    outArray = numpy.array(outMotion)
+    # each point is compared to the last kept point, the first point to the origin
+    keep = distinctPoints(motion[:,1:4], threshold)
+    outArray = motion[keep]
     # correct frame count
     if correctFrames:
-        for i in range(0, len(outArray[:,0])):
-            outArray[i][0] = i+1
-    return outArray, count
+        outArray[:,0] = numpy.arange(1, len(outArray) + 1)
+    return outArray, len(motion) - len(outArray)
 
 def removeInvalidParts(motion, correctFrames = True, factor = 3):
     """!
@@ -68,44 +64,224 @@ def removeInvalidParts(motion, correctFrames = True, factor = 3):
 
     @return The motion with the jumps removed, and the number of dropped points
     """
-    rows = len(motion[:,0])
-    # save distances between points, calcuate mean
-    distances = []
-    p = motion[0][1:4]
-    for index, item in enumerate(motion[1:]):
-        distance = numpy.sqrt((p[0]-item[1])**2 + (p[1]-item[2])**2 + (p[2]-item[3])**2)
-        distances.append(distance)
-        p = motion[index][1:4]
-    m = numpy.mean(distances)
-
-    # check all distances for too large gaps
-    jumps = []
-    p = motion[0][1:4]
-    for index, item in enumerate(motion[1:]):
-        distance = numpy.sqrt((p[0]-item[1])**2 + (p[1]-item[2])**2 + (p[2]-item[3])**2)
-        if distance / m > factor:
-            jumps.append(index+1)
-            #print('At index ' + str(index) + ': ' + str(distance / m))
-        p = item[1:4]
-        d = distance
-
-    # pick largest part between jumps
-    jumps.append(rows)
-    #print(jumps)
-    start = 0
-    end = rows
-    prev = 0
-    m = 0
-    for item in jumps:
-        l = item - prev
-        if l > m:
-            m = l
-            start = prev
-            end = item
-        prev = item
-    outMotion = motion[start:end]
+    rows = len(motion)
+    if rows < 2:
+        return motion.copy(), 0
+    positions = motion[:,1:4]
+    # distances between consecutive points
+    distances = length(positions[1:] - positions[:-1])
+    # mean distance as reference for the jumps, which compares each point
+    # (except the second) with the point two frames earlier
+    m = (distances[0] + numpy.sum(length(positions[2:] - positions[:-2]))) / (rows - 1)
+
+    # split the motion at all too large gaps
+    jumps = numpy.flatnonzero(distances / m > factor) + 1
+    bounds = numpy.concatenate(([0], jumps, [rows]))
+    # pick largest part between jumps (the first one if there are several)
+    largest = numpy.argmax(numpy.diff(bounds))
+    start = bounds[largest]
+    end = bounds[largest + 1]
+    outMotion = motion[start:end].copy()
     # correct frame count
     if correctFrames:
-        for i in range(0, len(outMotion[:,0])):
-            outMotion[i][0] = i+1
+        outMotion[:,0] = numpy.arange(1, len(outMotion) + 1)
     return outMotion, rows - end + start
+
+def cleanBatch(motion, offsets, correctFrames=True, threshold= 1E-7, factor=3):
+    """!
+    Clean many motions at once.
+
+    The motions are concatenated in one array, with the index of the first
+    row of each motion in 'offsets'. Each motion is cleaned as with 'clean'.
+
+    @param motion numpy array: The concatenated motions
+    @param offsets numpy array: The index of the first row of each motion, in increasing order
+    @param correctFrames Boolean: If the frame numbering should be corrected, defaults to True
+    @param threshold Number: The distance between two points to be considered equal, default 1E-7
+    @param factor Number: The threshold for detecting jumps as a multiple of the mean distance between all points, default 3
+    @return The cleaned motions, the offsets of the cleaned motions, and the number of removed points of each motion
+    """
+    out, offsets, count1 = removeDoublePointsBatch(motion, offsets, correctFrames, threshold)
+    out, offsets, count2 = removeInvalidPartsBatch(out, offsets, correctFrames, factor)
+    instrumentation.count('clean.duplicates', numpy.sum(count1))
+    instrumentation.count('clean.invalid', numpy.sum(count2))
+    return out, offsets, count1 + count2
+
+def removeDoublePointsBatch(motion, offsets, correctFrames = True, threshold = 1E-7):
+    """!
+    Remove all dublicate points of many motions at once, see 'removeDoublePoints'.
+
+    @param motion numpy array: The concatenated motions, with [:,1:4] being the xyz coordinates
+    @param offsets numpy array: The index of the first row of each motion, in increasing order
+    @param correctFrames Boolean: If the frame numbering should be corrected, defaults to True
+    @param threshold Number: The distance between two points to be considered equal, default 1E-7
+
+    @return A copy of the motions with the dublicate points removed, the offsets of the
+    motions in the copy, and the number of removed points of each motion
+    """
+    offsets = numpy.asarray(offsets, dtype=numpy.intp)
+    # the first point of each motion is compared to the origin
+    keep = distinctPoints(motion[:,1:4], threshold, offsets)
+    return selectRows(motion, offsets, keep, correctFrames)
+
+def distinctPoints(positions, threshold = 1E-7, starts = (), previous = None):
+    """!
+    Find the points which differ from the last kept point before them.
+
+    The result is the same as comparing the points one by one with the last
+    kept point, so that slowly drifting points are dropped until they moved
+    away from the last kept point. All points are first compared with the
+    previous point at once, which is the last kept point unless the previous
+    point was dropped. Each run of dropped points is then checked at once
+    against the point before the run, and only the runs where this changes
+    the result (drifting points, or a point returning close to the point
+    before the run) are scanned again, with one step per kept point.
+
+    @param positions numpy array: The xyz coordinates of the points, one per row
+    @param threshold Number: The distance between two points to be considered equal, default 1E-7
+    @param starts numpy array: The index of the first point of each further motion, which is compared to the origin
+    @param previous numpy array: The last kept point before the first point, default the origin
+    @return Boolean mask of the points to keep
+    """
+    rows = len(positions)
+    if rows == 0:
+        return numpy.zeros(0, dtype=bool)
+    # anchor of the first point of each motion
+    first = numpy.zeros(rows, dtype=bool)
+    starts = numpy.asarray(starts, dtype=numpy.intp)
+    first[starts[starts < rows]] = True
+    origins = numpy.zeros((rows, 3))
+    if previous is not None and not first[0]:
+        origins[0] = previous
+    first[0] = True
+    distances = numpy.empty(rows)
+    distances[1:] = length(positions[1:] - positions[:-1])
+    distances[first] = length(positions[first] - origins[first])
+    initial = distances > threshold
+    keep = initial.copy()
+
+    # runs of dropped points within a motion, which end at the next kept point or motion
+    runStarts = numpy.flatnonzero(~initial & (first | numpy.concatenate(([True], initial[:-1]))))
+    if len(runStarts) == 0:
+        return keep
+    boundaries = numpy.append(numpy.flatnonzero(initial | first), rows)
+    runEnds = boundaries[numpy.searchsorted(boundaries, runStarts, side='right')]
+    anchors = numpy.where(first[runStarts][:,None], origins[runStarts], positions[runStarts - 1])
+    runLengths = runEnds - runStarts
+    runIndex = numpy.repeat(numpy.arange(len(runStarts)), runLengths)
+    inRuns = numpy.arange(len(runIndex)) + numpy.repeat(runStarts - numpy.cumsum(runLengths) + runLengths, runLengths)
+    # all points of a run have to be close to the point before the run ...
+    drifting = numpy.bincount(runIndex, weights=length(positions[inRuns] - anchors[runIndex]) > threshold,
+        minlength=len(runStarts)) > 0
+    # ... and the point after the run (in the same motion) far from it
+    follows = numpy.flatnonzero((runEnds < rows) & ~first[numpy.minimum(runEnds, rows - 1)])
+    drifting[follows] |= length(positions[runEnds[follows]] - anchors[follows]) <= threshold
+
+    kept = numpy.append(numpy.flatnonzero(initial), rows)
+    motionEnds = numpy.append(numpy.flatnonzero(first), rows)
+    scanned = 0
+    for run in numpy.flatnonzero(drifting):
+        if runStarts[run] < scanned:
+            # already part of the scan of an earlier run
+            continue
+        i = runStarts[run]
+        anchor = anchors[run]
+        end = motionEnds[numpy.searchsorted(motionEnds, i, side='right')]
+        while i < end:
+            # the points up to the next point which differs from its predecessor
+            last = min(kept[numpy.searchsorted(kept, i)], end - 1)
+            far = length(positions[i:last + 1] - anchor) > threshold
+            keep[i:last + 1] = False
+            if not numpy.any(far):
+                i = last + 1
+                continue
+            q = i + int(numpy.argmax(far))
+            keep[q] = True
+            anchor = positions[q]
+            i = q + 1
+            if q == last and initial[q]:
+                # the following points were compared with a kept point
+                break
+        scanned = i
+    return keep
+
+def removeInvalidPartsBatch(motion, offsets, correctFrames = True, factor = 3):
+    """!
+    Select the largest sequence of points between jumps of many motions at once,
+    see 'removeInvalidParts'.
+
+    @param motion numpy array: The concatenated motions (not modified), with [:,1:4] being the xyz coordinates
+    @param offsets numpy array: The index of the first row of each motion, in increasing order
+    @param correctFrames Boolean: If the frame numbering should be corrected, defaults to True
+    @param factor Number: The threshold for detecting jumps as a multiple of the mean distance between all points, default 3
+
+    @return The motions with the jumps removed, the offsets of the cleaned motions,
+    and the number of dropped points of each motion
+    """
+    offsets = numpy.asarray(offsets, dtype=numpy.intp)
+    rows = len(motion)
+    lengths = numpy.diff(numpy.append(offsets, rows))
+    motionIndex = numpy.repeat(numpy.arange(len(offsets)), lengths)
+    # position of each row within its motion
+    frame = numpy.arange(rows) - numpy.repeat(offsets, lengths)
+    positions = motion[:,1:4]
+
+    # distances between consecutive points of the same motion
+    distances = numpy.zeros(rows)
+    distances[1:] = length(positions[1:] - positions[:-1])
+    distances[frame == 0] = 0
+    # mean distance as reference for the jumps, see 'removeInvalidParts'
+    reference = numpy.zeros(rows)
+    reference[2:] = length(positions[2:] - positions[:-2])
+    reference[frame == 1] = distances[frame == 1]
+    reference[frame == 0] = 0
+    nonEmpty = lengths > 0
+    sums = numpy.zeros(len(offsets))
+    sums[nonEmpty] = numpy.add.reduceat(reference, offsets[nonEmpty])
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        m = sums / (lengths - 1)
+        jumps = numpy.flatnonzero((frame > 0) & (distances / m[motionIndex] > factor))
+
+    # split the motions at their start and at all jumps
+    partStarts = numpy.sort(numpy.concatenate((offsets[nonEmpty], jumps)))
+    partLengths = numpy.diff(numpy.append(partStarts, rows))
+    partMotion = motionIndex[partStarts]
+    # pick largest part of each motion (the first one if there are several)
+    order = numpy.lexsort((partStarts, -partLengths, partMotion))
+    first = numpy.ones(len(order), dtype=bool)
+    first[1:] = partMotion[order][1:] != partMotion[order][:-1]
+    selected = numpy.zeros(len(partStarts), dtype=bool)
+    selected[order[first]] = True
+    keep = numpy.repeat(selected, partLengths)
+    return selectRows(motion, offsets, keep, correctFrames)
+
+def selectRows(motion, offsets, keep, correctFrames = True):
+    """!
+    Copy the selected rows of concatenated motions.
+
+    @param motion numpy array: The concatenated motions
+    @param offsets numpy array: The index of the first row of each motion, in increasing order
+    @param keep numpy array: Boolean mask of the rows to keep
+    @param correctFrames Boolean: If the frame numbering of each motion should be corrected, defaults to True
+
+    @return The selected rows, the offsets of the motions in the selection,
+    and the number of removed rows of each motion
+    """
+    kept = numpy.concatenate(([0], numpy.cumsum(keep)))
+    newOffsets = kept[offsets]
+    lengths = numpy.diff(numpy.append(offsets, len(motion)))
+    out = motion[keep]
+    newLengths = numpy.diff(numpy.append(newOffsets, len(out)))
+    # correct frame count
+    if correctFrames:
+        out[:,0] = numpy.arange(len(out)) - numpy.repeat(newOffsets, newLengths) + 1
+    return out, newOffsets, lengths - newLengths
+
+def length(vectors):
+    """!
+    Calculate the length of each row of a Nx3 array.
+
+    @param vectors numpy array: The vectors in the rows
+    @return The lengths as an array of size N
+    """
+    return numpy.sqrt(numpy.einsum('ij,ij->i', vectors, vectors))
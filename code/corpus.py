@@ -0,0 +1,184 @@
+#Unix style pathname pattern expansion
+import glob
+import numpy
+import normalization
+import input
+
+import os.path as string
+
+def pack(corpusPath, dataPath='../data', translate='', rotate='', scale='', clean=True):
+    """!
+    Normalize all motions in a data directory and pack them into a single corpus.
+
+    The data directory must contain one subdirectory for each motion type,
+    which in turn contains one subdirectory for each variation with the
+    motions as csv files:
+
+    + data:
+
+      + motion1:
+
+        + training:
+
+          - sample1.csv
+
+          ...
+
+        + variation1:
+
+          ...
+
+      + motion2:
+
+        ...
+
+    The corpus consists of two files: 'corpusPath.dat' contains all normalized
+    motions one after another as a single float array, and 'corpusPath.npz'
+    contains the index with the offset, length, motion and variation of each
+    recording together with the normalization settings. The motions are
+    resampled as set with 'normalization.setResampling'.
+    The motions are written one by one, so the data never has to fit into memory.
+
+    @param corpusPath String: The path of the corpus files (without ending)
+    @param dataPath String: The directory containing the motion files
+    @param translate: The normalization for translating the motions
+    @param rotate: The normalization for rotating the motions
+    @param scale: The normalization for scaling the motions
+    @param clean: Remove duplicate points and large jumps, default true
+    """
+    classNames = []
+    variationNames = []
+    offsets = []
+    lengths = []
+    classes = []
+    variations = []
+    names = []
+    columns = 0
+    rows = 0
+    with open(corpusPath + '.dat', 'wb') as f:
+        for folder in sorted(glob.glob(dataPath + '/*/')):
+            classNames.append(string.split(string.dirname(folder))[1])
+            for variationFolder in sorted(glob.glob(folder + '*/')):
+                variation = string.split(string.dirname(variationFolder))[1]
+                if variation not in variationNames:
+                    variationNames.append(variation)
+                for file in sorted(glob.glob(variationFolder + '*.csv')):
+                    motion = input.read(file)
+                    motion, _, _, _ = normalization.normalize(motion, translate, rotate, scale, clean)
+                    motion = numpy.ascontiguousarray(motion, dtype=numpy.float64)
+                    columns = motion.shape[1]
+                    f.write(motion.tobytes())
+                    offsets.append(rows)
+                    lengths.append(len(motion))
+                    classes.append(len(classNames) - 1)
+                    variations.append(variationNames.index(variation))
+                    names.append(string.basename(string.splitext(file)[0]))
+                    rows += len(motion)
+    numpy.savez(corpusPath + '.npz',
+        offsets=numpy.array(offsets, dtype=numpy.int64),
+        lengths=numpy.array(lengths, dtype=numpy.int64),
+        classes=numpy.array(classes, dtype=numpy.int32),
+        variations=numpy.array(variations, dtype=numpy.int32),
+        names=numpy.array(names, dtype=str),
+        classNames=numpy.array(classNames, dtype=str),
+        variationNames=numpy.array(variationNames, dtype=str),
+        columns=columns,
+        rows=rows,
+        translate=translate,
+        rotate=rotate,
+        scale=scale,
+        clean=clean,
+        resample=normalization.resampleMode,
+        samples=normalization.resampleSamples,
+        spacing=normalization.resampleSpacing)
+
+def load(corpusPath):
+    """!
+    Open a corpus created with 'pack'.
+
+    The motion data is memory-mapped and not read into memory.
+
+    @param corpusPath String: The path of the corpus files (without ending)
+    @return The memory-mapped data of all motions, and a dictionary with the index arrays
+    """
+    with numpy.load(corpusPath + '.npz') as f:
+        index = {key: f[key] for key in f.files}
+    shape = (int(index['rows']), int(index['columns']))
+    if shape[0] == 0:
+        return numpy.zeros(shape), index
+    data = numpy.memmap(corpusPath + '.dat', dtype=numpy.float64, mode='r', shape=shape)
+    return data, index
+
+def matchesNormalization(index, translate='', rotate='', scale='', clean=True):
+    """!
+    Check if the motions in a corpus were normalized with the given settings,
+    and resampled as set with 'normalization.setResampling'.
+
+    @param index dict: The index of the corpus
+    @param translate: The normalization for translating the motions
+    @param rotate: The normalization for rotating the motions
+    @param scale: The normalization for scaling the motions
+    @param clean: Remove duplicate points and large jumps
+    @return True, if the settings are the same
+    """
+    resample = str(index['resample']) if 'resample' in index else ''
+    if resample != normalization.resampleMode:
+        return False
+    if 'frames' in resample and int(index['samples']) != normalization.resampleSamples:
+        return False
+    if 'arclength' in resample and ('spacing' not in index or float(index['spacing']) != normalization.resampleSpacing):
+        # corpora packed before the spacing was introduced have a fixed number of poses
+        return False
+    return (str(index['translate']) == translate and str(index['rotate']) == rotate
+        and str(index['scale']) == scale and bool(index['clean']) == clean)
+
+def select(index, motion, variation='training'):
+    """!
+    Get the indices of all recordings of a motion and variation.
+
+    @param index dict: The index of the corpus
+    @param motion String: The name of the motion
+    @param variation String: The name of the variation, default 'training'
+    @return The indices of the recordings in the index arrays
+    """
+    classNames = list(index['classNames'])
+    variationNames = list(index['variationNames'])
+    if motion not in classNames or variation not in variationNames:
+        return numpy.zeros(0, dtype=numpy.int64)
+    selected = (index['classes'] == classNames.index(motion)) & (index['variations'] == variationNames.index(variation))
+    return numpy.flatnonzero(selected)
+
+def motionsAndLengths(data, index, motion, variation='training'):
+    """!
+    Get the concatenated recordings of a motion and variation, together with their lengths.
+
+    The recordings of a motion and variation are stored next to each other,
+    so the result is a view of the corpus data and no data is copied.
+
+    @param data numpy array: The data of the corpus
+    @param index dict: The index of the corpus
+    @param motion String: The name of the motion
+    @param variation String: The name of the variation, default 'training'
+    @return The concatenated motions and a list of the motion lengths
+    """
+    selected = select(index, motion, variation)
+    if len(selected) == 0:
+        return data[0:0], []
+    start = index['offsets'][selected[0]]
+    end = index['offsets'][selected[-1]] + index['lengths'][selected[-1]]
+    return data[start:end], list(index['lengths'][selected])
+
+def motions(data, index, motion, variation='training'):
+    """!
+    Get the individual recordings of a motion and variation as views of the corpus data.
+
+    @param data numpy array: The data of the corpus
+    @param index dict: The index of the corpus
+    @param motion String: The name of the motion
+    @param variation String: The name of the variation, default 'training'
+    @return A list of the motions, and a list of their names
+    """
+    selected = select(index, motion, variation)
+    offsets = index['offsets']
+    lengths = index['lengths']
+    return [data[offsets[i]:offsets[i] + lengths[i]] for i in selected], list(index['names'][selected])
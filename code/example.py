@@ -1,6 +1,11 @@
 
 import input
 import learning
+import cache
+import modelStore
+import scoring
+import instrumentation
+import plot
 
 #number of states in the model
 components = 100
@@ -10,8 +15,25 @@ iterations = 50
 # Log to file
 input.setLogFile('../Log.txt')
 
+# Keep parsed motions between runs
+cache.setCacheDirectory('../cache')
+
+# Reuse trained models as long as the data and settings don't change
+modelStore.setStoreDirectory('../models')
+
+# Generate the plots in the background, with at most 2000 points per motion
+plot.setPlotMode('deferred', points=2000)
+
+# Measure the time of each stage
+instrumentation.setEnabled(True)
+
 models = learning.learnMotions(components, mixture_states, iterations, translate='median', rotate='mean', scale='largest')
 
-learning.recognizeMotions(models, translate='median', rotate='mean', scale='largest')
+# Score with all models at once
+engine = scoring.ScoringEngine(models)
+
+learning.recognizeMotions(engine, translate='median', rotate='mean', scale='largest')
+
+instrumentation.export('../instrumentation.json')
 
 input.closeLogFile()
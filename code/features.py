@@ -0,0 +1,148 @@
+# This file implements the projection of normalized motions onto the features
+# used by the HMM models.
+#
+# By default, the models are trained on all columns of the normalized motions
+# (including the frame number). A 'Projection' can select some of the
+# columns, add the velocity of the selected columns (the difference to the
+# previous pose), and reduce the features to their principal components,
+# which are fitted on all training motions. Fewer features make training and
+# scoring faster.
+#
+# The projection is passed to 'learning.learnMotions', which fits it in
+# place (or takes the fitted projection from the model store), and then to
+# 'learning.recognizeMotions'. The fitted projection is saved in the model
+# store together with the models (see 'modelStore.loadProjection').
+#
+
+import hashlib
+import numpy
+
+class Projection:
+    """!
+    Transform normalized motions into the features of the HMM models.
+    """
+
+    def __init__(self, columns=None, velocity=False, components=0):
+        """!
+        Create a projection, which has to be fitted if principal components are used.
+
+        @param columns list: The indices of the columns to use, default all columns
+        @param velocity Boolean: Add the velocity of the selected columns (except the frame number), default false
+        @param components Int: The number of principal components, default 0 (no reduction)
+        """
+        self.columns = None if columns is None else numpy.array(columns, dtype=int)
+        self.velocity = velocity
+        self.components = components
+        self.mean = None
+        self.basis = None
+
+    def needsFit(self):
+        """!
+        @return True, if the principal components have to be fitted before transforming motions
+        """
+        return self.components > 0 and self.basis is None
+
+    def features(self, X, lengths=None):
+        """!
+        Select the columns of motions and add the velocities.
+
+        @param X numpy.array: The frames of one motion, or of several motions one after another
+        @param lengths list: The number of frames of each motion, optional (a single motion)
+        @return The features, one row per frame
+        """
+        X = numpy.asarray(X, dtype=float)
+        selected = X if self.columns is None else X[:, self.columns]
+        if not self.velocity:
+            return selected
+        columns = numpy.arange(X.shape[1]) if self.columns is None else self.columns
+        moving = selected[:, columns != 0]
+        velocity = numpy.zeros(moving.shape)
+        velocity[1:] = numpy.diff(moving, axis=0)
+        # the first pose of each motion has no previous pose
+        lengths = [len(X)] if lengths is None else lengths
+        starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1])).astype(int)
+        velocity[starts[starts < len(X)]] = 0
+        return numpy.hstack((selected, velocity))
+
+    def fit(self, X, lengths=None):
+        """!
+        Fit the principal components to the training motions.
+
+        Does nothing without principal components.
+
+        @param X numpy.array: The frames of all training motions, one motion after another
+        @param lengths list: The number of frames of each motion, optional (a single motion)
+        """
+        if self.components <= 0:
+            return
+        features = self.features(X, lengths)
+        self.mean = numpy.mean(features, axis=0)
+        centered = features - self.mean
+        values, vectors = numpy.linalg.eigh(centered.T.dot(centered) / max(1, len(features) - 1))
+        # largest variances first, with the largest element of each vector positive
+        vectors = vectors[:, numpy.argsort(values)[::-1][:self.components]]
+        signs = numpy.sign(vectors[numpy.argmax(numpy.abs(vectors), axis=0), numpy.arange(vectors.shape[1])])
+        self.basis = vectors * numpy.where(signs == 0, 1, signs)
+
+    def transform(self, X, lengths=None):
+        """!
+        Transform motions into features.
+
+        @param X numpy.array: The frames of one motion, or of several motions one after another
+        @param lengths list: The number of frames of each motion, optional (a single motion)
+        @return The features, one row per frame
+        """
+        if self.needsFit():
+            raise ValueError('The projection must be fitted before transforming motions')
+        features = self.features(X, lengths)
+        if self.basis is None:
+            return features
+        return (features - self.mean).dot(self.basis)
+
+    def settings(self):
+        """!
+        @return The settings of the projection (columns, velocity and number of components) as a tuple
+        """
+        return (None if self.columns is None else self.columns.tolist(), bool(self.velocity), int(self.components))
+
+    def key(self):
+        """!
+        Calculate a key of the settings and the fitted principal components.
+
+        @return The key as a string of hexadecimal digits
+        """
+        key = hashlib.sha1()
+        key.update(repr(self.settings()).encode())
+        if self.basis is not None:
+            key.update(numpy.ascontiguousarray(self.mean).tobytes())
+            key.update(numpy.ascontiguousarray(self.basis).tobytes())
+        return key.hexdigest()
+
+    def arrays(self):
+        """!
+        Get the settings and principal components as arrays for saving.
+
+        @return A dictionary of arrays, see 'fromArrays'
+        """
+        arrays = {'columns': numpy.array([] if self.columns is None else self.columns, dtype=int),
+            'allColumns': self.columns is None,
+            'velocity': self.velocity,
+            'components': self.components}
+        if self.basis is not None:
+            arrays['mean'] = self.mean
+            arrays['basis'] = self.basis
+        return arrays
+
+def fromArrays(arrays):
+    """!
+    Create a projection from saved arrays, see 'Projection.arrays'.
+
+    @param arrays dict: The saved arrays
+    @return The projection
+    """
+    columns = None if bool(arrays['allColumns']) else arrays['columns']
+    projection = Projection(columns, bool(arrays['velocity']), int(arrays['components']))
+    if 'basis' in arrays:
+        projection.mean = numpy.asarray(arrays['mean'], dtype=float)
+        projection.basis = numpy.asarray(arrays['basis'], dtype=float)
+    return projection
@@ -1,52 +1,95 @@
+import io
 import numpy
+import cache
+import instrumentation
+import logger
 
 """!
-The file used for logging
+The logger used by 'log' and 'logLn', see 'setLogFile'
 """
-fileToPrint = 0
+activeLogger = None
 
 def setLogFile(file):
     """!
     Set an output file for logging purposes.
 
-    Only opens the file if no logging file is set yet.
+    Only opens the file if no logging file is set yet. Files ending with
+    '.jsonl' are written as JSON Lines, all others as text (see 'logger.Logger').
 
     @param file String: The file to open
     """
-    global fileToPrint
-    if fileToPrint == 0:
-        fileToPrint = open(file, "w")
+    global activeLogger
+    if activeLogger is None:
+        activeLogger = logger.Logger(file, 'jsonl' if file.endswith('.jsonl') else 'text')
 
-def logLn(output=''):
+def logLn(output='', **fields):
     """!
     Write a line (including a line break) to the log file.
 
     Does nothing if no output file is specified.
+
+    @param output String: The line
+    @param fields: Further fields of the record, e.g. 'class' and 'file'
     """
-    global fileToPrint
-    if fileToPrint != 0:
-        fileToPrint.write(output + '\n')
+    if activeLogger is not None:
+        activeLogger.log(output, **fields)
 
-def log(output=''):
+def log(output='', **fields):
     """!
     Write to the output file without a line break.
 
     Does nothing if no output file is specified.
+
+    @param output String: The text
+    @param fields: Further fields of the record, e.g. 'class' and 'file'
     """
-    global fileToPrint
-    if fileToPrint != 0:
-        fileToPrint.write(output)
+    if activeLogger is not None:
+        activeLogger.log(output, end='', **fields)
 
 def closeLogFile():
     """!
-    Close the output file.
+    Write all waiting log records and close the output file.
+
+    Does nothing if no output file is specified.
+    """
+    global activeLogger
+    if activeLogger is not None:
+        activeLogger.close()
+        activeLogger = None
+
+def captureLog(run=''):
+    """!
+    Collect the log records in memory instead of writing them to a file.
+
+    Used by worker processes, so that the log of each worker can be written
+    to the log file by the main process in a fixed order.
+
+    @param run String: The name of the run of the main process, default a new name
+    """
+    global activeLogger
+    activeLogger = logger.Logger(run=run)
+
+def releaseLog():
+    """!
+    Stop collecting the log records started with 'captureLog'.
+
+    @return The collected log records, see 'logRecords'
+    """
+    global activeLogger
+    records = activeLogger.records()
+    activeLogger = None
+    return records
+
+def logRecords(records):
+    """!
+    Write log records collected with 'captureLog' (e.g. in a worker process).
 
     Does nothing if no output file is specified.
+
+    @param records list: The log records
     """
-    global fileToPrint
-    if fileToPrint != 0:
-        fileToPrint.close()
-        fileToPrint = 0
+    if activeLogger is not None:
+        activeLogger.extend(records)
 
 def read(file, separator = ','):
     """!
@@ -61,21 +104,206 @@ def read(file, separator = ','):
 
     The rotation is given as a unit quaternion.
 
+    If a cache directory is set with 'cache.setCacheDirectory', then the
+    parsed motion is taken from the cache as long as the file is unchanged.
+
     @param file String: The file to read from
     @param separator String: The Character between values, defaults to ','
 
     @return A numpy array of the motion
     """
-    motion = []
-    for line in open(file):
-        itemList = line[:-1].split(separator)
-        lineIsReadable = True
-        for item in itemList:
-            try:
-                float(item)
-            except Exception as e:
-                lineIsReadable = False
-        if lineIsReadable:
-            pose = list(map(float,itemList))
-            motion.append(pose)
-    return numpy.array(motion)
+    with instrumentation.stage('read') as measurement:
+        motion = cache.load(file, separator)
+        if motion is None:
+            motion, _ = readBulk(file, separator)
+            cache.store(file, motion, separator)
+            instrumentation.count('read.parsed')
+        else:
+            instrumentation.count('read.cached')
+        if measurement is not None:
+            measurement.rows = len(motion)
+    return motion
+
+def readBulk(file, separator = ','):
+    """!
+    Read a motion from a file path in a single vectorized pass.
+
+    See 'read' for the file format. Lines starting with a letter before the
+    first line of numbers (the 'Recording for ...' line and the column header)
+    are skipped, all other lines which don't consist of exactly one number per
+    column are dropped.
+
+    @param file String: The file to read from
+    @param separator String: The Character between values, defaults to ','
+
+    @return A numpy array of the motion, and the number of dropped lines
+    """
+    with open(file, 'rb') as f:
+        content = f.read()
+    return parse(content, separator)
+
+def readChunks(file, separator = ',', blockSize = 2**24):
+    """!
+    Read a motion from a file path in chunks of rows.
+
+    The file is read in blocks of bytes which are split at the last line break,
+    so that only one block is in memory at a time. See 'readBulk' for the file
+    format. All lines with a different number of values than the first line of
+    numbers in the file are dropped.
+
+    @param file String: The file to read from
+    @param separator String: The Character between values, defaults to ','
+    @param blockSize Int: The number of bytes to read at once, default 16 MB
+
+    @return A generator of numpy arrays with the rows of the motion
+    """
+    columns = None
+    rest = b''
+    with open(file, 'rb') as f:
+        while True:
+            block = f.read(blockSize)
+            content = rest + block
+            if len(block) > 0:
+                end = content.rfind(b'\n') + 1
+                content, rest = content[:end], content[end:]
+            if len(content) > 0:
+                motion, _ = parse(content, separator, columns, header=columns is None)
+                if len(motion) > 0:
+                    columns = motion.shape[1]
+                    yield motion
+            if len(block) == 0:
+                break
+
+"""!
+Lookup table of all bytes which can appear in a line of numbers
+"""
+numberBytes = numpy.zeros(256, dtype=bool)
+numberBytes[list(b'0123456789+-.eE \t\r')] = True
+
+"""!
+Lookup table of all bytes which start a header line
+"""
+headerBytes = numpy.zeros(256, dtype=bool)
+headerBytes[list(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz')] = True
+
+def parse(content, separator = ',', columns = None, header = True):
+    """!
+    Convert the content of a motion file into a numpy array.
+
+    All lines are classified at once on the raw bytes, and the readable lines
+    are converted together. A line is readable if all its values can be
+    converted to a float (including values like 'nan' or 'inf'). The number
+    of columns is taken from the first readable line (unless given), so that
+    all lines with a different number of values are dropped as well.
+
+    Only the lines starting with a letter before the first line of numbers
+    (the 'Recording for ...' line and the column header) are skipped as
+    header, all other lines which can't be read are counted as dropped.
+
+    @param content bytes: The content of the motion file
+    @param separator String: The Character between values, defaults to ','
+    @param columns Int: The number of values in each line, defaults to the number of values in the first line
+    @param header Boolean: If the content starts with the header of the file, default true
+
+    @return A numpy array of the motion (empty with shape (0,) without any readable lines), and the number of dropped lines
+    """
+    sep = ord(separator)
+    data = numpy.frombuffer(content, dtype=numpy.uint8)
+    # start and end (line break) of each line
+    ends = numpy.flatnonzero(data == 10)
+    if len(data) > 0 and data[-1] != 10:
+        ends = numpy.append(ends, len(data))
+    starts = numpy.concatenate(([0], ends[:-1] + 1)).astype(ends.dtype)
+    lengths = ends - starts
+    if len(ends) == 0:
+        return numpy.array([]), 0
+
+    # skip empty lines, and the header lines starting with a letter before the first line of numbers
+    first = data[numpy.minimum(starts, len(data) - 1)]
+    blank = (lengths == 0) | ((lengths == 1) & (first == 13))
+    skipped = numpy.zeros(len(ends), dtype=bool)
+    if header:
+        letters = ~blank & headerBytes[first]
+        leading = numpy.argmax(~blank & ~letters) if numpy.any(~blank & ~letters) else len(ends)
+        for index in numpy.flatnonzero(letters[:leading]):
+            # lines of values like 'nan' or 'inf' aren't headers
+            if not isNumbers(content[starts[index]:ends[index]], separator):
+                skipped[index] = True
+    # lines with any byte which isn't part of a number or a separator
+    invalid = numpy.zeros(len(ends), dtype=bool)
+    invalid[numpy.searchsorted(ends, numpy.flatnonzero(~numberBytes[data] & (data != sep) & (data != 10)))] = True
+    # number of values in each line
+    separators = numpy.flatnonzero(data == sep)
+    values = numpy.diff(numpy.searchsorted(separators, numpy.concatenate(([0], ends)))) + 1
+
+    # lines with other bytes are only readable if all values are numbers like 'nan' or 'inf'
+    special = numpy.zeros(len(ends), dtype=bool)
+    for index in numpy.flatnonzero(~blank & ~skipped & invalid):
+        special[index] = isNumbers(content[starts[index]:ends[index]], separator)
+    candidates = ~blank & ~skipped & (~invalid | special)
+    lines = int(numpy.count_nonzero(~blank & ~skipped))
+    if columns is None:
+        # number of values of the first line which can be converted
+        for index in numpy.flatnonzero(candidates):
+            if special[index] or isNumbers(content[starts[index]:ends[index]], separator):
+                columns = values[index]
+                break
+        else:
+            return numpy.array([]), lines
+    readable = candidates & (values == columns)
+    regular = readable & ~special
+    try:
+        motion = convert(data, starts, lengths, regular, separator, columns)
+    except ValueError:
+        # values like '1.2.3' pass the byte check, so test the lines individually
+        for index in numpy.flatnonzero(regular):
+            if not isNumbers(content[starts[index]:ends[index]], separator):
+                regular[index] = False
+        motion = convert(data, starts, lengths, regular, separator, columns)
+    readable = regular | (readable & special)
+    if numpy.any(special & readable):
+        # the few lines with 'nan' or 'inf' are converted one by one
+        rows = numpy.empty((numpy.count_nonzero(readable), columns))
+        rows[regular[readable]] = motion
+        rows[special[readable]] = [[float(item) for item in content[starts[index]:ends[index]].decode().split(separator)]
+            for index in numpy.flatnonzero(special & readable)]
+        motion = rows
+    if len(motion) == 0:
+        motion = numpy.array([])
+    return motion, lines - int(numpy.count_nonzero(readable))
+
+def isNumbers(line, separator):
+    """!
+    Check if all values of a line are numbers, including 'nan' and 'inf'.
+
+    @param line bytes: The line without the line break
+    @param separator String: The Character between values
+    @return True, if all values can be converted to a float
+    """
+    try:
+        [float(item) for item in line.decode(errors='replace').split(separator)]
+    except ValueError:
+        return False
+    return True
+
+def convert(data, starts, lengths, readable, separator, columns):
+    """!
+    Convert the selected lines of a motion file into a two-dimensional array.
+
+    @param data numpy array: The bytes of the motion file
+    @param starts numpy array: The start index of each line
+    @param lengths numpy array: The length of each line without the line break
+    @param readable numpy array: Boolean mask of the lines to convert
+    @param separator String: The Character between values
+    @param columns Int: The number of values in each line
+
+    @return A numpy array with one row per selected line
+    """
+    if not numpy.any(readable):
+        return numpy.empty((0, columns))
+    # keep the bytes of the selected lines together with their line breaks
+    selected = numpy.repeat(readable, lengths + 1)[:len(data)]
+    lines = data[selected].tobytes()
+    if not lines.endswith(b'\n'):
+        lines += b'\n'
+    return numpy.loadtxt(io.BytesIO(lines), delimiter=separator, ndmin=2)
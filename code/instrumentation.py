@@ -0,0 +1,164 @@
+# This file implements the measurement of the time spent in each stage of the
+# processing (reading, normalizing, cleaning, training, scoring), together
+# with counters like the number of points removed by the cleaning.
+#
+# The measurements are disabled by default and then cost only a function
+# call per stage. Enable them with 'setEnabled', and write the collected
+# measurements of the run with 'export':
+#
+#   instrumentation.setEnabled(True)
+#   models = learning.learnMotions(...)
+#   learning.recognizeMotions(models, ...)
+#   instrumentation.export('../instrumentation.json')
+#
+
+import json
+import time
+import threading
+import contextlib
+
+"""!
+If the stages are measured, see 'setEnabled'
+"""
+enabled = False
+
+"""!
+The number of calls, the wall and cpu time in seconds, and the number of rows of each stage
+"""
+stages = {}
+
+"""!
+The counters, by name
+"""
+counters = {}
+
+"""!
+The wall time when the measurements were reset
+"""
+startTime = time.perf_counter()
+
+"""!
+Lock for updating the measurements from several threads
+"""
+lock = threading.Lock()
+
+"""!
+Context of a stage while the measurements are disabled
+"""
+disabledStage = contextlib.nullcontext()
+
+def setEnabled(enable=True):
+    """!
+    Enable or disable the measurements, and reset them.
+
+    @param enable Boolean: Measure the stages, default true
+    """
+    global enabled
+    enabled = enable
+    reset()
+
+def reset():
+    """!
+    Remove all measurements, and start a new run.
+    """
+    global stages, counters, startTime
+    with lock:
+        stages = {}
+        counters = {}
+        startTime = time.perf_counter()
+
+class Stage:
+    """!
+    Measure the wall and cpu time of a block of code, see 'stage'.
+    """
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exception):
+        add(self.name, time.perf_counter() - self.wall, time.process_time() - self.cpu, self.rows)
+        return False
+
+def stage(name, rows=0):
+    """!
+    Measure a stage of the processing, to be used with 'with':
+
+        with instrumentation.stage('clean', len(motion)):
+            ...
+
+    @param name String: The name of the stage
+    @param rows Int: The number of rows processed by the stage, optional
+    @return The context measuring the stage, which does nothing if the measurements are disabled
+    """
+    if not enabled:
+        return disabledStage
+    return Stage(name, rows)
+
+def add(name, wall, cpu=0.0, rows=0, calls=1):
+    """!
+    Add a measurement of a stage.
+
+    @param name String: The name of the stage
+    @param wall Number: The wall time in seconds
+    @param cpu Number: The cpu time in seconds
+    @param rows Int: The number of rows processed
+    @param calls Int: The number of calls measured, default 1
+    """
+    with lock:
+        entry = stages.get(name)
+        if entry is None:
+            entry = stages[name] = {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rows': 0}
+        entry['calls'] += calls
+        entry['wall'] += wall
+        entry['cpu'] += cpu
+        entry['rows'] += int(rows)
+
+def count(name, value=1):
+    """!
+    Increase a counter. Does nothing if the measurements are disabled.
+
+    @param name String: The name of the counter
+    @param value Int: The amount to add, default 1
+    """
+    if not enabled:
+        return
+    with lock:
+        counters[name] = counters.get(name, 0) + int(value)
+
+def report():
+    """!
+    Get all measurements since the last reset.
+
+    @return A dictionary with the measurements of the stages, the counters, and the wall time of the run
+    """
+    with lock:
+        return {'stages': {name: dict(entry) for name, entry in stages.items()},
+            'counters': dict(counters),
+            'wall': time.perf_counter() - startTime}
+
+def merge(other):
+    """!
+    Add the measurements of another process, see 'report'.
+
+    @param other dict: The measurements of the other process
+    """
+    for name, entry in other['stages'].items():
+        add(name, entry['wall'], entry['cpu'], entry['rows'], entry['calls'])
+    with lock:
+        for name, value in other['counters'].items():
+            counters[name] = counters.get(name, 0) + value
+
+def export(file):
+    """!
+    Write all measurements since the last reset as json.
+
+    @param file String: The path of the file
+    """
+    with open(file, 'w') as f:
+        json.dump(report(), f, indent=2, sort_keys=True)
@@ -9,9 +9,18 @@ import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 #python modules for machine learning and data mining
 import sklearn
+#parallel training in worker processes
+import concurrent.futures
+import contextlib
+import io
 import normalization
 import input
 import plot
+import corpus
+import modelStore
+import scoring
+import instrumentation
+import results as recognitionResults
 
 import os.path as string
 
@@ -29,50 +38,139 @@ def createGMMComponents(components):
         gmms.append(newModel)
     return gmms
 
-def createMotionsAndLengths(path, translate='', rotate='', scale=''):
+def createMotionsAndLengths(path, translate='', rotate='', scale='', data=None, index=None, projection=None):
     """!
     Read the motions from a folder and create a concatenated array with the lengths.
 
     The given directory 'path' must contain a subdirectory 'training' containing the motions
     as individual csv files.
+    If a packed corpus is given (see 'corpus.load'), then the motions are taken
+    from the corpus without reading or copying them.
+    If a feature projection is given, then the motions are transformed into
+    the features of the projection.
 
     @param path String: The path to the motion data.
     @param translate: The normalization for translating the motions
     @param rotate: The normalization for rotating the motions
     @param scale: The normalization for scaling the motions
-    @return: The concatenated motions and a list of the motion lengths
+    @param data numpy array: The data of a packed corpus, optional
+    @param index dict: The index of a packed corpus, optional
+    @param projection features.Projection: The projection of the motions onto the features, optional
+    @return: The concatenated motions (or features) and a list of the motion lengths
     """
-    # list of motions read from the file
-    motions = []
-    # length of motions read from the file
-    lengths = []
-    count = 0
+    _, folderName = string.split(string.dirname(path))
     plot.clearPlot()
-    input.logLn('\n- ' + '{:<10}'.format(path + ':'))
-    # read all files from directory associated with one motion
-    for file in sorted(glob.glob(path + '/training/*.csv')):
+    input.logLn('\n- ' + '{:<10}'.format(path + ':'), **{'class': folderName})
+    if data is not None:
+        X, lengths = corpus.motionsAndLengths(data, index, folderName)
+        motions, names = corpus.motions(data, index, folderName)
+        for motion, name in zip(motions, names):
+            input.logLn(name, **{'class': folderName, 'file': name})
+            plot.addPlot(motion[:,1:4], name)
+        plot.plot('../plots/' + folderName + ' training')
+        if projection is not None:
+            X = projection.transform(X, lengths)
+        return X, lengths
+
+    files = sorted(glob.glob(path + '/training/*.csv'))
+    for file in files:
         print(file)
-        input.logLn(string.basename(string.splitext(file)[0]))
-        count += 1
-        #read motion and normalize
-        motion = input.read(file)
-        motion,t,r,s = normalization.normalize(motion, translate, rotate, scale)
-
-        # Add to plot all training plots
+        input.logLn(string.basename(string.splitext(file)[0]), **{'class': folderName, 'file': file})
+    #read motions and normalize
+    motions, _, _, _ = normalization.readNormalizedBatch(files, translate, rotate, scale)
+    # Add to plot all training plots
+    for motion, file in zip(motions, files):
         plot.addPlot(motion[:,1:4], file)
-
-        # Add motion to the list of motions
-        motions.append(motion)
-        # Add length (number of poses in motion) to the list of lengths
-        lengths.append(len(motion))
-    _, folderName = string.split(string.dirname(path))
     # Plot all training motions
     plot.plot('../plots/' + folderName + ' training')
-    # The observations are a list of poses
+    # The observations are a list of poses, with the length (number of poses) of each motion
+    lengths = [len(motion) for motion in motions]
     X = numpy.concatenate(motions)
+    if projection is not None:
+        X = projection.transform(X, lengths)
     return X, lengths
 
-def learnMotions(components, states, iterations, dataPath='../data', translate='', rotate='', scale=''):
+def fitProjection(projection, folders, translate='', rotate='', scale='', data=None, index=None):
+    """!
+    Fit a feature projection to the training motions of all motion types.
+
+    @param projection features.Projection: The projection to fit
+    @param folders list: The directories of the motion types
+    @param translate: The normalization for translating the motions
+    @param rotate: The normalization for rotating the motions
+    @param scale: The normalization for scaling the motions
+    @param data numpy array: The data of a packed corpus, optional
+    @param index dict: The index of a packed corpus, optional
+    """
+    motions, lengths = [], []
+    for folder in folders:
+        if data is not None:
+            X, folderLengths = corpus.motionsAndLengths(data, index, string.basename(string.dirname(folder)))
+        else:
+            files = sorted(glob.glob(folder + '/training/*.csv'))
+            if len(files) == 0:
+                continue
+            folderMotions, _, _, _ = normalization.readNormalizedBatch(files, translate, rotate, scale)
+            X, folderLengths = numpy.concatenate(folderMotions), [len(motion) for motion in folderMotions]
+        motions.append(X)
+        lengths.extend(folderLengths)
+    projection.fit(numpy.concatenate(motions), lengths)
+
+def trainingConfiguration(components, states, iterations, translate='', rotate='', scale='', projection=None):
+    """!
+    Collect all settings of the training, which identify the models in the model store.
+
+    The resampling set with 'normalization.setResampling' is part of the
+    settings, so that the models are only used with motions resampled in the
+    same way. Of a feature projection, only the settings are part of the
+    configuration, the fitted projection is stored in the manifests of the
+    models (see 'storedProjection').
+
+    @param components Int: The number of components to use
+    @param states Int: The number of HMM states
+    @param iterations Int: The number of iterations to converge to the model
+    @param translate: The normalization for translating the motions
+    @param rotate: The normalization for rotating the motions
+    @param scale: The normalization for scaling the motions
+    @param projection features.Projection: The projection of the motions onto the features, optional
+    @return A dictionary with the settings
+    """
+    configuration = {'components': components, 'states': states, 'iterations': iterations,
+        'translate': translate, 'rotate': rotate, 'scale': scale, 'clean': True}
+    mode, samples, spacing = normalization.resamplingSettings()
+    if 'frames' in mode:
+        configuration['resample'] = (mode, samples)
+    elif 'arclength' in mode:
+        configuration['resample'] = (mode, spacing)
+    if projection is not None:
+        configuration['projection'] = projection.settings()
+    return configuration
+
+def storedProjection(configuration, manifests, previous):
+    """!
+    Find the fitted feature projection of the models in the model store.
+
+    The projection can be used if the models of all motion types are stored
+    with the same projection, and none of the training motions changed.
+
+    @param configuration dict: All settings used for the training, see 'trainingConfiguration'
+    @param manifests list: The current manifest of the training motions of each motion type
+    @param previous list: The stored manifest of each motion type, see 'modelStore.loadManifest'
+    @return The projection, or None if the projection has to be fitted again
+    """
+    if len(previous) == 0 or any(manifest is None or 'projection' not in manifest for manifest in previous):
+        return None
+    keys = set(str(manifest['projection']) for manifest in previous)
+    if len(keys) != 1:
+        return None
+    key = keys.pop()
+    settings = dict(configuration, fitted=key)
+    for manifest, stored in zip(manifests, previous):
+        if modelStore.trainingKey(settings, manifest) != str(stored['model']):
+            return None
+    return modelStore.loadProjection(key)
+
+def learnMotions(components, states, iterations, dataPath='../data', translate='', rotate='', scale='', corpusPath='', workers=1, incremental=False, projection=None):
     """!
     Learn all the (normalized) motions and return the trained models.
 
@@ -101,47 +199,257 @@ def learnMotions(components, states, iterations, dataPath='../data', translate='
 
         ...
 
+    With more than one worker, the models are trained in parallel in separate
+    processes, one motion per process (including reading and normalizing the
+    training motions). The log and console output of each motion is collected
+    in the worker and written in the order of the motions, so that it is the
+    same as for sequential training.
+
+    If a model store is set with 'modelStore.setStoreDirectory', then each
+    model is saved after training, and taken from the store in later calls
+    with the same training motions and settings. The store keeps a manifest
+    of the training files of each motion type, so that only the changed files
+    have to be read to detect changes. In incremental mode, the models of
+    motion types with changed training files start from the parameters of the
+    previous model instead of a new initialization, and the models of all
+    other motion types are taken from the store as they are.
+
+    If a feature projection is given (see 'features.Projection'), then the
+    models are trained on the features of the projection, which is first
+    fitted to the training motions of all motion types if necessary. The
+    fitted projection is saved in the model store together with the models,
+    and is taken from there without fitting it again as long as the models
+    are. The given projection is fitted in place (its key is stored with the
+    models, see 'modelStore.loadProjection'), and must be passed to
+    'recognizeMotions' as well.
+
     @param components Int: The number of components to use
     @param states Int: The number of HMM states
     @param iterations Int: The number of iterations to converge to the model
     @param translate: The normalization for translating the motions
     @param rotate: The normalization for rotating the motions
     @param scale: The normalization for scaling the motions
+    @param corpusPath String: The path of a packed corpus (see 'corpus.pack') to use instead of the csv files, optional
+    @param workers Int: The number of processes used for training, default 1 (no parallel training)
+    @param incremental Boolean: Continue training the previous models of changed motion types, default false
+    @param projection features.Projection: The projection of the motions onto the features (fitted in place), optional
     @return the trained models
     """
-    # empty list for the trained models, one model for each motion, here 2
-    models = []
+    data, index = None, None
+    if corpusPath != '':
+        data, index = corpus.load(corpusPath)
+        if not corpus.matchesNormalization(index, translate, rotate, scale):
+            raise ValueError('The corpus ' + corpusPath + ' was packed with a different normalization')
 
     input.logLn('Learning motions.')
     input.logLn('-------------------------------------')
     input.logLn('Available motions:')
-    # go through all motions
-    for folder in sorted(glob.glob(dataPath + '/*/')):
-        #model = hmm.GaussianHMM(n_components=components, n_iter = iterations, init_params="smt")
-        #initialize model as Hidden Markov Model with Gaussion Mixture emissions
-        # n_components: Number of states in the model
-        # n_iter: Maximum number of iterations for the EM algorithm to find optimal solution
-        # n_mix: Number of states in the Gaussion Mixture Model
-        # init_params: s: startprob, m: means, t: transmat
-        model = hmm.GMMHMM(n_components=components,
-        init_params="smt",
-        n_iter = iterations,
-        n_mix = states)
-
-        # Add the GMMs to the HMM
-        model.gmms_ = createGMMComponents(components)
-
-        # create concatenated motions and length array
-        X, lengths = createMotionsAndLengths(folder, translate, rotate, scale)
-
-        # use the observations and the lengths of the motions to fit the model
-        model.fit(X,lengths)
-        # add the model to the list of models
-        models.append(model)
+    folders = sorted(glob.glob(dataPath + '/*/'))
+    # take previously trained models from the model store
+    configuration = trainingConfiguration(components, states, iterations, translate, rotate, scale, projection)
+    keys = [''] * len(folders)
+    manifests = [None] * len(folders)
+    previous = [None] * len(folders)
+    previousModels = [None] * len(folders)
+    if modelStore.storeDirectory != '':
+        for i, folder in enumerate(folders):
+            previous[i] = modelStore.loadManifest(folder, configuration)
+            manifests[i] = modelStore.manifest(folder, previous[i], data, index)
+    settings = configuration
+    fitted = ''
+    if projection is not None:
+        if projection.needsFit():
+            stored = storedProjection(configuration, manifests, previous) if modelStore.storeDirectory != '' else None
+            if stored is None:
+                fitProjection(projection, folders, translate, rotate, scale, data, index)
+            else:
+                projection.mean, projection.basis = stored.mean, stored.basis
+        modelStore.saveProjection(projection)
+        # the models depend on the fitted projection
+        fitted = projection.key()
+        settings = dict(configuration, fitted=fitted)
+    if modelStore.storeDirectory != '':
+        for i, folder in enumerate(folders):
+            keys[i] = modelStore.trainingKey(settings, manifests[i])
+            if incremental and previous[i] is not None and str(previous[i].get('projection', '')) == fitted:
+                previousModels[i] = str(previous[i]['model'])
+    models = [modelStore.load(key) for key in keys]
+    # start from the previous models of changed motion types
+    initialModels = [modelStore.load(previousModels[i]) if models[i] is None and previousModels[i] is not None else None
+        for i in range(len(folders))]
+    if workers > 1:
+        log = input.activeLogger.run if input.activeLogger is not None else ''
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=normalization.setResampling,
+                initargs=normalization.resamplingSettings()) as executor:
+            jobs = {i: executor.submit(learnMotionInWorker, folder, components, states, iterations,
+                translate, rotate, scale, corpusPath, log, initialModels[i], projection, instrumentation.enabled) for i, folder in enumerate(folders) if models[i] is None}
+            # collect the results in the order of the motions
+            for i, folder in enumerate(folders):
+                if i in jobs:
+                    try:
+                        model, output, logRecords, measurements = jobs[i].result()
+                    except Exception as error:
+                        input.logRecords(getattr(error, 'logRecords', []))
+                        raise
+                    instrumentation.merge(measurements)
+                    print(output, end='')
+                    input.logRecords(logRecords)
+                    models[i] = model
+                    modelStore.save(keys[i], model)
+                else:
+                    logStoredModel(folder)
+                modelStore.saveManifest(folder, configuration, manifests[i], keys[i], fitted)
+    else:
+        # go through all motions
+        for i, folder in enumerate(folders):
+            if models[i] is None:
+                models[i] = learnMotion(folder, components, states, iterations, translate, rotate, scale, data, index, initialModels[i], projection)
+                modelStore.save(keys[i], models[i])
+            else:
+                logStoredModel(folder)
+            modelStore.saveManifest(folder, configuration, manifests[i], keys[i], fitted)
+    modelStore.saveModelSet(configuration, [string.basename(string.dirname(folder)) for folder in folders], keys, fitted)
     input.logLn('')
     return models
 
-def recognizeFile(models, file, translate='', rotate='', scale=''):
+def loadStoredModels(components, states, iterations, translate='', rotate='', scale='', projection=None):
+    """!
+    Load the latest models trained with 'learnMotions' from the model store, without training.
+
+    The settings must be the same as for the training (including the
+    resampling, see 'normalization.setResampling'). The models of the latest
+    training with these settings are used, in the order of their motion types
+    (see 'modelStore.loadModelSet' for the names), independent of the current
+    data directory. A given projection is set to the fitted projection of the
+    models, as with 'learnMotions'.
+
+    @param components Int: The number of components used for the training
+    @param states Int: The number of states used for the training
+    @param iterations Int: The number of iterations used for the training
+    @param translate String: The normalization type for correcting translation
+    @param rotate String: The normalization type for correcting rotation
+    @param scale String: The normalization type for correcting scaling
+    @param projection features.Projection: The projection of the motions onto the features used for the training (fitted in place), optional
+    @return the models
+    """
+    if modelStore.storeDirectory == '':
+        raise ValueError('No model store set, see modelStore.setStoreDirectory')
+    configuration = trainingConfiguration(components, states, iterations, translate, rotate, scale, projection)
+    modelSet = modelStore.loadModelSet(configuration)
+    if modelSet is None:
+        raise ValueError('No models trained with these settings in the model store ' + modelStore.storeDirectory)
+    models = []
+    for name, key in zip(modelSet['names'], modelSet['models']):
+        model = modelStore.load(key)
+        if model is None:
+            raise ValueError('The model of ' + name + ' is missing in the model store ' + modelStore.storeDirectory)
+        models.append(model)
+    if projection is not None:
+        fitted = modelStore.loadProjection(modelSet['projection'])
+        if fitted is None:
+            raise ValueError('The fitted projection is missing in the model store ' + modelStore.storeDirectory)
+        projection.mean, projection.basis = fitted.mean, fitted.basis
+    return models
+
+def logStoredModel(folder):
+    """!
+    Log that the model of a motion type was taken from the model store.
+
+    @param folder String: The directory of the motion type
+    """
+    print(folder + ': Loaded from model store')
+    fields = {'class': string.basename(string.dirname(folder))}
+    input.logLn('\n- ' + '{:<10}'.format(folder + ':'), **fields)
+    input.logLn('Loaded from model store', **fields)
+
+def learnMotion(folder, components, states, iterations, translate='', rotate='', scale='', data=None, index=None, initialModel=None, projection=None):
+    """!
+    Learn the (normalized) training motions of a single motion type.
+
+    See 'learnMotions' for the directory structure.
+
+    @param folder String: The directory of the motion type
+    @param components Int: The number of components to use
+    @param states Int: The number of HMM states
+    @param iterations Int: The number of iterations to converge to the model
+    @param translate: The normalization for translating the motions
+    @param rotate: The normalization for rotating the motions
+    @param scale: The normalization for scaling the motions
+    @param data numpy array: The data of a packed corpus, optional
+    @param index dict: The index of a packed corpus, optional
+    @param initialModel hmm.GMMHMM: A previously trained model to continue training, optional
+    @param projection features.Projection: The (fitted) projection of the motions onto the features, optional
+    @return the trained model
+    """
+    # create concatenated motions and length array
+    X, lengths = createMotionsAndLengths(folder, translate, rotate, scale, data, index, projection)
+
+    if initialModel is not None:
+        # keep all parameters of the previous model as starting point
+        initialModel.init_params = ''
+        initialModel.n_iter = iterations
+        with instrumentation.stage('hmm.fit', len(X)):
+            initialModel.fit(X,lengths)
+        return initialModel
+
+    #model = hmm.GaussianHMM(n_components=components, n_iter = iterations, init_params="smt")
+    #initialize model as Hidden Markov Model with Gaussion Mixture emissions
+    # n_components: Number of states in the model
+    # n_iter: Maximum number of iterations for the EM algorithm to find optimal solution
+    # n_mix: Number of states in the Gaussion Mixture Model
+    # init_params: s: startprob, m: means, t: transmat
+    model = hmm.GMMHMM(n_components=components,
+    init_params="smt",
+    n_iter = iterations,
+    n_mix = states)
+
+    # Add the GMMs to the HMM
+    model.gmms_ = createGMMComponents(components)
+
+    # use the observations and the lengths of the motions to fit the model
+    with instrumentation.stage('hmm.fit', len(X)):
+        model.fit(X,lengths)
+    return model
+
+def learnMotionInWorker(folder, components, states, iterations, translate, rotate, scale, corpusPath, log, initialModel=None, projection=None, instrument=False):
+    """!
+    Learn a single motion type in a worker process, see 'learnMotion'.
+
+    The corpus (if any) is opened again in the worker, since the memory-mapped
+    data can't be passed between processes.
+
+    @param folder String: The directory of the motion type
+    @param components Int: The number of components to use
+    @param states Int: The number of HMM states
+    @param iterations Int: The number of iterations to converge to the model
+    @param translate: The normalization for translating the motions
+    @param rotate: The normalization for rotating the motions
+    @param scale: The normalization for scaling the motions
+    @param corpusPath String: The path of a packed corpus, or an empty string
+    @param log String: The run of the log of the main process, or an empty string if no log records are collected
+    @param initialModel hmm.GMMHMM: A previously trained model to continue training, optional
+    @param projection features.Projection: The (fitted) projection of the motions onto the features, optional
+    @param instrument Boolean: If the stages should be measured (see 'instrumentation'), default false
+    @return the trained model, the console output, the log records, and the measurements (an error has the log records in 'logRecords')
+    """
+    data, index = None, None
+    if corpusPath != '':
+        data, index = corpus.load(corpusPath)
+    if log != '':
+        input.captureLog(log)
+    instrumentation.setEnabled(instrument)
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            model = learnMotion(folder, components, states, iterations, translate, rotate, scale, data, index, initialModel, projection)
+    except Exception as error:
+        # the log up to the error is passed on with the error, see 'learnMotions'
+        error.logRecords = input.releaseLog() if log != '' else []
+        raise
+    logRecords = input.releaseLog() if log != '' else []
+    return model, output.getvalue(), logRecords, instrumentation.report()
+
+def recognizeFile(models, file, translate='', rotate='', scale='', projection=None):
     """!
     Match a single file and return the resulting scores as well as the
     normalization parameters.
@@ -151,6 +459,7 @@ def recognizeFile(models, file, translate='', rotate='', scale=''):
     @param translate String: The normalization type for correcting translation
     @param rotate String: The normalization type for correcting rotation
     @param scale String: The normalization type for correcting scaling
+    @param projection features.Projection: The projection of the motions used for training, optional
     @return An array of the model scores, translation, rotation, scaling parameters
     """
     #print(file)
@@ -161,13 +470,148 @@ def recognizeFile(models, file, translate='', rotate='', scale=''):
     plot.addPlot(motion[:,1:4], file)
     #writePointsToGrapherFile(motion, file)
 
-    scores = []
-    # check motion score (likelyhood) for each recording
-    for i,model in enumerate(models):
-        scores.append(float(model.score(motion)))
-    return numpy.array(scores), t, r, s
+    if projection is not None:
+        return scoreMotion(models, projection.transform(motion)), t, r, s
+    return scoreMotion(models, motion), t, r, s
 
-def recognizeFilesInFolder(models, folder, translate='', rotate='', scale=''):
+"""!
+The settings of the pruned scoring, see 'setPruning'
+"""
+pruning = {'margin': 0, 'prefix': 0.25, 'decimate': 0, 'compare': False}
+
+"""!
+The number of motions and model scores with pruning, the number of models
+which were not fully scored, and the number of motions compared with
+exhaustive scoring and how often the recognized motion was different
+"""
+pruningStatistics = {'motions': 0, 'scores': 0, 'pruned': 0, 'compared': 0, 'changed': 0}
+
+def setPruning(margin=0, prefix=0.25, decimate=0, compare=False):
+    """!
+    Set the pruning for scoring motions (see 'scoreMotionPruned').
+
+    All scores of pruned models are -inf. When comparing, each motion is
+    also scored with all models, and it is counted how often the pruning
+    changed the recognized motion (see 'pruningReport').
+
+    @param margin Number: The log likelihood margin for pruning, default 0 (no pruning)
+    @param prefix Number: The part of the motion scored in the first stage, default 0.25
+    @param decimate Int: Score every n-th frame in the first stage instead of a prefix, default 0
+    @param compare Boolean: Compare the results with exhaustive scoring, default false
+    """
+    global pruning
+    pruning = {'margin': margin, 'prefix': prefix, 'decimate': decimate, 'compare': compare}
+    resetPruningStatistics()
+
+def resetPruningStatistics():
+    """!
+    Reset the counters of the pruned scoring.
+    """
+    global pruningStatistics
+    pruningStatistics = {'motions': 0, 'scores': 0, 'pruned': 0, 'compared': 0, 'changed': 0}
+
+def pruningReport():
+    """!
+    Describe the effect of the pruned scoring since the counters were reset.
+
+    @return A line of text, or an empty string if no motions were scored with pruning
+    """
+    s = pruningStatistics
+    if s['motions'] == 0:
+        return ''
+    report = 'Pruning: {} of {} model scores skipped'.format(s['pruned'], s['scores'])
+    if s['compared'] > 0:
+        report += ', result changed for {} of {} motions ({:.2%})'.format(s['changed'], s['compared'], s['changed'] / s['compared'])
+    return report
+
+"""!
+The last models prepared for scoring and their engine, see 'scoringEngine'
+"""
+cachedEngine = ([], None)
+
+def scoringEngine(models):
+    """!
+    Get the engine for scoring motions with a list of models (see 'scoring.ScoringEngine').
+
+    The engine of the last list of models is kept, so that the models are
+    only prepared once when many motions are scored with the same models.
+
+    @param models list: The previously trained HMM models, or a 'scoring.ScoringEngine'
+    @return The scoring engine of the models
+    """
+    global cachedEngine
+    if isinstance(models, scoring.ScoringEngine):
+        return models
+    previous, engine = cachedEngine
+    if engine is None or len(previous) != len(models) or any(a is not b for a, b in zip(previous, models)):
+        engine = scoring.ScoringEngine(models)
+        cachedEngine = (list(models), engine)
+    return engine
+
+def scoreMotion(models, motion):
+    """!
+    Calculate the score of a normalized motion for each model.
+
+    The motion is scored with all models at once (see 'scoringEngine').
+    If pruning is set with 'setPruning', then the motion is scored with
+    'scoreMotionPruned'.
+
+    @param models list: The previously trained HMM models, or a 'scoring.ScoringEngine'
+    @param motion numpy array: The normalized motion
+    @return An array of the model scores
+    """
+    if pruning['margin'] > 0:
+        scores = scoreMotionPruned(models, motion, pruning['margin'], pruning['prefix'], pruning['decimate'])
+        pruningStatistics['motions'] += 1
+        pruningStatistics['scores'] += len(models)
+        pruningStatistics['pruned'] += int(numpy.count_nonzero(numpy.isneginf(scores)))
+        if pruning['compare']:
+            exhaustive = scoreAllModels(models, motion)
+            pruningStatistics['compared'] += 1
+            pruningStatistics['changed'] += int(numpy.argmax(scores) != numpy.argmax(exhaustive))
+        return scores
+    return scoreAllModels(models, motion)
+
+def scoreMotionPruned(models, motion, margin, prefix=0.25, decimate=0):
+    """!
+    Calculate the score of a normalized motion for the most likely models.
+
+    In the first stage, a part of the motion (the first frames, or every n-th
+    frame) is scored with all models. Only the models with a score within the
+    margin of the best score are then scored with the complete motion.
+    The margin applies to the scores of the first stage, which grow with the
+    number of frames scored.
+
+    @param models list: The previously trained HMM models, or a 'scoring.ScoringEngine'
+    @param motion numpy array: The normalized motion
+    @param margin Number: The log likelihood margin for keeping models
+    @param prefix Number: The part of the motion scored in the first stage, default 0.25
+    @param decimate Int: Score every n-th frame in the first stage instead of a prefix, default 0
+    @return An array of the model scores, -inf for all pruned models
+    """
+    if decimate > 1:
+        part = motion[::decimate]
+    else:
+        part = motion[:max(1, int(round(len(motion) * prefix)))]
+    first = scoreAllModels(models, part)
+    survivors = first >= numpy.max(first) - margin
+    scores = numpy.full(len(models), -numpy.inf)
+    with instrumentation.stage('hmm.score', len(motion)):
+        scores[survivors] = scoringEngine(models).score(motion, models=numpy.flatnonzero(survivors))
+    return scores
+
+def scoreAllModels(models, motion):
+    """!
+    Calculate the score of a normalized motion with all models.
+
+    @param models list: The previously trained HMM models, or a 'scoring.ScoringEngine'
+    @param motion numpy array: The normalized motion
+    @return An array of the model scores
+    """
+    with instrumentation.stage('hmm.score', len(motion)):
+        return scoringEngine(models).score(motion)
+
+def recognizeFilesInFolder(models, folder, translate='', rotate='', scale='', projection=None):
     """!
     Match all files in a folder and return the resulting scores as well as the
     normalization parameters.
@@ -177,23 +621,148 @@ def recognizeFilesInFolder(models, folder, translate='', rotate='', scale=''):
     @param translate String: The normalization type for correcting translation
     @param rotate String: The normalization type for correcting rotation
     @param scale String: The normalization type for correcting scaling
+    @param projection features.Projection: The projection of the motions used for training, optional
     @return An list of arrays of the model scores, lists of the translation, rotation, scaling parameters
     """
     scores = []
-    tr = []
-    ro = []
-    sc = []
     names = []
     print(folder)
-    for file in sorted(glob.glob(folder + '/*csv')):
+    files = sorted(glob.glob(folder + '/*csv'))
+    #read motions and normalize
+    motions, tr, ro, sc = normalization.readNormalizedBatch(files, translate, rotate, scale)
+    lengths = [len(motion) for motion in motions]
+    if projection is not None and len(motions) > 0:
+        observations = numpy.split(projection.transform(numpy.concatenate(motions), lengths), numpy.cumsum(lengths)[:-1])
+    else:
+        observations = motions
+    if pruning['margin'] <= 0 and len(motions) > 0:
+        # score all motions of the folder at once
+        with instrumentation.stage('hmm.score', sum(lengths)):
+            allScores = list(scoringEngine(models).score(numpy.concatenate(observations), lengths))
+    for i, (file, motion) in enumerate(zip(files, motions)):
         print(file)
-        score, t, r, s = recognizeFile(models, file, translate, rotate, scale)
-        scores.append(score)
-        tr.append(t)
-        ro.append(r)
-        sc.append(s)
+        plot.addPlot(motion[:,1:4], file)
+        if pruning['margin'] <= 0:
+            scores.append(allScores[i])
+        else:
+            scores.append(scoreMotion(models, observations[i]))
         names.append(string.basename(string.splitext(file)[0]))
-    return scores, tr, ro, sc, names
+    return scores, list(tr), list(ro), list(sc), names
+
+"""!
+The trained models in a worker process of 'recognizeFolders'
+"""
+workerModels = None
+
+"""!
+The normalization (translate, rotate, scale) in a worker process of 'recognizeFolders'
+"""
+workerNormalization = ('', '', '')
+
+"""!
+The feature projection in a worker process of 'recognizeFolders'
+"""
+workerProjection = None
+
+"""!
+If the workers of 'recognizeFolders' return the normalized positions for plotting
+"""
+workerPositions = True
+
+def initializeWorker(models, translate, rotate, scale, pruningSettings=None, resampling=('', 100, 0.05), projection=None, instrument=False, positions=True):
+    """!
+    Prepare a worker process for recognizing motions.
+
+    The models are sent to each worker only once, when the worker is started.
+
+    @param models list: The previously trained HMM models
+    @param translate String: The normalization type for correcting translation
+    @param rotate String: The normalization type for correcting rotation
+    @param scale String: The normalization type for correcting scaling
+    @param pruningSettings dict: The settings of the pruned scoring (see 'setPruning'), optional
+    @param resampling tuple: The resampling of the motions (see 'normalization.setResampling'), optional
+    @param projection features.Projection: The projection of the motions used for training, optional
+    @param instrument Boolean: If the stages should be measured (see 'instrumentation'), default false
+    @param positions Boolean: Return the normalized positions of each file for plotting, default true
+    """
+    global workerModels, workerNormalization, workerProjection, workerPositions
+    workerModels = models
+    workerNormalization = (translate, rotate, scale)
+    workerProjection = projection
+    workerPositions = positions
+    if pruningSettings is not None:
+        setPruning(**pruningSettings)
+    normalization.setResampling(*resampling)
+    instrumentation.setEnabled(instrument)
+
+def recognizeFileInWorker(file):
+    """!
+    Match a single file in a worker process prepared with 'initializeWorker'.
+
+    The motion is normalized in the same way as in 'recognizeFilesInFolder'.
+
+    @param file String: The file containing the motion.
+    @return An array of the model scores, the translation, rotation, scaling parameters,
+    the normalized positions (None if the worker returns no positions), the pruning statistics and the measurements of the file
+    """
+    instrumentation.reset()
+    translate, rotate, scale = workerNormalization
+    motions, tr, ro, sc = normalization.readNormalizedBatch([file], translate, rotate, scale)
+    motion = motions[0]
+    resetPruningStatistics()
+    if workerProjection is not None:
+        scores = scoreMotion(workerModels, workerProjection.transform(motion))
+    else:
+        scores = scoreMotion(workerModels, motion)
+    positions = motion[:,1:4].copy() if workerPositions else None
+    return scores, tr[0], ro[0], sc[0], positions, dict(pruningStatistics), instrumentation.report()
+
+def recognizeFolders(models, folders, translate='', rotate='', scale='', workers=1, projection=None):
+    """!
+    Match all files in a list of folders, see 'recognizeFilesInFolder'.
+
+    With more than one worker, the files of all folders are matched in parallel
+    in separate processes, which each read, normalize and score one file
+    after another. The results are still returned in the order of the folders
+    and files, and the console output and plots are the same as for sequential
+    matching.
+
+    @param models list: The previously trained HMM models
+    @param folders list: The folder paths containing the motions.
+    @param translate String: The normalization type for correcting translation
+    @param rotate String: The normalization type for correcting rotation
+    @param scale String: The normalization type for correcting scaling
+    @param workers Int: The number of processes used for matching, default 1
+    @param projection features.Projection: The projection of the motions used for training, optional
+    @return A generator with the results of 'recognizeFilesInFolder' for each folder
+    """
+    if workers <= 1:
+        for folder in folders:
+            yield recognizeFilesInFolder(models, folder, translate, rotate, scale, projection)
+        return
+    files = [sorted(glob.glob(folder + '/*csv')) for folder in folders]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=initializeWorker,
+            initargs=(models, translate, rotate, scale, pruning,
+            normalization.resamplingSettings(), projection, instrumentation.enabled, plot.enabled())) as executor:
+        # all files are queued at once, the results arrive in order
+        results = executor.map(recognizeFileInWorker, [file for folderFiles in files for file in folderFiles])
+        for folder, folderFiles in zip(folders, files):
+            scores, tr, ro, sc, names = [], [], [], [], []
+            print(folder)
+            for file in folderFiles:
+                score, t, r, s, positions, statistics, measurements = next(results)
+                for key in statistics:
+                    pruningStatistics[key] += statistics[key]
+                instrumentation.merge(measurements)
+                print(file)
+                if positions is not None:
+                    plot.addPlot(positions, file)
+                scores.append(score)
+                tr.append(t)
+                ro.append(r)
+                sc.append(s)
+                names.append(string.basename(string.splitext(file)[0]))
+            yield scores, tr, ro, sc, names
 
 def plotFile(file, translate='', rotate='', scale=''):
     """!
@@ -219,10 +788,12 @@ def plotFilesInFolder(folder, translate='', rotate='', scale=''):
     @param rotate String: The normalization type for correcting rotation
     @param scale String: The normalization type for correcting scaling
     """
-    for file in sorted(glob.glob(folder + '/*csv')):
-        plotFile(file, translate, rotate, scale)
+    files = sorted(glob.glob(folder + '/*csv'))
+    motions, _, _, _ = normalization.readNormalizedBatch(files, translate, rotate, scale)
+    for file, motion in zip(files, motions):
+        plot.addPlot(motion[:,1:4], file)
 
-def recognizeMotions(models, dataPath = '../data', translate='', rotate='', scale=''):
+def recognizeMotions(models, dataPath = '../data', translate='', rotate='', scale='', workers=1, projection=None, csv=True):
     """!
     Recognize all motions in an appropriate directory structure.
 
@@ -248,66 +819,81 @@ def recognizeMotions(models, dataPath = '../data', translate='', rotate='', scal
 
         ...
 
-    The resulting model scores and normalization parameters are saved in a csv
-    file with the relative file path '../Scores.csv'. Additionally multiple
+    The resulting model scores and normalization parameters are saved as
+    arrays together with the confusion matrix and accuracies (see
+    'results.Results') with the relative file path '../scores.npz', and
+    optionally in a csv file with the relative file path '../scores.csv'. Additionally multiple
     plots are created in the folder '../plots' which contain the training motions,
     the recognized motions, and the wrongly recognized motions together with the
-    training motions for comparison.
+    training motions for comparison. The plots can be deferred or disabled
+    with 'plot.setPlotMode'.
+
+    With more than one worker, the motions are read, normalized and scored in
+    parallel (see 'recognizeFolders'), with the same results.
+
+    If pruning is set with 'setPruning', then the effect of the pruning is
+    logged at the end (see 'pruningReport').
+
+    If the models were trained with a feature projection, then the same
+    (fitted) projection must be given.
 
     @param models list: A list of the previously trained models.
     @param dataPath: The directory containing the motion files.
     @param translate String: The normalization type for correcting translation
     @param rotate String: The normalization type for correcting rotation
     @param scale String: The normalization type for correcting scaling
+    @param workers Int: The number of processes used for matching, default 1
+    @param projection features.Projection: The projection of the motions used for training, optional
+    @param csv Boolean: Also write the results as csv, default true
+    @return The results of all files, see 'results.Results'
     """
 
     # create list of motion types
     motionTypes = []
     for motionType in sorted(glob.glob(dataPath + '/*/')):
         motionTypes.append(string.split(string.dirname(motionType))[1])
-    # write file header
-    fileToPrint = open(dataPath + '/' + "../scores.csv", "w")
-    fileToPrint.write('Motion,Variation,Name,Translation X,Translation Y,Translation Z')
-    fileToPrint.write(',Rotation W,Rotation X,Rotation Y,Rotation Z')
-    fileToPrint.write(',Scaling X,Scaling Y,Scaling Z')
+    # create list of variations for each motion type
+    variationsOfMotions = []
     for path in motionTypes:
-        fileToPrint.write(',' + path)
-    fileToPrint.write(',Recognized,Correct\n')
+        variations = []
+        for variation in sorted(glob.glob(dataPath + '/' + path + '/*/')):
+            variations.append(string.split(string.dirname(variation))[1])
+        variationsOfMotions.append(variations)
+    folders = [dataPath + '/' + path + '/' + variation
+        for path, variations in zip(motionTypes, variationsOfMotions) for variation in variations]
+    resetPruningStatistics()
+    results = recognizeFolders(models, folders, translate, rotate, scale, workers, projection)
+    collected = recognitionResults.Results(motionTypes)
 
     for pathIndex, path in enumerate(motionTypes):
         #print("Motion: " + path)
         wrongMotions = []
         plot.clearPlot()
-        variations = []
-        for variation in sorted(glob.glob(dataPath + '/' + path + '/*/')):
-            variations.append(string.split(string.dirname(variation))[1])
-        for variation in variations:
+        for variation in variationsOfMotions[pathIndex]:
             #print("Variation: " + variation)
             folder = dataPath + '/' + path + '/' + variation
-            scores, tr, ro, sc, names = recognizeFilesInFolder(models, folder, translate, rotate, scale)
-            # write scores to file
-            for i, name in enumerate(names):
-                fileToPrint.write(path + ',' + variation + ',{:<20},'.format(name))
-                t = tr[i]
-                fileToPrint.write("{:8.3f},{:8.3f},{:8.3f}".format(t[0], t[1], t[2]))
-                r = ro[i]
-                fileToPrint.write(",{:8.3f},{:8.3f},{:8.3f},{:8.3f}".format(r[0], r[1], r[2], r[3]))
-                s = sc[i]
-                fileToPrint.write(",{:8.3f},{:8.3f},{:8.3f}".format(s[0], s[1], s[2]))
-                for score in scores[i]:
-                    fileToPrint.write(",{:7d}".format(int(score)))
-                # find maximum score index
-                m = numpy.argmax(scores[i])
-                fileToPrint.write(',' + motionTypes[m] + ',')
-                fileToPrint.write(str(m == pathIndex))
-                fileToPrint.write('\n')
-                if m != pathIndex:
-                    wrongMotions.append(folder + '/' + name + '.csv')
+            scores, tr, ro, sc, names = next(results)
+            collected.add(pathIndex, variation, names, scores, tr, ro, sc)
+            # find maximum score index
+            if len(names) > 0:
+                recognized = numpy.argmax(numpy.array(scores, dtype=float), axis=1)
+                for i in numpy.flatnonzero(recognized != pathIndex):
+                    wrongMotions.append(folder + '/' + names[i] + '.csv')
         plot.plot('../plots/' + path + ' recognition')
         # Plot wrongly identified motions
-        if len(wrongMotions) > 0:
+        if len(wrongMotions) > 0 and plot.enabled():
             plotFilesInFolder(dataPath + '/' + path + '/training', translate, rotate, scale)
             for file in wrongMotions:
                 plotFile(file, translate, rotate, scale)
             plot.plot('../plots/' + path + ' wrong')
-    fileToPrint.close()
+    results.close()
+    # wait for the deferred plots
+    plot.finishPlots()
+    collected.save(dataPath + '/' + '../scores.npz')
+    if csv:
+        collected.writeCsv(dataPath + '/' + '../scores.csv')
+    report = pruningReport()
+    if report != '':
+        print(report)
+        input.logLn(report)
+    return collected
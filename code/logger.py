@@ -0,0 +1,190 @@
+# This file implements the logging of the training and recognition.
+#
+# A 'Logger' collects the log records in memory and writes them to its file
+# on a background thread, so that logging never waits for the file. The
+# records are written as JSON Lines (one json object per line, with the time,
+# the run, the process and the message, and fields like the motion class and
+# the file), or as plain text with one message per line.
+#
+# Context objects add fields to all records logged through them:
+#
+#   log = logger.Logger('../Log.jsonl')
+#   context = log.context(**{'class': 'wiping'})
+#   context.log('Training', file='sample1.csv')
+#   log.close()
+#
+# A logger can be used from several threads. Worker processes log into a
+# capturing logger (without a file), and return the records to the main
+# process, which adds them to its logger with 'extend'.
+#
+# The functions in 'input' ('setLogFile', 'log', 'logLn') use a logger of
+# this module.
+#
+# The writing thread doesn't keep the program running, so a logger with a file
+# is closed (and its waiting records written) when the program exits, even if
+# 'close' isn't called, e.g. after an error.
+#
+
+import os
+import atexit
+import json
+import time
+import threading
+
+class LogContext:
+    """!
+    Log records with fixed fields.
+    """
+
+    def __init__(self, logger, fields):
+        self.logger = logger
+        self.fields = fields
+
+    def log(self, message='', **fields):
+        """!
+        Log a message with the fields of the context.
+
+        @param message String: The message
+        @param fields: Further fields of the record
+        """
+        self.logger.log(message, **dict(self.fields, **fields))
+
+    def context(self, **fields):
+        """!
+        Create a context with further fields.
+
+        @param fields: The fields added to all records of the new context
+        @return The new context
+        """
+        return LogContext(self.logger, dict(self.fields, **fields))
+
+class Logger:
+    """!
+    Buffered log, written on a background thread.
+    """
+
+    def __init__(self, path='', format='jsonl', run='', flushInterval=0.5, maxRecords=1000):
+        """!
+        Create a logger, and start the thread writing the records.
+
+        @param path String: The file to write to, an empty string only collects the records in memory (see 'records')
+        @param format String: 'jsonl' for JSON Lines, 'text' for the messages only, default 'jsonl'
+        @param run String: The name of the run, added to all records, default the start time and process id
+        @param flushInterval Number: The time in seconds between writes, default 0.5 s
+        @param maxRecords Int: The number of waiting records which are written without waiting, default 1000
+        """
+        self.path = path
+        self.format = format
+        self.run = run if run != '' else time.strftime('%Y%m%d-%H%M%S') + '-' + str(os.getpid())
+        self.flushInterval = flushInterval
+        self.maxRecords = maxRecords
+        self.process = os.getpid()
+        self.buffer = []
+        self.captured = []
+        self.lock = threading.Lock()
+        self.fileLock = threading.Lock()
+        self.wake = threading.Event()
+        self.closed = False
+        self.file = None
+        self.thread = None
+        if path != '':
+            self.file = open(path, 'w')
+            self.thread = threading.Thread(target=self.writeLoop, daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+
+    def context(self, **fields):
+        """!
+        Create a context, which adds fields to all records logged through it.
+
+        @param fields: The fields of the context
+        @return The context
+        """
+        return LogContext(self, fields)
+
+    def log(self, message='', **fields):
+        """!
+        Log a message.
+
+        @param message String: The message
+        @param fields: Further fields of the record, e.g. 'class' and 'file'
+        """
+        record = {'time': time.time(), 'run': self.run, 'process': os.getpid(), 'message': message}
+        record.update(fields)
+        self.extend([record])
+
+    def extend(self, records):
+        """!
+        Add records, e.g. the records of a worker process (see 'records').
+
+        @param records list: The records
+        """
+        if self.closed:
+            return
+        with self.lock:
+            if self.file is None:
+                self.captured.extend(records)
+                return
+            self.buffer.extend(records)
+            full = len(self.buffer) >= self.maxRecords
+        if full:
+            self.wake.set()
+
+    def records(self):
+        """!
+        Take the records collected by a logger without a file.
+
+        @return The list of records
+        """
+        with self.lock:
+            records = self.captured
+            self.captured = []
+        return records
+
+    def writeLoop(self):
+        """!
+        Write the waiting records regularly, until the logger is closed.
+        """
+        while not self.closed:
+            self.wake.wait(self.flushInterval)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        """!
+        Write all waiting records to the file.
+
+        Does nothing in other processes than the one which created the
+        logger, so that forked processes never write the records of their parent.
+        """
+        if self.file is None or os.getpid() != self.process:
+            return
+        with self.fileLock:
+            with self.lock:
+                records = self.buffer
+                self.buffer = []
+            if len(records) == 0 or self.file.closed:
+                return
+            if self.format == 'jsonl':
+                self.file.write(''.join(json.dumps({key: value for key, value in record.items() if key != 'end'}, default=str) + '\n'
+                    for record in records))
+            else:
+                self.file.write(''.join(record['message'] + record.get('end', '\n') for record in records))
+            self.file.flush()
+
+    def close(self):
+        """!
+        Write all waiting records, stop the background thread and close the file.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self.thread is not None:
+            atexit.unregister(self.close)
+            self.wake.set()
+            self.thread.join()
+        try:
+            self.flush()
+        finally:
+            if self.file is not None and os.getpid() == self.process:
+                self.file.close()
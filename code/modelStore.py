@@ -0,0 +1,307 @@
+import os
+import io
+import glob
+import hashlib
+import numpy
+from hmmlearn import hmm
+import corpus
+import features
+
+"""!
+The directory containing the trained models, the store is disabled if empty
+"""
+storeDirectory = ''
+
+"""!
+The trained parameters of a GMMHMM, which are saved in the store
+"""
+parameterNames = ['startprob_', 'transmat_', 'weights_', 'means_', 'covars_']
+
+def setStoreDirectory(directory):
+    """!
+    Set the directory for saving trained models.
+
+    Models trained with 'learning.learnMotions' are saved in the directory,
+    and are loaded from there instead of training them again, as long as the
+    training motions and all settings are the same.
+
+    @param directory String: The directory to use, an empty string disables the store
+    """
+    global storeDirectory
+    if directory != '' and not os.path.isdir(directory):
+        os.makedirs(directory)
+    storeDirectory = directory
+
+def manifest(folder, previous=None, data=None, index=None):
+    """!
+    Create the manifest of the training motions of a motion type.
+
+    The manifest contains the name, size, modification time and a hash of
+    the contents of each training file. The hash of a file is taken from the
+    previous manifest if its size and modification time didn't change. For a
+    packed corpus, the hashes are calculated from the training motions in the
+    corpus instead.
+
+    @param folder String: The directory of the motion type
+    @param previous dict: The previous manifest of the motion type, optional
+    @param data numpy array: The data of a packed corpus, optional
+    @param index dict: The index of a packed corpus, optional
+    @return A dictionary with the arrays 'names', 'sizes', 'mtimes' and 'hashes'
+    """
+    names, sizes, mtimes, hashes = [], [], [], []
+    if data is not None:
+        motions, motionNames = corpus.motions(data, index, os.path.basename(os.path.dirname(folder)))
+        for motion, name in zip(motions, motionNames):
+            names.append(name)
+            sizes.append(len(motion))
+            mtimes.append(0)
+            hashes.append(hashlib.sha1(numpy.ascontiguousarray(motion, dtype=numpy.float64).tobytes()).hexdigest())
+    else:
+        known = {}
+        if previous is not None:
+            known = {name: (size, mtime, value) for name, size, mtime, value in
+                zip(previous['names'], previous['sizes'], previous['mtimes'], previous['hashes'])}
+        for file in sorted(glob.glob(folder + '/training/*.csv')):
+            name = os.path.basename(file)
+            stat = os.stat(file)
+            entry = known.get(name)
+            if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                value = str(entry[2])
+            else:
+                value = fileHash(file)
+            names.append(name)
+            sizes.append(stat.st_size)
+            mtimes.append(stat.st_mtime_ns)
+            hashes.append(value)
+    return {'names': numpy.array(names, dtype=str),
+        'sizes': numpy.array(sizes, dtype=numpy.int64),
+        'mtimes': numpy.array(mtimes, dtype=numpy.int64),
+        'hashes': numpy.array(hashes, dtype=str)}
+
+def fileHash(file):
+    """!
+    Calculate the hash of the contents of a file.
+
+    @param file String: The path of the file
+    @return The hash as a string of hexadecimal digits
+    """
+    key = hashlib.sha1()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            key.update(block)
+    return key.hexdigest()
+
+def configurationKey(configuration):
+    """!
+    Start a hash with all settings used for the training.
+
+    @param configuration dict: All settings used for the training
+    @return The hash object
+    """
+    key = hashlib.sha1()
+    for name in sorted(configuration):
+        key.update((name + '=' + repr(configuration[name]) + '\n').encode())
+    return key
+
+def trainingKey(configuration, manifest):
+    """!
+    Calculate the key of a trained model from its training motions and settings.
+
+    The key is a hash of the settings together with the names and contents of
+    all training motions (see 'manifest'), so that any change of the data or
+    the settings leads to a new key.
+
+    @param configuration dict: All settings used for the training
+    @param manifest dict: The manifest of the training motions
+    @return The key as a string of hexadecimal digits
+    """
+    key = configurationKey(configuration)
+    for name, value in zip(manifest['names'], manifest['hashes']):
+        key.update((str(name) + '\n' + str(value) + '\n').encode())
+    return key.hexdigest()
+
+def manifestPath(folder, configuration):
+    """!
+    Get the path of the latest manifest of a motion type trained with some settings.
+
+    @param folder String: The directory of the motion type
+    @param configuration dict: All settings used for the training
+    @return The path of the manifest file
+    """
+    key = configurationKey(configuration)
+    key.update(os.path.basename(os.path.dirname(folder)).encode())
+    return os.path.join(storeDirectory, key.hexdigest() + '.manifest.npz')
+
+def loadManifest(folder, configuration):
+    """!
+    Load the manifest of the latest model of a motion type trained with some settings.
+
+    @param folder String: The directory of the motion type
+    @param configuration dict: All settings used for the training
+    @return The manifest with the key of the model in 'model' and of its projection in 'projection', or None if the store is disabled or has no manifest
+    """
+    if storeDirectory == '':
+        return None
+    try:
+        with numpy.load(manifestPath(folder, configuration), allow_pickle=False) as data:
+            return {key: data[key] for key in data.files}
+    except (OSError, KeyError, ValueError):
+        return None
+
+def saveManifest(folder, configuration, manifest, key, projection=''):
+    """!
+    Save the manifest of the latest model of a motion type.
+
+    Does nothing if the store is disabled.
+
+    @param folder String: The directory of the motion type
+    @param configuration dict: All settings used for the training
+    @param manifest dict: The manifest of the training motions
+    @param key String: The key of the trained model
+    @param projection String: The key of the fitted feature projection of the model, see 'saveProjection', optional
+    """
+    if storeDirectory == '':
+        return
+    buffer = io.BytesIO()
+    numpy.savez(buffer, model=key, projection=projection, **manifest)
+    writeEntry(manifestPath(folder, configuration), buffer)
+
+def modelSetPath(configuration):
+    """!
+    Get the path of the latest set of models trained with some settings.
+
+    @param configuration dict: All settings used for the training
+    @return The path of the file
+    """
+    return os.path.join(storeDirectory, configurationKey(configuration).hexdigest() + '.models.npz')
+
+def loadModelSet(configuration):
+    """!
+    Load the latest set of models trained with some settings (see 'saveModelSet').
+
+    @param configuration dict: All settings used for the training
+    @return A dictionary with the list of the motion 'names', the list of the keys of their 'models',
+    and the key of the fitted 'projection' (empty without projection), or None if the store is disabled or has no set
+    """
+    if storeDirectory == '':
+        return None
+    try:
+        with numpy.load(modelSetPath(configuration), allow_pickle=False) as data:
+            return {'names': [str(name) for name in data['names']],
+                'models': [str(key) for key in data['models']],
+                'projection': str(data['projection'])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+def saveModelSet(configuration, names, keys, projection=''):
+    """!
+    Save which models were trained together with some settings, in the order of the motion types.
+
+    Does nothing if the store is disabled.
+
+    @param configuration dict: All settings used for the training
+    @param names list: The name of the motion type of each model
+    @param keys list: The key of each model
+    @param projection String: The key of the fitted feature projection of the models, optional
+    """
+    if storeDirectory == '':
+        return
+    buffer = io.BytesIO()
+    numpy.savez(buffer, names=numpy.array(names, dtype=str), models=numpy.array(keys, dtype=str), projection=projection)
+    writeEntry(modelSetPath(configuration), buffer)
+
+def entryPath(key):
+    """!
+    Get the path of the stored model with a key.
+
+    @param key String: The key of the model
+    @return The path of the model file
+    """
+    return os.path.join(storeDirectory, key + '.npz')
+
+def load(key):
+    """!
+    Load a trained model from the store.
+
+    @param key String: The key of the model, see 'trainingKey'
+    @return The model, or None if the store is disabled or has no model with the key
+    """
+    if storeDirectory == '':
+        return None
+    try:
+        with numpy.load(entryPath(key), allow_pickle=False) as data:
+            model = hmm.GMMHMM(n_components=int(data['n_components']),
+                n_mix=int(data['n_mix']),
+                covariance_type=str(data['covariance_type']),
+                n_iter=int(data['n_iter']),
+                init_params='')
+            for name in parameterNames:
+                setattr(model, name, data[name])
+    except (OSError, KeyError, ValueError):
+        return None
+    model.n_features = model.means_.shape[-1]
+    return model
+
+def save(key, model):
+    """!
+    Save a trained model in the store.
+
+    Only the parameters of the model are saved as numpy arrays, so that
+    loading doesn't depend on pickled classes. Does nothing if the store is disabled.
+
+    @param key String: The key of the model, see 'trainingKey'
+    @param model hmm.GMMHMM: The trained model
+    """
+    if storeDirectory == '':
+        return
+    buffer = io.BytesIO()
+    numpy.savez(buffer,
+        n_components=model.n_components,
+        n_mix=model.n_mix,
+        covariance_type=model.covariance_type,
+        n_iter=model.n_iter,
+        **{name: getattr(model, name) for name in parameterNames})
+    writeEntry(entryPath(key), buffer)
+
+def loadProjection(key):
+    """!
+    Load a fitted feature projection from the store.
+
+    @param key String: The key of the projection, see 'features.Projection.key'
+    @return The projection, or None if the store is disabled or has no projection with the key
+    """
+    if storeDirectory == '':
+        return None
+    try:
+        with numpy.load(os.path.join(storeDirectory, key + '.projection.npz'), allow_pickle=False) as data:
+            return features.fromArrays({name: data[name] for name in data.files})
+    except (OSError, KeyError, ValueError):
+        return None
+
+def saveProjection(projection):
+    """!
+    Save a feature projection in the store, with the key of the projection.
+
+    Does nothing if the store is disabled.
+
+    @param projection features.Projection: The (fitted) projection
+    """
+    if storeDirectory == '':
+        return
+    buffer = io.BytesIO()
+    numpy.savez(buffer, **projection.arrays())
+    writeEntry(os.path.join(storeDirectory, projection.key() + '.projection.npz'), buffer)
+
+def writeEntry(path, buffer):
+    """!
+    Write a file of the store.
+
+    The file is written to a temporary file first, so that other runs never see partial files.
+
+    @param path String: The path of the file
+    @param buffer io.BytesIO: The contents of the file
+    """
+    temporary = path + '.' + str(os.getpid())
+    with open(temporary, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(temporary, path)
@@ -1,11 +1,57 @@
 
+import numpy
 from input import read
 import translation
 import rotation
 import scaling
 import cleaning
+import quaternion
+import resampling
+import instrumentation
 
-def readNormalized(file, translate='', rotate='', scale='', clean=True):
+"""!
+The resampling of 'normalize' and 'normalizeBatch' if none is given, see 'setResampling'
+"""
+resampleMode = ''
+
+"""!
+The number of poses of each motion resampled by 'frames'
+"""
+resampleSamples = 100
+
+"""!
+The distance between the poses of each motion resampled by 'arclength'
+"""
+resampleSpacing = 0.05
+
+def setResampling(mode='', samples=100, spacing=0.05):
+    """!
+    Set the resampling of all normalized motions.
+
+    Resampling shortens the motions to a fixed number of poses, or to poses
+    at a fixed distance along the path, which makes training and scoring the
+    models faster (see 'resampling.resample'). The setting is used by all
+    functions which don't get a resampling, and is part of the settings of
+    the models in the model store.
+
+    @param mode String: The resampling ('frames' or 'arclength'), an empty string disables the resampling
+    @param samples Int: The number of poses of each motion resampled by 'frames', default 100
+    @param spacing Number: The distance between the poses of each motion resampled by 'arclength', default 0.05
+    """
+    global resampleMode, resampleSamples, resampleSpacing
+    resampleMode = mode
+    resampleSamples = samples
+    resampleSpacing = spacing
+
+def resamplingSettings():
+    """!
+    Get the resampling set with 'setResampling'.
+
+    @return The mode, the number of poses and the spacing, in the order of the arguments of 'setResampling'
+    """
+    return resampleMode, resampleSamples, resampleSpacing
+
+def readNormalized(file, translate='', rotate='', scale='', clean=True, resample=None, samples=None, spacing=None):
     """!
     Read a motion from a file path and apply normalization to it.
 
@@ -14,28 +60,181 @@ def readNormalized(file, translate='', rotate='', scale='', clean=True):
     @param rotate: The normalization for rotating the motions
     @param scale: The normalization for scaling the motions
     @param cleaning: Remove duplicate points and large jumps, default true
+    @param resample: The resampling of the motion, default the one set with 'setResampling'
+    @param samples: The number of poses of the resampled motion, default the one set with 'setResampling'
+    @param spacing: The distance between the poses of the resampled motion, default the one set with 'setResampling'
     @return: The normalized motion and the normalization parameters
     """
     motion = read(file)
-    motion, t, r, s = normalize(motion, translate, rotate, scale, clean)
+    motion, t, r, s = normalize(motion, translate, rotate, scale, clean, motion, resample, samples, spacing)
     return motion, t, r, s
 
-def normalize(motion, translate='', rotate='', scale='', clean=True):
+def readNormalizedBatch(files, translate='', rotate='', scale='', clean=True, resample=None, samples=None, spacing=None):
+    """!
+    Read motions from a list of file paths and normalize them all at once.
+
+    @param files list: The file paths of the motions
+    @param translate: The normalization for translating the motions
+    @param rotate: The normalization for rotating the motions
+    @param scale: The normalization for scaling the motions
+    @param cleaning: Remove duplicate points and large jumps, default true
+    @param resample: The resampling of the motions, default the one set with 'setResampling'
+    @param samples: The number of poses of each resampled motion, default the one set with 'setResampling'
+    @param spacing: The distance between the poses of each resampled motion, default the one set with 'setResampling'
+    @return: The list of normalized motions and the normalization parameters of each motion
+    """
+    if len(files) == 0:
+        return [], numpy.zeros((0, 3)), numpy.zeros((0, 4)), numpy.zeros((0, 3))
+    motions, offsets = concatenate([read(file) for file in files])
+    motions, offsets, t, r, s = normalizeBatch(motions, offsets, translate, rotate, scale, clean, motions, resample, samples, spacing)
+    return split(motions, offsets), t, r, s
+
+def normalize(motion, translate='', rotate='', scale='', clean=True, out=None, resample=None, samples=None, spacing=None):
     """!
     Apply normalization to a motion.
 
-    The input motion is not modified.
+    The input motion is not modified. Translation, rotation and scaling are
+    combined into a single transformation of the positions and a single
+    multiplication of the rotations, which are applied to all poses at once.
+    The transformed motion is written to 'out', if given. Finally, the
+    cleaned motion is resampled (see 'resampling.resample'), which gives a
+    new array.
 
     @param motion numpy.array: The motion to normalize
     @param translate: The normalization for translating the motions
     @param rotate: The normalization for rotating the motions
     @param scale: The normalization for scaling the motions
     @param cleaning: Remove duplicate points and large jumps, default true
+    @param out numpy.array: Array of the same shape as the motion for the result, optional
+    @param resample: The resampling of the motion, default the one set with 'setResampling'
+    @param samples: The number of poses of the resampled motion, default the one set with 'setResampling'
+    @param spacing: The distance between the poses of the resampled motion, default the one set with 'setResampling'
     @return: The normalized motion and the normalization parameters
     """
-    out = motion
-    translationRef = translation.translate(out[:,1:4], translate)
-    rotationRef = rotation.rotate(out[:,1:8], rotate)
-    scalingRef = scaling.scale(out[:,1:4], scale)
-    out, removedPoints = cleaning.clean(motion)
+    if out is None:
+        out = numpy.empty(motion.shape)
+    positions = out[:,1:4]
+    rows = len(motion)
+    # reference translation and rotation of the original motion
+    with instrumentation.stage('normalize.translation', rows):
+        translationRef = translation.reference(motion[:,1:4], translate)
+    with instrumentation.stage('normalize.rotation', rows):
+        rotationRef = rotation.reference(motion[:,1:8], rotate)
+        # rotate by the inverse of the reference
+        q = quaternion.conjugate(quaternion.normalized(rotationRef))
+        if numpy.array_equal(q, [1.0, 0.0, 0.0, 0.0]):
+            numpy.subtract(motion[:,1:4], translationRef, out=positions)
+            out[:,4:8] = motion[:,4:8]
+        else:
+            R = quaternion.toMatrix(q)
+            numpy.matmul(motion[:,1:4], R.T, out=positions)
+            positions -= R.dot(translationRef)
+            numpy.matmul(motion[:,4:8], quaternion.productMatrix(q), out=out[:,4:8])
+    # scale around the center of the translated and rotated positions
+    with instrumentation.stage('normalize.scaling', rows):
+        maximums = numpy.max(positions, axis=0)
+        minimums = numpy.min(positions, axis=0)
+        scalingRef = scaling.factors(minimums, maximums, scale)
+        if scalingRef is None:
+            scalingRef = numpy.zeros(3)
+        else:
+            positions *= scalingRef
+            positions += (maximums + minimums) / 2 * (1 - scalingRef)
+    out[:,0] = motion[:,0]
+    out[:,8:] = motion[:,8:]
+    if clean:
+        with instrumentation.stage('normalize.clean', rows):
+            out, removedPoints = cleaning.clean(out)
+    if resample is None:
+        resample = resampleMode
+    if resample != '':
+        with instrumentation.stage('normalize.resample', len(out)):
+            out = resampling.resample(out, resample, resampleSamples if samples is None else samples,
+                resampleSpacing if spacing is None else spacing)
     return out, translationRef, rotationRef, scalingRef
+
+def normalizeBatch(motions, offsets, translate='', rotate='', scale='', clean=True, out=None, resample=None, samples=None, spacing=None):
+    """!
+    Apply normalization to many motions at once.
+
+    The motions are concatenated in one array, with the index of the first
+    row of each motion in 'offsets'. Each motion is normalized as with
+    'normalize', but all references are calculated for all motions together.
+    The input motions are not modified and must not be empty.
+
+    @param motions numpy.array: The concatenated motions to normalize
+    @param offsets numpy.array: The index of the first row of each motion, in increasing order
+    @param translate: The normalization for translating the motions
+    @param rotate: The normalization for rotating the motions
+    @param scale: The normalization for scaling the motions
+    @param cleaning: Remove duplicate points and large jumps, default true
+    @param out numpy.array: Array of the same shape as the motions for the result, optional
+    @param resample: The resampling of the motions, default the one set with 'setResampling'
+    @param samples: The number of poses of each resampled motion, default the one set with 'setResampling'
+    @param spacing: The distance between the poses of each resampled motion, default the one set with 'setResampling'
+    @return: The concatenated normalized motions, their offsets, and the normalization parameters of each motion
+    """
+    offsets = numpy.asarray(offsets, dtype=numpy.intp)
+    lengths = numpy.diff(numpy.append(offsets, len(motions)))
+    motionIndex = numpy.repeat(numpy.arange(len(offsets)), lengths)
+    if out is None:
+        out = numpy.empty(motions.shape)
+    positions = out[:,1:4]
+    rows = len(motions)
+    # reference translation and rotation of the original motions
+    with instrumentation.stage('normalize.translation', rows):
+        translationRef = translation.referenceBatch(motions[:,1:4], offsets, translate)
+        numpy.subtract(motions[:,1:4], translationRef[motionIndex], out=positions)
+    with instrumentation.stage('normalize.rotation', rows):
+        rotationRef = rotation.referenceBatch(motions[:,1:8], offsets, rotate)
+        # rotate by the inverse of the references
+        q = quaternion.conjugate(quaternion.normalized(rotationRef))
+        if numpy.all(q == [1.0, 0.0, 0.0, 0.0]):
+            out[:,4:8] = motions[:,4:8]
+        else:
+            q = q[motionIndex]
+            positions[:] = quaternion.rotate(q, positions)
+            out[:,4:8] = quaternion.multiply(motions[:,4:8], q)
+    # scale around the center of the translated and rotated positions
+    with instrumentation.stage('normalize.scaling', rows):
+        maximums = numpy.maximum.reduceat(positions, offsets, axis=0)
+        minimums = numpy.minimum.reduceat(positions, offsets, axis=0)
+        scalingRef = scaling.factors(minimums, maximums, scale)
+        if scalingRef is None:
+            scalingRef = numpy.zeros((len(offsets), 3))
+        else:
+            positions *= scalingRef[motionIndex]
+            positions += ((maximums + minimums) / 2 * (1 - scalingRef))[motionIndex]
+    out[:,0] = motions[:,0]
+    out[:,8:] = motions[:,8:]
+    if clean:
+        with instrumentation.stage('normalize.clean', rows):
+            out, offsets, removedPoints = cleaning.cleanBatch(out, offsets)
+    if resample is None:
+        resample = resampleMode
+    if resample != '':
+        with instrumentation.stage('normalize.resample', len(out)):
+            out, offsets = resampling.resampleBatch(out, offsets, resample, resampleSamples if samples is None else samples,
+                resampleSpacing if spacing is None else spacing)
+    return out, offsets, translationRef, rotationRef, scalingRef
+
+def concatenate(motions):
+    """!
+    Concatenate motions into one array for 'normalizeBatch'.
+
+    @param motions list: The motions to concatenate
+    @return: The concatenated motions, and the index of the first row of each motion
+    """
+    lengths = [len(motion) for motion in motions]
+    offsets = numpy.cumsum([0] + lengths[:-1])
+    return numpy.concatenate(motions), offsets
+
+def split(motions, offsets):
+    """!
+    Split concatenated motions into a list of motions (views of the array).
+
+    @param motions numpy.array: The concatenated motions
+    @param offsets numpy.array: The index of the first row of each motion
+    @return: The list of motions
+    """
+    return numpy.split(motions, offsets[1:])
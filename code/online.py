@@ -0,0 +1,207 @@
+# This file implements the online scoring of motions, which arrive frame by
+# frame (e.g. from a live controller), with the models trained by
+# 'learning.learnMotions'.
+#
+# Instead of scoring the complete motion again for each new frame, the
+# forward variables of the forward algorithm are kept for every model, so that
+# each new frame only needs the emission probabilities of the frame and one
+# step of the forward recursion. Both are calculated for all models at once
+# with a 'scoring.ScoringEngine'.
+#
+# For spotting gestures in a continuous stream, new hypotheses (possible
+# starts of a gesture) are started regularly, and each hypothesis is scored
+# from its start. Each hypothesis normalizes its frames with its own
+# 'streaming.StreamingNormalizer', so that the references are taken from the
+# start of the hypothesis, as with a pre-segmented motion. If the models were
+# trained on the features of a 'features.Projection', the normalized frames
+# are transformed chunk by chunk before scoring.
+#
+
+import numpy
+import normalization
+from streaming import StreamingNormalizer
+from scoring import ScoringEngine, logSumExp
+
+class ForwardState:
+    """!
+    The forward variables of all models for the frames of one hypothesis.
+    """
+
+    def __init__(self, engine):
+        """!
+        Start the forward algorithm for all models of an engine.
+
+        @param engine scoring.ScoringEngine: The engine of the models
+        """
+        self.engine = engine
+        self.logAlpha = None
+
+    def update(self, frames):
+        """!
+        Add frames to the forward algorithm.
+
+        @param frames numpy.array: The new (normalized) frames
+        @return The log likelihood of all frames so far for each model
+        """
+        self.logAlpha = self.engine.forwardFrames(self.logAlpha, self.engine.emissions(frames))
+        return self.scores()
+
+    def scores(self):
+        """!
+        Get the log likelihood of all frames so far for each model.
+
+        @return The log likelihoods, all 0 if there are no frames yet
+        """
+        if self.logAlpha is None:
+            return numpy.zeros(len(self.engine))
+        return logSumExp(self.logAlpha, axis=-1)
+
+class Hypothesis:
+    """!
+    A possible start of a gesture, scored with all models from this frame on.
+    """
+
+    def __init__(self, start, engine, translate, rotate, scale, clean, resampling, projection=None):
+        self.start = start
+        self.length = 0
+        self.normalizer = StreamingNormalizer(translate, rotate, scale, clean, resampling=resampling)
+        self.projection = projection
+        # the last normalized frame, for the velocities of the next chunk
+        self.last = None
+        self.state = ForwardState(engine)
+
+    def push(self, frames):
+        """!
+        Normalize new frames and add them to the forward algorithm of all models.
+
+        @param frames numpy.array: The new frames
+        """
+        self.length += len(frames)
+        frames = self.normalizer.push(frames)
+        if len(frames) == 0:
+            return
+        if self.projection is not None:
+            if self.last is None:
+                features = self.projection.transform(frames)
+            else:
+                features = self.projection.transform(numpy.vstack((self.last, frames)))[1:]
+            self.last = frames[-1:]
+            frames = features
+        self.state.update(frames)
+
+    def scores(self):
+        """!
+        @return The log likelihood of the frames of the hypothesis for each model
+        """
+        return self.state.scores()
+
+class OnlineScorer:
+    """!
+    Score a motion frame by frame with all trained models.
+
+    Without a window, all frames since the start (or the last 'reset') are
+    scored, which gives the same result as scoring the complete motion with
+    'learning.scoreMotion' (except for the references of the streaming
+    normalization, see 'streaming.StreamingNormalizer').
+
+    With a window, a new hypothesis is started every 'stride' frames, and
+    hypotheses are dropped after 'window' frames. The scores are those of the
+    oldest hypothesis, which covers the last 'window' frames (or a few frames
+    less, up to 'stride').
+
+    The motion format should be:
+
+    | Frame | x | y | z | RotW | RotX | RotY | RotZ |
+    """
+
+    def __init__(self, models, names=None, translate='', rotate='', scale='', clean=True, window=0, stride=0, resampling=None, projection=None):
+        """!
+        Create a scorer for a new stream.
+
+        @param models list: The previously trained HMM models, or a 'scoring.ScoringEngine'
+        @param names list: The name of the motion of each model, optional
+        @param translate String: The normalization type for correcting translation
+        @param rotate String: The normalization type for correcting rotation
+        @param scale String: The normalization type for correcting scaling
+        @param clean Boolean: Remove duplicate points and start a new part at large jumps, default true
+        @param window Int: The number of frames of a hypothesis, default 0 (no window)
+        @param stride Int: The number of frames between the starts of hypotheses (at most the window), default a quarter of the window
+        @param resampling tuple: The resampling of the motions used for training (see 'normalization.setResampling'), default the one set there
+        @param projection features.Projection: The fitted projection of the motions used for training, optional (see 'learning.learnMotions')
+        """
+        self.engine = models if isinstance(models, ScoringEngine) else ScoringEngine(models)
+        self.names = list(names) if names is not None else list(range(len(self.engine)))
+        self.normalization = (translate, rotate, scale, clean,
+            normalization.resamplingSettings() if resampling is None else resampling, projection)
+        if 'frames' in self.normalization[4][0]:
+            raise ValueError("Resampling to a fixed number of poses needs the complete motion, use 'arclength' for online scoring")
+        self.window = window
+        self.stride = min(stride, window) if stride > 0 else max(1, window // 4)
+        self.reset()
+
+    def reset(self):
+        """!
+        Forget all frames and start a new stream.
+        """
+        self.frames = 0
+        self.hypotheses = []
+
+    def push(self, frames):
+        """!
+        Add frames to the stream and update the scores.
+
+        @param frames numpy.array: The new frames, one per row
+        @return The log likelihood of each model, see 'scores'
+        """
+        frames = numpy.atleast_2d(numpy.asarray(frames, dtype=float))
+        while len(frames) > 0:
+            if self.window > 0:
+                # drop the hypotheses which cover a whole window
+                while len(self.hypotheses) > 0 and self.hypotheses[0].length >= self.window:
+                    self.hypotheses.pop(0)
+                if len(self.hypotheses) == 0 or self.frames % self.stride == 0:
+                    self.hypotheses.append(Hypothesis(self.frames, self.engine, *self.normalization))
+                # frames until the next hypothesis starts or the oldest one is complete
+                count = min(self.stride - self.frames % self.stride, self.window - self.hypotheses[0].length, len(frames))
+            else:
+                if len(self.hypotheses) == 0:
+                    self.hypotheses.append(Hypothesis(self.frames, self.engine, *self.normalization))
+                count = len(frames)
+            for hypothesis in self.hypotheses:
+                hypothesis.push(frames[:count])
+            self.frames += count
+            frames = frames[count:]
+        return self.scores()
+
+    def scores(self):
+        """!
+        Get the log likelihood of the frames of the oldest hypothesis for each model.
+
+        @return The log likelihoods, all 0 if there are no frames yet
+        """
+        if len(self.hypotheses) == 0:
+            return numpy.zeros(len(self.engine))
+        return self.hypotheses[0].scores()
+
+    def allScores(self):
+        """!
+        Get the scores of all active hypotheses.
+
+        @return The first frame of each hypothesis, the number of frames, and the log likelihoods (one row per hypothesis)
+        """
+        starts = numpy.array([hypothesis.start for hypothesis in self.hypotheses], dtype=int)
+        lengths = numpy.array([hypothesis.length for hypothesis in self.hypotheses], dtype=int)
+        scores = numpy.array([hypothesis.scores() for hypothesis in self.hypotheses]).reshape(-1, len(self.engine))
+        return starts, lengths, scores
+
+    def recognized(self):
+        """!
+        Get the motion with the highest score of the oldest hypothesis.
+
+        @return The name of the motion and its log likelihood, or (None, 0) if there are no frames yet
+        """
+        scores = self.scores()
+        if len(self.hypotheses) == 0 or len(scores) == 0:
+            return None, 0.0
+        best = int(numpy.argmax(scores))
+        return self.names[best], float(scores[best])
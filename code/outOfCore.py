@@ -0,0 +1,471 @@
+# This file implements the normalization of motions which are too large to
+# be held in memory several times.
+#
+# The motion is read from its csv file in chunks, and all further work is done
+# chunk by chunk in place on a binary copy of the motion, which is written
+# directly into the output file (after space kept for the numpy header), so
+# that the memory use only depends on the chunk size:
+#
+# 1. Parse the file, copy the rows to the output file and gather the running
+#    statistics of the references (first and last row, sum of the positions,
+#    quaternion accumulator), and the extent of the rotated positions if the
+#    rotation reference is known from the first row
+# 2. Select the exact median of the positions, if needed, and gather the
+#    extent of the rotated positions in its first pass (or in a pass of its
+#    own, if neither is possible in the first pass)
+# 3. Translate, rotate and scale the motion, remove duplicate points, and
+#    gather the mean distance between the points (the jump threshold)
+# 4. Find the jumps and the largest part between them
+# 5. Move the largest part to the beginning of the output file, or write it
+#    resampled if a resampling is set (see 'normalization.setResampling')
+#
+# The result is the same as with 'normalization.normalize'.
+#
+
+import os
+import struct
+import numpy
+import input
+import scaling
+import quaternion
+import normalization
+from resampling import PathResampler, interpolate
+from cleaning import length, distinctPoints
+from averageQuaternions import largestEigenVector
+
+"""!
+The number of bytes kept for the header of the output file
+"""
+headerSize = 128
+
+def normalizeFile(file, outputPath, translate='', rotate='', scale='', clean=True, separator=',',
+        chunkSize=65536, threshold=1E-7, factor=3, resampling=None):
+    """!
+    Normalize a motion file with a fixed amount of memory, independent of the length of the motion.
+
+    The normalized motion is written to a numpy file ('.npy'), which is
+    returned memory-mapped. See the top of this file for the individual passes.
+
+    @param file String: The path of the motion file
+    @param outputPath String: The path of the numpy file for the normalized motion
+    @param translate: The normalization for translating the motion
+    @param rotate: The normalization for rotating the motion
+    @param scale: The normalization for scaling the motion
+    @param clean: Remove duplicate points and large jumps, default true
+    @param separator String: The Character between values, defaults to ','
+    @param chunkSize Int: The number of rows processed at once, default 65536
+    @param threshold Number: The distance between two points to be considered equal, default 1E-7
+    @param factor Number: The threshold for detecting jumps as a multiple of the mean distance between all points, default 3
+    @param resampling tuple: The resampling (see 'normalization.setResampling'), default the one set there
+    @return: The normalized motion (memory-mapped) and the normalization parameters
+    """
+    try:
+        statistics = spill(file, outputPath, rotate, separator)
+        rows = statistics['rows']
+        if rows == 0:
+            raise ValueError('No motion data in ' + file)
+        data = numpy.memmap(outputPath, dtype=numpy.float64, mode='r+', offset=headerSize, shape=(rows, int(statistics['columns'])))
+        rotationRef = rotationReference(statistics, rotate)
+        extent = statistics['extent']
+        if extent is None:
+            extent = Extent(rotationRef)
+        translationRef = translationReference(data, statistics, translate, chunkSize, extent.add if extent.rows == 0 else None)
+        if extent.rows == 0:
+            for begin in range(0, rows, chunkSize):
+                extent.add(data[begin:begin + chunkSize])
+        # extent of the translated and rotated positions
+        shift = extent.R.dot(translationRef)
+        minimums = extent.minimums - shift
+        maximums = extent.maximums - shift
+        scalingRef = scaling.factors(minimums, maximums, scale)
+        if scalingRef is None:
+            scalingRef = numpy.zeros(3)
+            center = numpy.zeros(3)
+            factors = numpy.ones(3)
+        else:
+            center = (maximums + minimums) / 2
+            factors = scalingRef
+        start = 0
+        end, reference = transformAndClean(data, translationRef, rotationRef, center, factors, chunkSize, clean, threshold)
+        if clean and end >= 2:
+            start, end = largestPart(data[:end], reference / (end - 1), chunkSize, factor)
+        mode, samples, spacing = normalization.resamplingSettings() if resampling is None else resampling
+        if 'frames' in mode or 'arclength' in mode:
+            resampledPath = outputPath + '.resampled'
+            resamplePart(data, start, end, resampledPath, mode, samples, spacing, chunkSize)
+            del data
+            os.replace(resampledPath, outputPath)
+        else:
+            movePart(data, start, end, clean, chunkSize)
+            del data
+            with open(outputPath, 'r+b') as f:
+                f.truncate(headerSize + (end - start) * int(statistics['columns']) * 8)
+                writeHeader(f, (end - start, int(statistics['columns'])))
+    except BaseException:
+        for path in (outputPath, outputPath + '.resampled'):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return numpy.load(outputPath, mmap_mode='r'), translationRef, rotationRef, scalingRef
+
+def writeHeader(f, shape):
+    """!
+    Write the header of a numpy file of floats, padded to 'headerSize' bytes.
+
+    @param f file: The file, opened for writing in binary mode
+    @param shape tuple: The shape of the array
+    """
+    header = repr({'descr': numpy.lib.format.dtype_to_descr(numpy.dtype(numpy.float64)), 'fortran_order': False, 'shape': tuple(int(size) for size in shape)})
+    f.seek(0)
+    f.write(numpy.lib.format.magic(1, 0) + struct.pack('<H', headerSize - 10) + header.ljust(headerSize - 11).encode('latin1') + b'\n')
+
+class Extent:
+    """!
+    The smallest and largest value of each dimension of the rotated positions
+    of a motion, gathered chunk by chunk.
+    """
+
+    def __init__(self, rotationRef):
+        """!
+        @param rotationRef numpy.array: The rotation reference
+        """
+        q = quaternion.conjugate(quaternion.normalized(rotationRef))
+        self.identity = numpy.array_equal(q, [1.0, 0.0, 0.0, 0.0])
+        self.R = quaternion.toMatrix(q)
+        self.minimums = numpy.full(3, numpy.inf)
+        self.maximums = numpy.full(3, -numpy.inf)
+        self.rows = 0
+
+    def add(self, chunk):
+        """!
+        Add rows of the motion.
+
+        @param chunk numpy.array: The rows
+        """
+        positions = chunk[:,1:4] if self.identity else chunk[:,1:4].dot(self.R.T)
+        self.minimums = numpy.minimum(self.minimums, numpy.min(positions, axis=0))
+        self.maximums = numpy.maximum(self.maximums, numpy.max(positions, axis=0))
+        self.rows += len(chunk)
+
+def spill(file, outputPath, rotate='', separator=','):
+    """!
+    Copy the rows of a motion file to a binary file (after 'headerSize' bytes)
+    and gather the statistics needed for the references.
+
+    @param file String: The path of the motion file
+    @param outputPath String: The path of the binary file
+    @param rotate: The normalization for rotating the motion
+    @param separator String: The Character between values
+    @return: A dictionary with the number of rows and columns, the first and
+    last row, the sum of the positions, the sums of the quaternion outer
+    products and the quaternions, and the extent of the rotated positions
+    (an 'Extent', or None if the rotation reference depends on later rows)
+    """
+    statistics = {'rows': 0, 'columns': 0, 'first': None, 'last': None, 'extent': None,
+        'positionSum': numpy.zeros(3), 'rotationSum': numpy.zeros((4,4)), 'rotationDirection': numpy.zeros(4)}
+    with open(outputPath, 'wb') as f:
+        f.write(bytes(headerSize))
+        for chunk in input.readChunks(file, separator):
+            f.write(numpy.ascontiguousarray(chunk, dtype=numpy.float64).tobytes())
+            rotations = chunk[:,4:8]
+            if statistics['first'] is None:
+                statistics['first'] = chunk[0].copy()
+                statistics['columns'] = chunk.shape[1]
+                if 'mean' not in rotate and ('start' in rotate or 'end' not in rotate):
+                    statistics['extent'] = Extent(rotationReference(statistics, rotate))
+            statistics['last'] = chunk[-1].copy()
+            statistics['rows'] += len(chunk)
+            statistics['positionSum'] += numpy.sum(chunk[:,1:4], axis=0)
+            statistics['rotationSum'] += rotations.T.dot(rotations)
+            statistics['rotationDirection'] += numpy.sum(rotations, axis=0)
+            if statistics['extent'] is not None:
+                statistics['extent'].add(chunk)
+        if statistics['rows'] > 0:
+            writeHeader(f, (statistics['rows'], statistics['columns']))
+    return statistics
+
+def translationReference(data, statistics, mode, chunkSize, visit=None):
+    """!
+    Calculate the translation reference (see 'translation.translate').
+
+    @param data numpy.array: The motion
+    @param statistics dict: The statistics gathered by 'spill'
+    @param mode: The translation reference
+    @param chunkSize Int: The number of rows processed at once
+    @param visit function: Called with each chunk of rows, if a pass over the data is needed for the median, optional
+    @return: The normalization translation for each dimension
+    """
+    if 'start' in mode:
+        return statistics['first'][1:4].copy()
+    if 'median' in mode:
+        rows = statistics['rows']
+        # average of the two middle values, which are the same for an odd number of rows
+        columns = numpy.array([1, 2, 3, 1, 2, 3])
+        ranks = numpy.array([(rows - 1) // 2] * 3 + [rows // 2] * 3)
+        middle = orderStatistics(data, columns, ranks, chunkSize, visit=visit)
+        return (middle[:3] + middle[3:]) / 2
+    if 'mean' in mode:
+        return statistics['positionSum'] / statistics['rows']
+    if 'end' in mode:
+        return statistics['last'][1:4].copy()
+    return numpy.zeros(3)
+
+def rotationReference(statistics, mode):
+    """!
+    Calculate the rotation reference (see 'rotation.rotate').
+
+    @param statistics dict: The statistics gathered by 'spill'
+    @param mode: The rotation reference
+    @return: The normalization rotation
+    """
+    if 'mean' in mode:
+        return largestEigenVector(statistics['rotationSum'] / statistics['rows'], statistics['rotationDirection'])
+    elif 'start' in mode:
+        return statistics['first'][4:8].copy()
+    elif 'end' in mode:
+        return statistics['last'][4:8].copy()
+    return numpy.array([1.0,0.0,0.0,0.0])
+
+def sortKeys(values):
+    """!
+    Map floating point numbers to unsigned integers with the same order.
+
+    @param values numpy.array: The numbers
+    @return: The integer keys
+    """
+    bits = numpy.ascontiguousarray(values, dtype=numpy.float64).view(numpy.uint64)
+    negative = (bits >> numpy.uint64(63)).astype(bool)
+    return numpy.where(negative, ~bits, bits | numpy.uint64(1 << 63))
+
+def orderStatistics(data, columns, ranks, chunkSize, digits=16, visit=None):
+    """!
+    Select the values with the given ranks in columns of a large array
+    (the values at these indices, if the columns were sorted).
+
+    The values are selected exactly by a radix selection on the bits of the
+    numbers, with one histogram of 'digits' bits per pass over the data. As soon
+    as the remaining candidates of all selections fit into a chunk, they are
+    collected and selected directly.
+
+    @param data numpy.array: The array
+    @param columns numpy.array: The column of each selection
+    @param ranks numpy.array: The rank of each selection
+    @param chunkSize Int: The number of rows processed at once
+    @param digits Int: The number of bits handled in each pass
+    @param visit function: Called with each chunk of rows in the first pass, to gather further statistics, optional
+    @return: The selected value of each selection
+    """
+    selections = len(columns)
+    ranks = numpy.array(ranks, dtype=numpy.int64)
+    prefixes = numpy.zeros(selections, dtype=numpy.uint64)
+    shift = 64
+    while shift > 0:
+        # count the candidates of each selection by the next digit (the last one may be shorter)
+        digits = min(digits, shift)
+        bins = 1 << digits
+        shift -= digits
+        counts = numpy.zeros(selections * bins, dtype=numpy.int64)
+        for begin in range(0, len(data), chunkSize):
+            chunk = data[begin:begin + chunkSize]
+            if visit is not None and shift + digits == 64:
+                visit(chunk)
+            keys = sortKeys(chunk[:, columns])
+            candidates = candidateMask(keys, prefixes, shift + digits)
+            digit = (keys >> numpy.uint64(shift)) & numpy.uint64(bins - 1)
+            lane = numpy.arange(selections, dtype=numpy.uint64) * numpy.uint64(bins)
+            counts += numpy.bincount((digit + lane)[candidates].astype(numpy.intp), minlength=selections * bins)
+        counts = counts.reshape(selections, bins)
+        cumulative = numpy.cumsum(counts, axis=1)
+        for i in range(selections):
+            digit = numpy.searchsorted(cumulative[i], ranks[i], side='right')
+            ranks[i] -= cumulative[i, digit] - counts[i, digit]
+            prefixes[i] = (prefixes[i] << numpy.uint64(digits)) | numpy.uint64(digit)
+        if shift > 0 and numpy.max(counts[numpy.arange(selections), prefixes & numpy.uint64(bins - 1)]) <= chunkSize:
+            return collectCandidates(data, columns, ranks, prefixes, shift, chunkSize)
+    # all bits of the keys are known
+    bits = numpy.where(prefixes >> numpy.uint64(63) == 1, prefixes & ~numpy.uint64(1 << 63), ~prefixes)
+    return bits.view(numpy.float64)
+
+def candidateMask(keys, prefixes, shift):
+    """!
+    Check which keys start with the prefix of their selection.
+
+    @param keys numpy.array: The keys, one column for each selection
+    @param prefixes numpy.array: The known bits of each selection
+    @param shift Int: The number of unknown bits
+    @return: Boolean mask of the candidates
+    """
+    if shift >= 64:
+        return numpy.ones(keys.shape, dtype=bool)
+    return (keys >> numpy.uint64(shift)) == prefixes
+
+def collectCandidates(data, columns, ranks, prefixes, shift, chunkSize):
+    """!
+    Select the values with the given ranks among the remaining candidates
+    of a radix selection (see 'orderStatistics').
+
+    @param data numpy.array: The array
+    @param columns numpy.array: The column of each selection
+    @param ranks numpy.array: The rank of each selection among its candidates
+    @param prefixes numpy.array: The known bits of each selection
+    @param shift Int: The number of unknown bits
+    @param chunkSize Int: The number of rows processed at once
+    @return: The selected value of each selection
+    """
+    candidates = [[] for _ in columns]
+    for begin in range(0, len(data), chunkSize):
+        values = numpy.array(data[begin:begin + chunkSize, columns])
+        mask = candidateMask(sortKeys(values), prefixes, shift)
+        for i in range(len(columns)):
+            candidates[i].append(values[mask[:,i], i])
+    result = numpy.empty(len(columns))
+    for i in range(len(columns)):
+        values = numpy.concatenate(candidates[i])
+        result[i] = numpy.partition(values, ranks[i])[ranks[i]]
+    return result
+
+def transformAndClean(data, translationRef, rotationRef, center, factors, chunkSize, clean=True, threshold=1E-7):
+    """!
+    Translate, rotate and scale a motion in place (see 'normalization.normalize'),
+    and remove all duplicate points (see 'cleaning.removeDoublePoints').
+
+    The remaining rows are moved to the beginning of the array. The sum of the
+    distances used as jump reference (see 'cleaning.removeInvalidParts') is
+    calculated at the same time.
+
+    @param data numpy.array: The motion
+    @param translationRef numpy.array: The translation reference
+    @param rotationRef numpy.array: The rotation reference
+    @param center numpy.array: The center of the scaling
+    @param factors numpy.array: The scaling factor of each dimension
+    @param chunkSize Int: The number of rows processed at once
+    @param clean Boolean: If the duplicate points should be removed, default true
+    @param threshold Number: The distance between two points to be considered equal
+    @return: The number of remaining rows, and the sum of the reference distances
+    """
+    q = quaternion.conjugate(quaternion.normalized(rotationRef))
+    identity = numpy.array_equal(q, [1.0, 0.0, 0.0, 0.0])
+    R = quaternion.toMatrix(q)
+    shift = R.dot(translationRef)
+    product = quaternion.productMatrix(q)
+    # the first point is compared to the origin, all later points to the last kept point
+    previous = numpy.zeros((1, 3))
+    # the last two remaining points
+    recent = numpy.zeros((0, 3))
+    rows = 0
+    reference = 0.0
+    for begin in range(0, len(data), chunkSize):
+        chunk = numpy.array(data[begin:begin + chunkSize])
+        if identity:
+            chunk[:,1:4] -= translationRef
+        else:
+            chunk[:,1:4] = chunk[:,1:4].dot(R.T) - shift
+            chunk[:,4:8] = chunk[:,4:8].dot(product)
+        positions = chunk[:,1:4]
+        positions *= factors
+        positions += center * (1 - factors)
+        if clean:
+            keep = distinctPoints(positions, threshold, previous=previous[0])
+            if numpy.any(keep):
+                previous = positions[keep][-1:]
+            chunk = chunk[keep]
+            # the second point is compared with the first one, all later points with the point two frames earlier
+            points = numpy.vstack((recent, chunk[:,1:4]))
+            if rows < 2 and len(points) >= 2:
+                reference += length(points[1:2] - points[0:1])[0]
+            later = len(recent) + numpy.arange(len(chunk))
+            later = later[rows + numpy.arange(len(chunk)) >= 2]
+            reference += numpy.sum(length(points[later] - points[later - 2]))
+            recent = points[-2:]
+        data[rows:rows + len(chunk)] = chunk
+        rows += len(chunk)
+    return rows, reference
+
+def largestPart(data, meanDistance, chunkSize, factor=3):
+    """!
+    Find the largest part of a motion between large jumps, see 'cleaning.removeInvalidParts'.
+
+    @param data numpy.array: The motion
+    @param meanDistance Number: The reference distance for the jumps
+    @param chunkSize Int: The number of rows processed at once
+    @param factor Number: The threshold for detecting jumps as a multiple of the mean distance
+    @return: The first and the last row (exclusive) of the largest part
+    """
+    partStart = 0
+    best = (0, 0)
+    # the first point is compared with itself
+    previous = data[:1,1:4]
+    for begin in range(0, len(data), chunkSize):
+        positions = data[begin:begin + chunkSize, 1:4]
+        distances = length(numpy.diff(numpy.vstack((previous, positions)), axis=0))
+        previous = positions[-1:]
+        for jump in begin + numpy.flatnonzero(distances / meanDistance > factor):
+            if jump - partStart > best[1] - best[0]:
+                best = (partStart, jump)
+            partStart = jump
+    if len(data) - partStart > best[1] - best[0]:
+        best = (partStart, len(data))
+    return best
+
+def movePart(data, start, end, correctFrames, chunkSize):
+    """!
+    Move a part of a motion to the beginning of the array.
+
+    @param data numpy.array: The motion
+    @param start Int: The first row of the part
+    @param end Int: The last row (exclusive) of the part
+    @param correctFrames Boolean: If the frame numbering should be corrected
+    @param chunkSize Int: The number of rows processed at once
+    """
+    for begin in range(0, end - start, chunkSize):
+        chunk = data[begin:min(begin + chunkSize, end - start)]
+        if start > 0:
+            chunk[:] = data[start + begin:start + begin + len(chunk)]
+        if correctFrames:
+            chunk[:,0] = numpy.arange(begin + 1, begin + len(chunk) + 1)
+    data.flush()
+
+def resamplePart(data, start, end, outputPath, mode, samples, spacing, chunkSize):
+    """!
+    Write a part of a motion resampled to a numpy file, see 'resampling.resample'.
+
+    @param data numpy.array: The motion
+    @param start Int: The first row of the part
+    @param end Int: The last row (exclusive) of the part
+    @param outputPath String: The path of the numpy file
+    @param mode String: The resampling, 'frames' or 'arclength'
+    @param samples Int: The number of poses for 'frames'
+    @param spacing Number: The distance between the poses along the path for 'arclength'
+    @param chunkSize Int: The number of rows processed at once
+    """
+    part = data[start:end]
+    rows = len(part)
+    if 'frames' in mode:
+        step = (rows - 1) / max(samples - 1, 1)
+        out = numpy.lib.format.open_memmap(outputPath, mode='w+', dtype=numpy.float64, shape=(samples, data.shape[1]))
+        for begin in range(0, samples, chunkSize):
+            # only the two rows around each new pose are read
+            targets = numpy.arange(begin, min(begin + chunkSize, samples)) * step
+            before = numpy.minimum(numpy.floor(targets).astype(numpy.intp), max(rows - 2, 0))
+            after = numpy.minimum(before + 1, rows - 1)
+            chunk = interpolate(part[before], part[after], numpy.clip(targets - before, 0, 1))
+            chunk[:,0] = numpy.arange(begin + 1, begin + len(chunk) + 1)
+            out[begin:begin + len(chunk)] = chunk
+    else:
+        # the length of the path gives the number of poses, summed as in 'resampling.PathResampler'
+        total = 0.0
+        previous = part[:1,1:4]
+        for begin in range(0, rows, chunkSize):
+            positions = part[begin:begin + chunkSize,1:4]
+            total = total + numpy.cumsum(length(numpy.diff(numpy.vstack((previous, positions)), axis=0)))[-1]
+            previous = positions[-1:]
+        count = int(numpy.floor(total / spacing)) + 1
+        out = numpy.lib.format.open_memmap(outputPath, mode='w+', dtype=numpy.float64, shape=(count, data.shape[1]))
+        resampler = PathResampler(spacing)
+        written = 0
+        for begin in range(0, rows, chunkSize):
+            chunk = resampler.push(numpy.array(part[begin:begin + chunkSize]))[:count - written]
+            out[written:written + len(chunk)] = chunk
+            written += len(chunk)
+    out.flush()
+    del out
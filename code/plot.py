@@ -1,10 +1,71 @@
 
+import os
+import heapq
+import atexit
+import concurrent.futures
 import plotly
 import plotly.graph_objs as go
 import numpy
 
 plotList = []
 
+"""!
+How the plots are generated, see 'setPlotMode'
+"""
+plotMode = 'inline'
+
+"""!
+The maximum number of points of each motion in a plot, 0 for all points
+"""
+pointBudget = 0
+
+"""!
+If all plots in a directory share one plotly.js file
+"""
+shareScript = True
+
+"""!
+The process which set the plot mode, other processes (workers) plot inline
+"""
+modeProcess = os.getpid()
+
+"""!
+The background process generating the deferred plots
+"""
+executor = None
+
+"""!
+The deferred plots which are not finished yet
+"""
+pending = []
+
+def setPlotMode(mode='inline', points=0, share=True):
+    """!
+    Set how the plots are generated.
+
+    Available modes:
+
+        'inline': Generate each plot when 'plot' is called
+        'deferred': Generate the plots in a background process, wait for them with 'finishPlots'
+        'disabled': Don't generate any plots
+
+    @param mode String: The plot mode, default 'inline'
+    @param points Int: The maximum number of points of each motion (see 'decimate'), default 0 (all points)
+    @param share Boolean: Write plotly.js once into the directory of the plots, instead of into each file, default true
+    """
+    global plotMode, pointBudget, shareScript, modeProcess
+    finishPlots()
+    plotMode = mode
+    pointBudget = points
+    shareScript = share
+    modeProcess = os.getpid()
+    clearPlot()
+
+def enabled():
+    """!
+    @return True, if plots are generated
+    """
+    return plotMode != 'disabled'
 
 def addPlot(motion, title='No name'):
     """!
@@ -14,32 +75,126 @@ def addPlot(motion, title='No name'):
     @param title String: The legend entry of the plot
     """
     global plotList
-    trace = go.Scatter3d(
-        x=motion[:,0],
-        y=motion[:,1],
-        z=motion[:,2],
-        name=title,
-        marker=dict(
-            size=5
-        )
-    )
-    plotList.append(trace)
+    if plotMode == 'disabled':
+        return
+    plotList.append((numpy.array(motion[:,0:3], dtype=float), title))
 
 def plot(title='Untitled'):
     """!
     Generate the html file of the plots previously added with 'addPlot'.
     Automatically removes all plots from the internal list.
 
+    In the deferred mode, the file is generated later in a background process.
+
     @param title: The filename (and possibly path) of the resulting file (without html ending)
     """
-    global plotList
+    global plotList, executor
     if len(plotList) > 0:
-        plotly.offline.plot({
-            "data": plotList,
-            "layout": go.Layout(title=title)
-            }, filename=title + '.html', auto_open=False)
+        if plotMode == 'deferred' and os.getpid() == modeProcess:
+            if executor is None:
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+            pending.append(executor.submit(render, plotList, title, pointBudget, shareScript))
+        elif plotMode != 'disabled':
+            render(plotList, title, pointBudget, shareScript)
         plotList = []
 
+def render(plots, title, points=0, share=True):
+    """!
+    Write the html file of a list of motions.
+
+    @param plots list: The positions and the legend entry of each motion
+    @param title: The filename (and possibly path) of the resulting file (without html ending)
+    @param points Int: The maximum number of points of each motion, 0 for all points
+    @param share Boolean: Write plotly.js once into the directory of the file, instead of into the file
+    """
+    traces = []
+    for motion, name in plots:
+        motion = decimate(motion, points)
+        traces.append(go.Scatter3d(
+            x=motion[:,0],
+            y=motion[:,1],
+            z=motion[:,2],
+            name=name,
+            marker=dict(
+                size=5
+            )
+        ))
+    plotly.offline.plot({
+        "data": traces,
+        "layout": go.Layout(title=title)
+        }, filename=title + '.html', auto_open=False, include_plotlyjs='directory' if share else True)
+
+def finishPlots():
+    """!
+    Wait until all deferred plots are generated, and stop the background process.
+
+    Does nothing if there are no deferred plots.
+    """
+    global executor, pending
+    if executor is None or os.getpid() != modeProcess:
+        return
+    try:
+        for job in pending:
+            job.result()
+    finally:
+        pending = []
+        executor.shutdown()
+        executor = None
+
+atexit.register(finishPlots)
+
+def decimate(points, budget, tolerance=0.0):
+    """!
+    Reduce the number of points of a path with the Ramer-Douglas-Peucker algorithm.
+
+    Starting with the first and last point, the point farthest from the
+    simplified path is added until the path has the given number of points,
+    or all remaining points are closer to the path than the tolerance.
+
+    @param points numpy array: The points of the path, one per row
+    @param budget Int: The maximum number of points, 0 for all points
+    @param tolerance Number: The distance below which points are dropped, default 0
+    @return The points of the simplified path (all points, if there are no more than the budget)
+    """
+    if budget <= 0 or len(points) <= budget:
+        return points
+    budget = max(budget, 2)
+    last = len(points) - 1
+    keep = numpy.zeros(len(points), dtype=bool)
+    keep[[0, last]] = True
+    # segments of the simplified path with their farthest point, largest distance first
+    segments = [farthest(points, 0, last)]
+    count = 2
+    while count < budget and len(segments) > 0:
+        distance, start, end, index = heapq.heappop(segments)
+        if -distance <= tolerance:
+            break
+        keep[index] = True
+        count += 1
+        for segment in ((start, index), (index, end)):
+            if segment[1] - segment[0] > 1:
+                heapq.heappush(segments, farthest(points, *segment))
+    return points[keep]
+
+def farthest(points, start, end):
+    """!
+    Find the point of a part of a path which is farthest from the line between its ends.
+
+    @param points numpy array: The points of the path
+    @param start Int: The index of the first point of the part
+    @param end Int: The index of the last point of the part
+    @return The negative distance (for sorting the largest distance first), the start and end index, and the index of the farthest point
+    """
+    inner = points[start + 1:end] - points[start]
+    direction = points[end] - points[start]
+    length = numpy.linalg.norm(direction)
+    if length > 0:
+        distances = numpy.linalg.norm(numpy.cross(inner, direction / length), axis=1)
+    else:
+        distances = numpy.linalg.norm(inner, axis=1)
+    i = int(numpy.argmax(distances))
+    return -float(distances[i]), start, end, start + 1 + i
+
 def clearPlot():
     """!
     Remove all plots from the current list.
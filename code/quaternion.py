@@ -0,0 +1,117 @@
+# This file implements the quaternion operations needed for normalization
+# on whole arrays of quaternions at once.
+#
+# All quaternions are arranged as (w,x,y,z), with w being the scalar, and
+# stored in the last dimension of an array, so that a motion with N poses
+# is handled as a Nx4 array. A single quaternion is broadcast against all
+# rows of an array.
+#
+
+import numpy
+
+def multiply(a, b):
+    """!
+    Calculate the Hamilton product of quaternions.
+
+    @param a numpy array: The left quaternions, shape (...,4)
+    @param b numpy array: The right quaternions, shape (...,4)
+    @return The products a*b, shape (...,4)
+    """
+    a = numpy.asarray(a, dtype=float)
+    b = numpy.asarray(b, dtype=float)
+    aw, ax, ay, az = a[...,0], a[...,1], a[...,2], a[...,3]
+    bw, bx, by, bz = b[...,0], b[...,1], b[...,2], b[...,3]
+    return numpy.stack((
+        aw*bw - ax*bx - ay*by - az*bz,
+        aw*bx + ax*bw + ay*bz - az*by,
+        aw*by - ax*bz + ay*bw + az*bx,
+        aw*bz + ax*by - ay*bx + az*bw), axis=-1)
+
+def conjugate(q):
+    """!
+    Calculate the conjugate of quaternions.
+
+    @param q numpy array: The quaternions, shape (...,4)
+    @return The conjugated quaternions, shape (...,4)
+    """
+    out = numpy.array(q, dtype=float)
+    out[...,1:4] *= -1
+    return out
+
+def norm(q):
+    """!
+    Calculate the length of quaternions.
+
+    @param q numpy array: The quaternions, shape (...,4)
+    @return The lengths, shape (...)
+    """
+    q = numpy.asarray(q, dtype=float)
+    return numpy.sqrt(numpy.sum(q * q, axis=-1))
+
+def normalized(q):
+    """!
+    Scale quaternions to unit length.
+
+    @param q numpy array: The quaternions, shape (...,4)
+    @return The unit quaternions, shape (...,4)
+    """
+    q = numpy.asarray(q, dtype=float)
+    return q / norm(q)[...,None]
+
+def inverse(q):
+    """!
+    Calculate the inverse of quaternions, so that q * inverse(q) is the identity.
+
+    @param q numpy array: The quaternions, shape (...,4)
+    @return The inverted quaternions, shape (...,4)
+    """
+    q = numpy.asarray(q, dtype=float)
+    return conjugate(q) / numpy.sum(q * q, axis=-1)[...,None]
+
+def rotate(q, v):
+    """!
+    Rotate vectors by the rotation described by quaternions.
+
+    The quaternions are normalized before the rotation, so that quaternions
+    which are not exactly of unit length don't scale the vectors.
+
+    @param q numpy array: The rotation quaternions, shape (4,) or (N,4)
+    @param v numpy array: The vectors to rotate, shape (3,) or (N,3)
+    @return The rotated vectors, shape (N,3)
+    """
+    q = normalized(q)
+    v = numpy.asarray(v, dtype=float)
+    w = q[...,0:1]
+    u = q[...,1:4]
+    # v' = v + 2w(u x v) + 2u x (u x v)
+    t = 2 * numpy.cross(u, v)
+    return v + w * t + numpy.cross(u, t)
+
+def toMatrix(q):
+    """!
+    Calculate the rotation matrix of a quaternion, so that rotate(q, v) equals
+    v multiplied with the transposed matrix for rows of vectors v.
+
+    @param q numpy array: The rotation quaternion, shape (4,)
+    @return The 3x3 rotation matrix
+    """
+    w, x, y, z = normalized(q)
+    return numpy.array([
+        [1 - 2*(y*y + z*z), 2*(x*y - w*z), 2*(x*z + w*y)],
+        [2*(x*y + w*z), 1 - 2*(x*x + z*z), 2*(y*z - w*x)],
+        [2*(x*z - w*y), 2*(y*z + w*x), 1 - 2*(x*x + y*y)]])
+
+def productMatrix(q):
+    """!
+    Calculate the matrix of a multiplication with a quaternion from the right,
+    so that multiply(p, q) equals p multiplied with the matrix for rows of quaternions p.
+
+    @param q numpy array: The right quaternion, shape (4,)
+    @return The 4x4 product matrix
+    """
+    w, x, y, z = numpy.asarray(q, dtype=float)
+    return numpy.array([
+        [ w,  x,  y,  z],
+        [-x,  w, -z,  y],
+        [-y,  z,  w, -x],
+        [-z, -y,  x,  w]])
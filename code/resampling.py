@@ -0,0 +1,188 @@
+import numpy
+
+def resample(motion, mode='', samples=100, spacing=0.05):
+    """!
+    Resample the motion by the defined option.
+    Returns a new array, since the number of poses changes.
+
+    Available options:
+
+        'frames': A fixed number of poses, spaced evenly in time (by their index)
+        'arclength': Poses at a fixed distance along the path of the positions,
+            so that the number of poses grows with the length of the path
+
+    The positions (and all further columns) are interpolated linearly, the
+    rotations by spherical linear interpolation (slerp). The frames are
+    numbered from 1 to the number of poses. A motion which doesn't move is
+    reduced to its first pose by 'arclength'.
+    If none of the options is given, then this function returns the motion.
+
+    The motion format should be:
+
+    | Frame | x | y | z | RotW | RotX | RotY | RotZ |
+
+    @param motion numpy.array: The motion in the above format
+    @param mode: The resampling, choose one of the options above
+    @param samples Int: The number of poses of the resampled motion for 'frames', default 100
+    @param spacing Number: The distance between the poses along the path for 'arclength', default 0.05
+    @return: The resampled motion
+    """
+    out, _ = resampleBatch(motion, numpy.array([0]), mode, samples, spacing)
+    return out
+
+def resampleBatch(motion, offsets, mode='', samples=100, spacing=0.05):
+    """!
+    Resample many motions at once, see 'resample'.
+
+    The motions are concatenated in one array, with the index of the first
+    row of each motion in 'offsets'.
+
+    @param motion numpy.array: The concatenated motions
+    @param offsets numpy.array: The index of the first row of each motion, in increasing order
+    @param mode: The resampling
+    @param samples Int: The number of poses of each resampled motion for 'frames'
+    @param spacing Number: The distance between the poses along the path for 'arclength'
+    @return: The resampled motions, and the offsets of the resampled motions
+    """
+    offsets = numpy.asarray(offsets, dtype=numpy.intp)
+    if ('frames' not in mode and 'arclength' not in mode) or len(motion) == 0:
+        return motion, offsets
+    lengths = numpy.diff(numpy.append(offsets, len(motion)))
+    motionIndex = numpy.repeat(numpy.arange(len(offsets)), lengths)
+    last = numpy.minimum(offsets + numpy.maximum(lengths, 1) - 1, len(motion) - 1)
+    # parameter of each pose: the distance along the path, or the index
+    if 'arclength' in mode:
+        steps = numpy.zeros(len(motion))
+        steps[1:] = numpy.linalg.norm(numpy.diff(motion[:,1:4], axis=0), axis=1)
+        steps[offsets[lengths > 0]] = 0
+        parameter = numpy.cumsum(steps)
+        parameter -= parameter[offsets[motionIndex]]
+        total = numpy.where(lengths > 0, parameter[last], 0)
+        counts = numpy.floor(total / spacing).astype(int) + 1
+        steps = numpy.full(len(offsets), float(spacing))
+    else:
+        parameter = (numpy.arange(len(motion)) - offsets[motionIndex]).astype(float)
+        total = numpy.maximum(lengths - 1, 0).astype(float)
+        counts = numpy.full(len(offsets), samples)
+        steps = total / max(samples - 1, 1)
+    counts[lengths == 0] = 0
+
+    # parameters of the poses of each sample, keeping the motions apart
+    targetIndex = numpy.repeat(numpy.arange(len(offsets)), counts)
+    newOffsets = numpy.cumsum(counts) - counts
+    within = numpy.arange(len(targetIndex)) - newOffsets[targetIndex]
+    targets = within * steps[targetIndex]
+    base = numpy.cumsum(total + 1) - (total + 1)
+    out = resampleAt(motion, parameter + base[motionIndex], targets + base[targetIndex],
+        offsets[targetIndex], last[targetIndex])
+    out[:,0] = within + 1
+    return out, newOffsets
+
+def resampleAt(motion, parameter, targets, first=None, last=None):
+    """!
+    Interpolate the poses of a motion at given values of a parameter of the poses.
+
+    @param motion numpy.array: The motion
+    @param parameter numpy.array: The non-decreasing parameter of each pose, e.g. the index or the distance along the path
+    @param targets numpy.array: The parameter of each new pose
+    @param first numpy.array: The first pose used for each new pose, default the first pose of the motion
+    @param last numpy.array: The last pose used for each new pose, default the last pose of the motion
+    @return: The new poses, with the frame numbers interpolated as well
+    """
+    first = 0 if first is None else first
+    last = len(motion) - 1 if last is None else last
+    # the pose before each target, and the pose after it
+    before = numpy.searchsorted(parameter, targets, side='right') - 1
+    before = numpy.clip(before, first, numpy.maximum(last - 1, first))
+    after = numpy.minimum(before + 1, last)
+    span = parameter[after] - parameter[before]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        weight = numpy.where(span > 0, (targets - parameter[before]) / span, 0)
+    return interpolate(motion[before], motion[after], numpy.clip(weight, 0, 1))
+
+def interpolate(first, second, weight):
+    """!
+    Interpolate between poses, linearly for the positions (and all further
+    columns) and by slerp for the rotations.
+
+    @param first numpy.array: The first poses
+    @param second numpy.array: The second poses
+    @param weight numpy.array: The weight of the second poses, between 0 and 1
+    @return: The interpolated poses
+    """
+    out = first + weight[:,None] * (second - first)
+    out[:,4:8] = slerp(first[:,4:8], second[:,4:8], weight)
+    return out
+
+class PathResampler:
+    """!
+    Resample a motion along its path while it arrives in chunks (see 'resample' with 'arclength').
+
+    A pose is returned each time the path reaches the next multiple of the
+    spacing, so that all chunks together give the same poses as resampling
+    the complete motion.
+    """
+
+    def __init__(self, spacing=0.05):
+        """!
+        Start resampling a new motion.
+
+        @param spacing Number: The distance between the poses along the path, default 0.05
+        """
+        self.spacing = spacing
+        self.reset()
+
+    def reset(self):
+        """!
+        Forget all poses and start a new motion.
+        """
+        # distance along the path up to the last pose, the last pose, and the number of returned poses
+        self.travelled = 0.0
+        self.last = None
+        self.count = 0
+
+    def push(self, motion):
+        """!
+        Add poses of the motion.
+
+        @param motion numpy.array: The next poses of the motion
+        @return: The resampled poses, numbered from 1 since the start of the motion
+        """
+        if len(motion) == 0:
+            return motion[:0].copy()
+        points = motion if self.last is None else numpy.vstack((self.last, motion))
+        distance = numpy.zeros(len(points))
+        distance[1:] = numpy.cumsum(numpy.linalg.norm(numpy.diff(points[:,1:4], axis=0), axis=1))
+        distance += self.travelled
+        end = int(numpy.floor(distance[-1] / self.spacing)) + 1
+        targets = numpy.arange(self.count, end) * self.spacing
+        out = resampleAt(points, distance, targets)
+        out[:,0] = numpy.arange(self.count + 1, end + 1)
+        self.travelled = distance[-1]
+        self.last = points[-1].copy()
+        self.count = end
+        return out
+
+def slerp(q0, q1, weight):
+    """!
+    Interpolate between rotations with spherical linear interpolation.
+
+    The shorter path between the rotations is taken, and rotations which are
+    almost equal are interpolated linearly.
+
+    @param q0 numpy.array: The first rotations (Nx4)
+    @param q1 numpy.array: The second rotations (Nx4)
+    @param weight numpy.array: The weight of the second rotations, between 0 and 1
+    @return: The interpolated rotations (Nx4)
+    """
+    dot = numpy.sum(q0 * q1, axis=-1)
+    # q and -q are the same rotation
+    q1 = numpy.where((dot < 0)[:,None], -q1, q1)
+    dot = numpy.abs(dot)
+    angle = numpy.arccos(numpy.clip(dot, -1, 1))
+    sine = numpy.sin(angle)
+    close = sine < 1E-6
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        w0 = numpy.where(close, 1 - weight, numpy.sin((1 - weight) * angle) / sine)
+        w1 = numpy.where(close, weight, numpy.sin(weight * angle) / sine)
+    return w0[:,None] * q0 + w1[:,None] * q1
@@ -0,0 +1,186 @@
+# This file implements the collection of the recognition results of
+# 'learning.recognizeMotions'.
+#
+# The scores, normalization parameters, labels and recognized motions of all
+# files are kept in arrays, which are saved in one go as a numpy archive
+# (one array per column) and optionally as the csv file 'scores.csv'. The
+# summary (confusion matrix, accuracy of each motion and variation, and the
+# score margins) is calculated from the arrays, without parsing any text.
+#
+
+import numpy
+
+class Results:
+    """!
+    The recognition results of all files.
+    """
+
+    def __init__(self, classNames):
+        """!
+        Start collecting results.
+
+        @param classNames list: The names of the motion types, in the order of the models
+        """
+        self.classNames = list(classNames)
+        self.variationNames = []
+        self.parts = []
+        self.cached = None
+
+    def add(self, motion, variation, names, scores, translation, rotation, scaling):
+        """!
+        Add the results of the files of a folder.
+
+        @param motion Int: The index of the motion type of the files
+        @param variation String: The name of the variation of the files
+        @param names list: The names of the files
+        @param scores list: The scores of each file for each model
+        @param translation list: The translation parameters of each file
+        @param rotation list: The rotation parameters of each file
+        @param scaling list: The scaling parameters of each file
+        """
+        if variation not in self.variationNames:
+            self.variationNames.append(variation)
+        count = len(names)
+        models = len(self.classNames)
+        self.parts.append((numpy.full(count, motion, dtype=int),
+            numpy.full(count, self.variationNames.index(variation), dtype=int),
+            numpy.array(names, dtype=str).reshape(count),
+            numpy.array(scores, dtype=float).reshape(count, models),
+            numpy.array(translation, dtype=float).reshape(count, 3),
+            numpy.array(rotation, dtype=float).reshape(count, 4),
+            numpy.array(scaling, dtype=float).reshape(count, 3)))
+        self.cached = None
+
+    def arrays(self):
+        """!
+        Get all results as arrays, with one row per file.
+
+        @return A dictionary with the arrays 'motion', 'variation', 'names', 'scores', 'translation', 'rotation', 'scaling' and 'predicted'
+        """
+        if self.cached is None:
+            columns = ['motion', 'variation', 'names', 'scores', 'translation', 'rotation', 'scaling']
+            shapes = [(0,), (0,), (0,), (0, len(self.classNames)), (0, 3), (0, 4), (0, 3)]
+            if len(self.parts) == 0:
+                arrays = {name: numpy.zeros(shape, dtype=str if name == 'names' else float) for name, shape in zip(columns, shapes)}
+                arrays['motion'] = arrays['motion'].astype(int)
+                arrays['variation'] = arrays['variation'].astype(int)
+            else:
+                arrays = {name: numpy.concatenate([part[i] for part in self.parts]) for i, name in enumerate(columns)}
+            arrays['predicted'] = numpy.argmax(arrays['scores'], axis=1) if len(arrays['scores']) > 0 else numpy.zeros(0, dtype=int)
+            self.cached = arrays
+        return self.cached
+
+    def summary(self):
+        """!
+        Calculate the accuracy of the recognition.
+
+        The margin of a file is the difference between the best and the
+        second best score, the true margin is the difference between the
+        score of the correct model and the best score of all other models
+        (negative if the file was recognized wrongly).
+
+        The accuracy of a motion, variation, or motion and variation without
+        any files is NaN (as is the overall accuracy without any files), the
+        number of files of each is returned as well to tell them apart.
+
+        @return A dictionary with the confusion matrix (correct motion in rows, recognized motion in columns),
+        the overall accuracy, the accuracy and number of files of each motion, variation, and motion and variation,
+        and the margin and true margin of each file
+        """
+        arrays = self.arrays()
+        motion, variation, predicted, scores = arrays['motion'], arrays['variation'], arrays['predicted'], arrays['scores']
+        classes, variations = len(self.classNames), len(self.variationNames)
+        correct = predicted == motion
+        confusion = numpy.bincount(motion * classes + predicted, minlength=classes * classes).reshape(classes, classes)
+        cells = motion * variations + variation
+        counts = numpy.bincount(cells, minlength=classes * variations).reshape(classes, variations)
+        hits = numpy.bincount(cells, weights=correct, minlength=classes * variations).reshape(classes, variations)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            ordered = numpy.sort(scores, axis=1)
+            margins = ordered[:, -1] - ordered[:, -2] if classes > 1 else numpy.full(len(scores), numpy.inf)
+            others = scores.copy()
+            others[numpy.arange(len(scores)), motion] = -numpy.inf
+            trueMargins = scores[numpy.arange(len(scores)), motion] - numpy.max(others, axis=1, initial=-numpy.inf)
+            return {'classNames': self.classNames,
+                'variationNames': self.variationNames,
+                'confusion': confusion,
+                'accuracy': float(numpy.mean(correct)) if len(correct) > 0 else numpy.nan,
+                'classAccuracy': numpy.diagonal(confusion) / numpy.sum(confusion, axis=1),
+                'variationAccuracy': numpy.sum(hits, axis=0) / numpy.sum(counts, axis=0),
+                'classVariationAccuracy': hits / counts,
+                'classCounts': numpy.sum(counts, axis=1),
+                'variationCounts': numpy.sum(counts, axis=0),
+                'classVariationCounts': counts,
+                'margins': margins,
+                'trueMargins': trueMargins}
+
+    def save(self, path):
+        """!
+        Save all results and the summary as a numpy archive.
+
+        @param path String: The path of the archive
+        """
+        summary = self.summary()
+        arrays = dict(self.arrays())
+        numpy.savez(path,
+            classNames=numpy.array(self.classNames, dtype=str),
+            variationNames=numpy.array(self.variationNames, dtype=str),
+            confusion=summary['confusion'],
+            classAccuracy=summary['classAccuracy'],
+            variationAccuracy=summary['variationAccuracy'],
+            classVariationAccuracy=summary['classVariationAccuracy'],
+            classCounts=summary['classCounts'],
+            variationCounts=summary['variationCounts'],
+            classVariationCounts=summary['classVariationCounts'],
+            margins=summary['margins'],
+            trueMargins=summary['trueMargins'],
+            **arrays)
+
+    def writeCsv(self, path):
+        """!
+        Write all results as csv, with one line per file, in a single write.
+
+        The columns are the motion, variation and name of the file, the
+        translation, rotation and scaling parameters, the score of each
+        model, the recognized motion, and if it was correct.
+
+        @param path String: The path of the csv file
+        """
+        arrays = self.arrays()
+        header = ('Motion,Variation,Name,Translation X,Translation Y,Translation Z'
+            + ',Rotation W,Rotation X,Rotation Y,Rotation Z'
+            + ',Scaling X,Scaling Y,Scaling Z'
+            + ''.join(',' + name for name in self.classNames)
+            + ',Recognized,Correct\n')
+        rows = len(arrays['names'])
+        scores = arrays['scores'].reshape(rows, len(self.classNames))
+        classNames = numpy.array(self.classNames, dtype=object)
+        # all values of a line in a row, formatted with one format string for the whole file
+        table = numpy.empty((rows, 3 + 10 + scores.shape[1] + 2), dtype=object)
+        table[:,0] = classNames[arrays['motion']]
+        table[:,1] = numpy.array(self.variationNames, dtype=object)[arrays['variation']]
+        table[:,2] = arrays['names']
+        table[:,3:6] = arrays['translation']
+        table[:,6:10] = arrays['rotation']
+        table[:,10:13] = arrays['scaling']
+        # the scores are cut to integers, infinite for models skipped by pruning (adding zero avoids '-0')
+        table[:,13:-2] = numpy.trunc(scores) + 0.0
+        table[:,-2] = classNames[arrays['predicted']]
+        table[:,-1] = arrays['predicted'] == arrays['motion']
+        line = '%s,%s,%-20s,' + ','.join(['%8.3f'] * 10) + ',%7.0f' * scores.shape[1] + ',%s,%s\n'
+        with open(path, 'w') as f:
+            f.write(header + (line * rows) % tuple(table.ravel().tolist()))
+
+def load(path):
+    """!
+    Load results saved with 'Results.save'.
+
+    @param path String: The path of the archive
+    @return The results
+    """
+    with numpy.load(path, allow_pickle=False) as data:
+        results = Results([str(name) for name in data['classNames']])
+        results.variationNames = [str(name) for name in data['variationNames']]
+        results.parts = [tuple(data[name] for name in ['motion', 'variation', 'names', 'scores', 'translation', 'rotation', 'scaling'])]
+        results.cached = None
+    return results
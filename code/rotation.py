@@ -1,6 +1,6 @@
 import numpy
-from pyquaternion import Quaternion
-from averageQuaternions import averageQuaternions
+import quaternion
+from averageQuaternions import averageQuaternions, segmentAverageQuaternions
 
 def rotate(motion, mode=''):
     """!
@@ -25,42 +25,66 @@ def rotate(motion, mode=''):
     @param mode: The rotation reference, choose one of the options above
     @return: The normalization rotation
     """
+    q = reference(motion, mode)
+    rotateBy(motion, q)
+    return q
+
+def reference(motion, mode=''):
+    """!
+    Calculate the rotation reference of a motion without changing it.
+
+    See 'rotate' for the available options and the motion format.
+
+    @param motion numpy.array: The motion without the frame column
+    @param mode: The rotation reference
+    @return: The normalization rotation
+    """
     if 'mean' in mode:
-        return byMean(motion)
+        return averageQuaternions(motion[:,3:7])
     elif 'start' in mode:
-        return byStart(motion)
+        return numpy.array(motion[0,3:7], dtype=float)
     elif 'end' in mode:
-        return byEnd(motion)
+        return numpy.array(motion[-1,3:7], dtype=float)
     return numpy.array([1.0,0.0,0.0,0.0])
 
+def referenceBatch(motion, offsets, mode=''):
+    """!
+    Calculate the rotation references of many motions at once.
+
+    The motions are concatenated in one array, with the index of the first
+    row of each motion in 'offsets'. See 'rotate' for the available options.
+
+    @param motion numpy.array: The motions without the frame column
+    @param offsets numpy.array: The index of the first row of each motion, in increasing order
+    @param mode: The rotation reference
+    @return: The normalization rotation for each motion
+    """
+    offsets = numpy.asarray(offsets, dtype=numpy.intp)
+    if 'mean' in mode:
+        return segmentAverageQuaternions(motion[:,3:7], offsets)
+    elif 'start' in mode:
+        return numpy.array(motion[offsets,3:7], dtype=float)
+    elif 'end' in mode:
+        return numpy.array(motion[numpy.append(offsets[1:], len(motion)) - 1,3:7], dtype=float)
+    return numpy.tile([1.0,0.0,0.0,0.0], (len(offsets), 1))
+
 def byMean(motion):
-    reference = averageQuaternions(numpy.array(motion[:,3:7]))
-    rotateBy(motion, reference)
-    return reference
+    return rotate(motion, 'mean')
 
 def byStart(motion):
-    reference = motion[0,3:7]
-    rotateBy(motion, reference)
-    return reference
+    return rotate(motion, 'start')
 
 def byEnd(motion):
-    reference = motion[-1,3:7]
-    rotateBy(motion, reference)
-    return reference
+    return rotate(motion, 'end')
 
 def rotateBy(motion, elements):
-    q = Quaternion(elements).inverse
-    for pose in motion:
-        v = numpy.array(pose[0:3])
-        qn = Quaternion(pose[3:7])
-        a = (qn * q).elements
-        b = q.rotate(v)
-
-        pose[0] = b[0]
-        pose[1] = b[1]
-        pose[2] = b[2]
-
-        pose[3] = a[0]
-        pose[4] = a[1]
-        pose[5] = a[2]
-        pose[6] = a[3]
+    """!
+    Rotate the points and the rotation quaternions of a motion by the
+    inverse of a reference rotation, for all poses at once.
+
+    @param motion numpy.array: The motion as above, without the frame column
+    @param elements: The reference rotation quaternion (w,x,y,z)
+    """
+    q = quaternion.conjugate(quaternion.normalized(elements))
+    motion[:,3:7] = quaternion.multiply(motion[:,3:7], q)
+    motion[:,0:3] = quaternion.rotate(q, motion[:,0:3])
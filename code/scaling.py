@@ -22,59 +22,52 @@ def scale(motion, mode=''):
     @param mode: The scaling reference, choose one of the options above
     @return: The normalization scaling for each dimension
     """
+    maximums = numpy.max(motion, axis=0)
+    minimums = numpy.min(motion, axis=0)
+    m = factors(minimums, maximums, mode)
+    if m is None:
+        return numpy.zeros(3)
+    scaleBy(motion, (maximums + minimums) / 2, m)
+    return m
+
+def factors(minimums, maximums, mode=''):
+    """!
+    Calculate the scaling factors for a motion from its extent.
+
+    See 'scale' for the available options.
+
+    The extents of many motions can be passed at once as Kx3 arrays.
+
+    @param minimums numpy.array: The smallest value of each dimension
+    @param maximums numpy.array: The largest value of each dimension
+    @param mode: The scaling reference
+    @return: The scaling factor for each dimension, or None if no scaling is selected
+    """
+    diff = maximums - minimums
     if 'components' in mode:
-        return scaleComponents(motion)
+        # Scale each dimension separately
+        return 1 / diff
     if 'largest' in mode:
-        return scaleLargest(motion)
+        # largest dimension
+        m = 1 / numpy.max(diff, axis=-1)
+        return numpy.stack((m, m, m), axis=-1)
     if 'smallest' in mode:
-        return scaleSmallest(motion)
-    return numpy.zeros(3)
-
-
+        # smallest dimension
+        m = 1 / numpy.min(diff, axis=-1)
+        return numpy.stack((m, m, m), axis=-1)
+    return None
 
 def scaleComponents(motion):
-    maximums = numpy.max(motion, axis=0)
-    minimums = numpy.min(motion, axis=0)
-    diff =  (maximums - minimums)
-    # Center of each dimension
-    c = (maximums + minimums) / 2
-    # scaling factors
-    m = 1 / diff
-
-    for pose in motion:
-        pose[0] = c[0] + (pose[0] - c[0]) * m[0]
-        pose[1] = c[1] + (pose[1] - c[1]) * m[1]
-        pose[2] = c[2] + (pose[2] - c[2]) * m[2]
-    return m
+    return scale(motion, 'components')
 
 def scaleLargest(motion):
-    maximums = numpy.max(motion, axis=0)
-    minimums = numpy.min(motion, axis=0)
-    diff =  (maximums - minimums)
-    # largest dimension
-    m = 1 / numpy.max(diff)
-
-    # Center of each dimension
-    c = (maximums + minimums) / 2
-
-    for pose in motion:
-        pose[0] = c[0] + (pose[0] - c[0]) * m
-        pose[1] = c[1] + (pose[1] - c[1]) * m
-        pose[2] = c[2] + (pose[2] - c[2]) * m
-    return numpy.array([m, m, m])
+    return scale(motion, 'largest')
 
 def scaleSmallest(motion):
-    maximums = numpy.max(motion, axis=0)
-    minimums = numpy.min(motion, axis=0)
-    diff =  (maximums - minimums)
-    # smallest dimension
-    m = 1 / numpy.min(diff)
-
-    # Center of each dimension
-    c = (maximums + minimums) / 2
+    return scale(motion, 'smallest')
 
-    for pose in motion:
-        pose[0] = c[0] + (pose[0] - c[0]) * m
-        pose[1] = c[1] + (pose[1] - c[1]) * m
-        pose[2] = c[2] + (pose[2] - c[2]) * m
-    return numpy.array([m, m, m])
+# scale the points around the center of each dimension
+def scaleBy(motion, center, factors):
+    motion[:,0:3] -= center
+    motion[:,0:3] *= factors
+    motion[:,0:3] += center
@@ -0,0 +1,248 @@
+# This file implements the scoring of motions with all trained models at once.
+#
+# The Gaussian mixture components of all models are stacked, so that the
+# emission log probabilities of all components of all models are calculated
+# with a few large matrix multiplications over all frames. The precision
+# factors and log determinants of the components are calculated only once,
+# when the engine is created. The forward algorithm then runs on the
+# resulting matrix for all models (and all motions) together.
+#
+# The functions in 'learning' score with an engine of the models (see
+# 'learning.scoringEngine'), and 'online' continues the forward algorithm of
+# an engine frame by frame (see 'forwardFrames').
+#
+
+import numpy
+
+class ScoringEngine:
+    """!
+    Score motions with a list of trained GMMHMM models.
+    """
+
+    def __init__(self, models, blockSize=2**22):
+        """!
+        Prepare the models for scoring.
+
+        @param models list: The previously trained HMM models
+        @param blockSize Int: The maximum number of values of the intermediate arrays, default 4M
+        """
+        self.models = list(models)
+        self.blockSize = blockSize
+        self.states = numpy.array([model.n_components for model in self.models])
+        self.mixtures = numpy.array([model.n_mix for model in self.models])
+        self.maxStates = int(numpy.max(self.states))
+        # components of all models one after another, in the order model, state, mixture
+        self.offsets = numpy.concatenate(([0], numpy.cumsum(self.states * self.mixtures)))
+        count = len(self.models)
+        self.logStart = numpy.full((count, self.maxStates), -numpy.inf)
+        self.transitions = numpy.zeros((count, self.maxStates, self.maxStates))
+        with numpy.errstate(divide='ignore'):
+            for i, model in enumerate(self.models):
+                states = model.n_components
+                self.logStart[i, :states] = numpy.log(model.startprob_)
+                self.transitions[i, :states, :states] = model.transmat_
+            self.logTransitions = numpy.log(self.transitions)
+        self.diagonal = ComponentGroup(self.models, self.offsets, ('diag', 'spherical'))
+        self.full = ComponentGroup(self.models, self.offsets, ('full', 'tied'))
+        # engines for subsets of the models
+        self.subsets = {}
+
+    def __len__(self):
+        return len(self.models)
+
+    def emissions(self, X):
+        """!
+        Calculate the emission log probabilities of frames for all states of all models.
+
+        @param X numpy.array: The frames, one per row
+        @return The log probabilities (frames x models x states), -inf for the states missing in smaller models
+        """
+        X = numpy.asarray(X, dtype=float)
+        result = numpy.full((len(X), len(self.models), self.maxStates), -numpy.inf)
+        rows = max(1, self.blockSize // max(1, self.offsets[-1] * X.shape[1]))
+        for begin in range(0, len(X), rows):
+            block = X[begin:begin + rows]
+            components = numpy.empty((len(block), self.offsets[-1]))
+            self.diagonal.logProbabilities(block, components)
+            self.full.logProbabilities(block, components)
+            for i, model in enumerate(self.models):
+                states, mixtures = model.n_components, model.n_mix
+                logs = components[:, self.offsets[i]:self.offsets[i + 1]].reshape(len(block), states, mixtures)
+                result[begin:begin + len(block), i, :states] = logSumExp(logs, axis=-1)
+        return result
+
+    def score(self, X, lengths=None, models=None):
+        """!
+        Calculate the log likelihood of motions with all models.
+
+        This gives the same results as 'model.score' for each model and motion.
+
+        @param X numpy.array: The frames of one motion, or of several motions one after another
+        @param lengths list: The number of frames of each motion, optional (a single motion)
+        @param models list: The indices of the models to use, optional (all models)
+        @return The log likelihood of each model, or of each motion (rows) and model (columns) if lengths are given
+        """
+        X = numpy.atleast_2d(numpy.asarray(X, dtype=float))
+        single = lengths is None
+        lengths = numpy.array([len(X)] if single else lengths, dtype=int)
+        if models is None:
+            engine = self
+        else:
+            models = tuple(int(i) for i in models)
+            if models not in self.subsets:
+                self.subsets[models] = ScoringEngine([self.models[i] for i in models], self.blockSize)
+            engine = self.subsets[models]
+        scores = engine.forward(engine.emissions(X), lengths)
+        return scores[0] if single else scores
+
+    def forward(self, logB, lengths):
+        """!
+        Run the forward algorithm for all motions and models together.
+
+        The forward variables are scaled after each frame. If they vanish for
+        a motion and model, it is calculated again in log space.
+
+        @param logB numpy.array: The emission log probabilities (frames x models x states)
+        @param lengths numpy.array: The number of frames of each motion
+        @return The log likelihood of each motion (rows) and model (columns)
+        """
+        starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1])).astype(int)
+        count = len(self.models)
+        scores = numpy.zeros((len(lengths), count))
+        alpha = numpy.zeros((len(lengths), count, self.maxStates))
+        failed = numpy.zeros((len(lengths), count), dtype=bool)
+        with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for t in range(int(numpy.max(lengths, initial=0))):
+                active = numpy.flatnonzero(lengths > t)
+                frames = logB[starts[active] + t]
+                shift = numpy.max(frames, axis=-1)
+                B = numpy.exp(frames - shift[..., None])
+                if t == 0:
+                    a = numpy.exp(self.logStart) * B
+                else:
+                    a = numpy.matmul(alpha[active][:, :, None, :], self.transitions)[:, :, 0, :] * B
+                c = numpy.sum(a, axis=-1)
+                alpha[active] = a / c[..., None]
+                scores[active] += numpy.log(c) + shift
+                failed[active] |= ~(numpy.isfinite(c) & (c > 0))
+        for k, i in zip(*numpy.nonzero(failed)):
+            scores[k, i] = self.forwardLog(logB[starts[k]:starts[k] + lengths[k], i], i)
+        return scores
+
+    def forwardFrames(self, logAlpha, logB):
+        """!
+        Continue the forward algorithm in log space for all models with new frames.
+
+        @param logAlpha numpy.array: The forward log variables after the earlier frames (models x states), None before the first frame
+        @param logB numpy.array: The emission log probabilities of the new frames (frames x models x states)
+        @return The forward log variables after the new frames, the log likelihood of each model is their 'logSumExp'
+        """
+        for logb in logB:
+            if logAlpha is None:
+                logAlpha = self.logStart + logb
+            else:
+                logAlpha = logSumExp(logAlpha[:, :, None] + self.logTransitions, axis=1) + logb
+        return logAlpha
+
+    def forwardLog(self, logB, model):
+        """!
+        Run the forward algorithm for one motion and model in log space.
+
+        @param logB numpy.array: The emission log probabilities of the model (frames x states)
+        @param model Int: The index of the model
+        @return The log likelihood
+        """
+        logAlpha = self.logStart[model] + logB[0]
+        for logb in logB[1:]:
+            logAlpha = logSumExp(logAlpha[:, None] + self.logTransitions[model], axis=0) + logb
+        return float(logSumExp(logAlpha))
+
+class ComponentGroup:
+    """!
+    The stacked Gaussian mixture components of all models with similar covariances.
+
+    Diagonal (and spherical) covariances are evaluated with the expanded
+    squared distance, which needs two matrix multiplications for all
+    components. Full (and tied) covariances are evaluated with the Cholesky
+    factors of the precisions (the inverse covariances), with one matrix
+    multiplication for all components.
+    """
+
+    def __init__(self, models, offsets, types):
+        """!
+        Collect the components of all models with one of the covariance types.
+
+        @param models list: The previously trained HMM models
+        @param offsets numpy.array: The index of the first component of each model
+        @param types tuple: The covariance types of the group
+        """
+        self.diagonal = 'diag' in types
+        columns, means, precisions, constants = [], [], [], []
+        for i, model in enumerate(models):
+            if model.covariance_type not in types:
+                continue
+            states, mixtures, features = model.means_.shape
+            covars = numpy.asarray(model.covars_, dtype=float)
+            if model.covariance_type == 'spherical':
+                covars = numpy.repeat(covars[..., None], features, axis=-1)
+            if model.covariance_type == 'tied':
+                covars = numpy.repeat(covars[:, None], mixtures, axis=1)
+            covars = covars.reshape((states * mixtures,) + covars.shape[2:])
+            if self.diagonal:
+                precision = 1 / covars
+                logDeterminant = numpy.sum(numpy.log(covars), axis=-1)
+            else:
+                cholesky = numpy.linalg.cholesky(covars)
+                # Cholesky factor of the precision, so that (x - mean) * factor has unit covariance
+                precision = numpy.swapaxes(numpy.linalg.inv(cholesky), -1, -2)
+                logDeterminant = 2 * numpy.sum(numpy.log(numpy.diagonal(cholesky, axis1=-2, axis2=-1)), axis=-1)
+            columns.append(numpy.arange(offsets[i], offsets[i + 1]))
+            means.append(model.means_.reshape(states * mixtures, features))
+            precisions.append(precision)
+            constants.append(numpy.log(model.weights_).ravel() - 0.5 * (features * numpy.log(2 * numpy.pi) + logDeterminant))
+        self.empty = len(columns) == 0
+        if self.empty:
+            return
+        self.columns = numpy.concatenate(columns)
+        means = numpy.concatenate(means)
+        precisions = numpy.concatenate(precisions)
+        self.constants = numpy.concatenate(constants)
+        if self.diagonal:
+            self.precisions = precisions.T
+            self.weightedMeans = (means * precisions).T
+            self.constants = self.constants - 0.5 * numpy.sum(means * means * precisions, axis=-1)
+        else:
+            features = means.shape[1]
+            # all factors side by side, so that all components are transformed with one multiplication
+            self.factors = numpy.transpose(precisions, (1, 0, 2)).reshape(features, -1)
+            self.transformedMeans = numpy.einsum('cf,cfg->cg', means, precisions)
+
+    def logProbabilities(self, X, out):
+        """!
+        Calculate the weighted log probabilities of frames for all components of the group.
+
+        @param X numpy.array: The frames, one per row
+        @param out numpy.array: The array for the log probabilities of all components (frames x components)
+        """
+        if self.empty:
+            return
+        if self.diagonal:
+            distances = numpy.dot(X * X, self.precisions) - 2 * numpy.dot(X, self.weightedMeans)
+        else:
+            transformed = numpy.dot(X, self.factors).reshape(len(X), len(self.columns), -1) - self.transformedMeans
+            distances = numpy.einsum('ncf,ncf->nc', transformed, transformed)
+        out[:, self.columns] = self.constants - 0.5 * distances
+
+def logSumExp(values, axis=-1):
+    """!
+    Calculate the logarithm of the sum of exponentials without overflow.
+
+    @param values numpy.array: The values
+    @param axis Int: The axis to sum over
+    @return The logarithm of the sum of the exponentials of the values
+    """
+    maximum = numpy.max(values, axis=axis, keepdims=True)
+    maximum = numpy.where(numpy.isfinite(maximum), maximum, 0)
+    with numpy.errstate(divide='ignore'):
+        result = numpy.log(numpy.sum(numpy.exp(values - maximum), axis=axis, keepdims=True)) + maximum
+    return numpy.squeeze(result, axis=axis)
@@ -0,0 +1,335 @@
+# This file implements a local recognition service, which keeps the trained
+# models in memory and scores motions sent by other programs.
+#
+# The service is a small HTTP server on a localhost port or a Unix socket:
+#
+#   POST /score   Score a motion, sent as csv ('text/csv'), numpy file
+#                 ('application/x-npy'), or raw float64 values
+#                 ('application/octet-stream', with the number of columns
+#                 in the header 'X-Columns', default 8). The response
+#                 contains the score of each model (null for models skipped
+#                 by pruning), the recognized motion, and the normalization
+#                 parameters as json.
+#   GET  /stats   Number of requests and batches, and the latency percentiles
+#
+# Requests arriving at the same time are normalized and scored together in
+# batches by a single scoring thread.
+#
+# Start the service with the models in the model store, e.g.:
+#
+#   python service.py --store ../models --translate median --rotate mean --scale largest
+#
+# The settings must be the same as for the training with 'learning.learnMotions'
+# (including the feature projection and the resampling), the service doesn't
+# train missing models.
+#
+
+import io
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import collections
+import socketserver
+import http.server
+import numpy
+import input
+import learning
+import normalization
+import modelStore
+import features
+import instrumentation
+
+class RecognitionService:
+    """!
+    Score motions with trained models, batching concurrent requests.
+    """
+
+    def __init__(self, models, names, translate='', rotate='', scale='', maxBatch=32, batchWindow=0.002, latencySamples=10000, projection=None, resampling=None):
+        """!
+        Create the service and start the scoring thread.
+
+        @param models list: The previously trained HMM models, or a 'scoring.ScoringEngine'
+        @param names list: The name of the motion of each model
+        @param translate String: The normalization type for correcting translation
+        @param rotate String: The normalization type for correcting rotation
+        @param scale String: The normalization type for correcting scaling
+        @param maxBatch Int: The maximum number of motions normalized together, default 32
+        @param batchWindow Number: The time in seconds to wait for more requests of a batch, default 2 ms
+        @param latencySamples Int: The number of latest requests used for the latency statistics, default 10000
+        @param projection features.Projection: The projection of the motions used for training, optional
+        @param resampling tuple: The resampling of the motions used for training (see 'normalization.setResampling'), default the one set there
+        """
+        # the models are prepared for scoring only once
+        self.engine = learning.scoringEngine(models)
+        self.names = list(names)
+        self.translate = translate
+        self.rotate = rotate
+        self.scale = scale
+        self.projection = projection
+        self.resampling = normalization.resamplingSettings() if resampling is None else resampling
+        self.maxBatch = maxBatch
+        self.batchWindow = batchWindow
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=latencySamples)
+        self.requestCount = 0
+        self.errorCount = 0
+        self.batchCount = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def score(self, motion):
+        """!
+        Normalize and score a motion, waiting for the scoring thread.
+
+        @param motion numpy.array: The motion, one pose per row
+        @return A dictionary with the scores, the recognized motion and the normalization parameters
+        """
+        request = {'motion': motion, 'done': threading.Event()}
+        self.requests.put(request)
+        request['done'].wait()
+        if 'error' in request:
+            raise request['error']
+        return request['result']
+
+    def run(self):
+        """!
+        Take the waiting requests in batches and process them, until the program ends.
+        """
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.batchWindow
+            while len(batch) < self.maxBatch:
+                try:
+                    batch.append(self.requests.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self.process(batch)
+
+    def process(self, batch):
+        """!
+        Normalize the motions of a batch together and score them together.
+
+        If the batch can't be normalized or scored together, the motions are
+        handled one by one, so that a bad motion only fails its own request.
+
+        @param batch list: The requests
+        """
+        try:
+            motions, offsets = normalization.concatenate([request['motion'] for request in batch])
+            motions, offsets, tr, ro, sc = normalization.normalizeBatch(motions, offsets, self.translate, self.rotate, self.scale,
+                True, None, *self.resampling)
+            scores = self.scoreBatch(motions, offsets)
+            results = [(scores[i], tr[i], ro[i], sc[i]) for i in range(len(batch))]
+        except Exception:
+            results = None
+        for i, request in enumerate(batch):
+            try:
+                if results is None:
+                    motion, t, r, s = normalization.normalize(request['motion'], self.translate, self.rotate, self.scale,
+                        True, None, *self.resampling)
+                    scores = self.scoreBatch(motion, numpy.array([0]))[0]
+                else:
+                    scores, t, r, s = results[i]
+                request['result'] = {
+                    # models skipped by pruning have no score
+                    'scores': {name: float(score) if numpy.isfinite(score) else None for name, score in zip(self.names, scores)},
+                    'recognized': self.names[int(numpy.argmax(scores))],
+                    'translation': t.tolist(),
+                    'rotation': r.tolist(),
+                    'scaling': s.tolist()}
+            except Exception as error:
+                request['error'] = error
+            request['done'].set()
+        with self.lock:
+            self.batchCount += 1
+
+    def scoreBatch(self, motions, offsets):
+        """!
+        Score normalized motions with all models.
+
+        Without pruning (see 'learning.setPruning'), all motions are scored in
+        one pass of the scoring engine.
+
+        @param motions numpy.array: The concatenated normalized motions
+        @param offsets numpy.array: The index of the first row of each motion
+        @return The scores, one row per motion
+        """
+        lengths = numpy.diff(numpy.append(offsets, len(motions)))
+        if numpy.any(lengths == 0):
+            raise ValueError('A motion has no poses after cleaning')
+        if self.projection is not None:
+            motions = self.projection.transform(motions, lengths)
+        if learning.pruning['margin'] > 0:
+            # the models are pruned for each motion
+            return numpy.array([learning.scoreMotion(self.engine, motion) for motion in normalization.split(motions, offsets)])
+        with instrumentation.stage('hmm.score', len(motions)):
+            return self.engine.score(motions, lengths)
+
+    def record(self, latency, failed=False):
+        """!
+        Record the latency of a request.
+
+        @param latency Number: The time in seconds between receiving the request and sending the response
+        @param failed Boolean: If the request failed
+        """
+        with self.lock:
+            self.latencies.append(latency)
+            self.requestCount += 1
+            if failed:
+                self.errorCount += 1
+
+    def stats(self):
+        """!
+        Get the statistics of the service.
+
+        @return A dictionary with the number of requests, errors and batches, and the latency percentiles in milliseconds
+        """
+        with self.lock:
+            latencies = numpy.array(self.latencies) * 1000
+            stats = {'requests': self.requestCount, 'errors': self.errorCount, 'batches': self.batchCount}
+        if len(latencies) > 0:
+            for percentile in (50, 90, 99):
+                stats['p' + str(percentile)] = float(numpy.percentile(latencies, percentile))
+            stats['max'] = float(numpy.max(latencies))
+        return stats
+
+def parseMotion(content, contentType, columns=8):
+    """!
+    Convert the payload of a request into a motion.
+
+    @param content bytes: The payload
+    @param contentType String: The content type of the payload
+    @param columns Int: The number of columns of raw float64 values
+    @return The motion, one pose per row
+    """
+    if contentType == 'application/x-npy':
+        motion = numpy.load(io.BytesIO(content), allow_pickle=False)
+    elif contentType == 'application/octet-stream':
+        motion = numpy.frombuffer(content, dtype=numpy.float64).reshape(-1, columns)
+    else:
+        motion, _ = input.parse(content)
+    motion = numpy.array(motion, dtype=float, ndmin=2)
+    if motion.shape[0] < 2 or motion.shape[1] < 8:
+        raise ValueError('A motion needs at least two poses with eight columns')
+    return motion
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    """!
+    Handle the HTTP requests of the service.
+    """
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.respond(200, self.server.service.stats())
+        else:
+            self.respond(404, {'error': 'Unknown path ' + self.path})
+
+    def do_POST(self):
+        start = time.monotonic()
+        if self.path != '/score':
+            self.respond(404, {'error': 'Unknown path ' + self.path})
+            return
+        try:
+            content = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            contentType = self.headers.get('Content-Type', 'text/csv').split(';')[0].strip()
+            motion = parseMotion(content, contentType, int(self.headers.get('X-Columns', 8)))
+            result = self.server.service.score(motion)
+        except Exception as error:
+            self.respond(400, {'error': str(error)})
+            self.server.service.record(time.monotonic() - start, True)
+            return
+        self.respond(200, result)
+        self.server.service.record(time.monotonic() - start)
+
+    def respond(self, status, content):
+        """!
+        Send a json response.
+
+        @param status Int: The HTTP status code
+        @param content dict: The content of the response
+        """
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # no logging of each request
+        pass
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """!
+    HTTP server on a Unix socket.
+    """
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # the request handler expects an address
+        return request, ('local', 0)
+
+def createServer(service, port=8765, socketPath=''):
+    """!
+    Create the HTTP server of a service.
+
+    @param service RecognitionService: The service handling the requests
+    @param port Int: The localhost port to listen on, default 8765
+    @param socketPath String: The path of a Unix socket to listen on instead of the port, optional
+    @return The server, start it with 'serve_forever'
+    """
+    if socketPath != '':
+        if os.path.exists(socketPath):
+            os.remove(socketPath)
+        server = UnixHTTPServer(socketPath, RequestHandler)
+    else:
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', port), RequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local motion recognition service')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', default='', help='Unix socket to listen on instead of the port')
+    parser.add_argument('--store', default='../models', help='Model store with the trained models')
+    parser.add_argument('--components', type=int, default=100)
+    parser.add_argument('--states', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--translate', default='')
+    parser.add_argument('--rotate', default='')
+    parser.add_argument('--scale', default='')
+    parser.add_argument('--columns', default='', help='Comma separated columns of the feature projection, default all columns')
+    parser.add_argument('--velocity', action='store_true', help='The feature projection adds the velocities')
+    parser.add_argument('--pca', type=int, default=0, help='The number of principal components of the feature projection')
+    parser.add_argument('--resample', default='', help="The resampling of the motions, 'frames' or 'arclength'")
+    parser.add_argument('--samples', type=int, default=100, help="The number of poses for 'frames' resampling")
+    parser.add_argument('--spacing', type=float, default=0.05, help="The distance between poses for 'arclength' resampling")
+    arguments = parser.parse_args()
+
+    if not os.path.isdir(arguments.store):
+        parser.error('No model store ' + arguments.store)
+    modelStore.setStoreDirectory(arguments.store)
+    normalization.setResampling(arguments.resample, arguments.samples, arguments.spacing)
+    projection = None
+    if arguments.columns != '' or arguments.velocity or arguments.pca > 0:
+        columns = [int(column) for column in arguments.columns.split(',')] if arguments.columns != '' else None
+        projection = features.Projection(columns, arguments.velocity, arguments.pca)
+    # the models are only taken from the store
+    try:
+        models = learning.loadStoredModels(arguments.components, arguments.states, arguments.iterations,
+            arguments.translate, arguments.rotate, arguments.scale, projection)
+    except ValueError as error:
+        parser.error(str(error))
+    # the names of the motion types when the models were trained
+    names = modelStore.loadModelSet(learning.trainingConfiguration(arguments.components, arguments.states, arguments.iterations,
+        arguments.translate, arguments.rotate, arguments.scale, projection))['names']
+    server = createServer(RecognitionService(models, names, arguments.translate, arguments.rotate, arguments.scale,
+        projection=projection), arguments.port, arguments.socket)
+    print('Listening on ' + (arguments.socket if arguments.socket != '' else '127.0.0.1:' + str(arguments.port)))
+    server.serve_forever()
@@ -0,0 +1,306 @@
+import numpy
+import quaternion
+import scaling
+import normalization
+from cleaning import length, distinctPoints
+from resampling import PathResampler
+from averageQuaternions import largestEigenVector
+
+class StreamingNormalizer:
+    """!
+    Normalize a motion which arrives in chunks of frames, e.g. live controller input.
+
+    The normalizer keeps running statistics for the translation, rotation and
+    scaling references and for cleaning, so that each frame only has to be
+    processed once. The references are updated with every chunk from all
+    frames seen so far, and the frames of the chunk are normalized with the
+    updated references. Feeding a whole motion as one chunk gives the same
+    result as 'normalization.normalize', except that the references are
+    calculated after cleaning and:
+
+        'median' translation: Approximated with a random sample of the frames,
+            once more than 'medianSamples' frames have been seen, and only
+            calculated again after 'medianInterval' further frames
+        Scaling: The extent of the earlier frames is taken with the rotation
+            reference at the time they were received
+
+    The normalized frames are resampled along their path as with the
+    'arclength' option of 'resampling.resample', with the distances measured
+    between the normalized frames. Resampling to a fixed number of poses
+    ('frames') needs the complete motion and can't be used on a stream.
+
+    Duplicate points are removed as in 'cleaning.removeDoublePoints'. Since
+    the longest part of a stream isn't known in advance, a jump (see
+    'cleaning.removeInvalidParts') starts a new part instead: all references
+    are reset and the frame numbering starts again. Jumps are detected
+    relative to the mean distance of the earlier points of the part.
+
+    The motion format should be:
+
+    | Frame | x | y | z | RotW | RotX | RotY | RotZ |
+    """
+
+    def __init__(self, translate='', rotate='', scale='', clean=True, threshold=1E-7, factor=3,
+            medianSamples=1001, medianInterval=25, warmup=10, seed=0, resampling=None):
+        """!
+        Create a normalizer for a new stream.
+
+        @param translate: The normalization for translating the motion
+        @param rotate: The normalization for rotating the motion
+        @param scale: The normalization for scaling the motion
+        @param clean: Remove duplicate points and start a new part at large jumps, default true
+        @param threshold Number: The distance between two points to be considered equal, default 1E-7
+        @param factor Number: The threshold for detecting jumps as a multiple of the mean distance between all points, default 3
+        @param medianSamples Int: The number of frames kept for the approximate median, default 1001
+        @param medianInterval Int: The number of frames between two calculations of the median, default 25
+        @param warmup Int: The number of points of a part before jumps are detected, default 10
+        @param seed Int: The seed for selecting the frames for the median, default 0
+        @param resampling tuple: The resampling (see 'normalization.setResampling'), default the one set there
+        """
+        self.translate = translate
+        self.rotate = rotate
+        self.scale = scale
+        self.clean = clean
+        self.threshold = threshold
+        self.factor = factor
+        self.warmup = warmup
+        self.random = numpy.random.default_rng(seed)
+        self.samples = numpy.empty((medianSamples, 3))
+        self.medianInterval = medianInterval
+        mode, _, spacing = normalization.resamplingSettings() if resampling is None else resampling
+        if 'frames' in mode:
+            raise ValueError("Resampling to a fixed number of poses needs the complete motion, use 'arclength' for streams")
+        self.resampler = PathResampler(spacing) if 'arclength' in mode else None
+        # last kept point of the stream, the first point is compared to the origin
+        self.previous = numpy.zeros(3)
+        # number of removed points and number of parts started because of jumps
+        self.removed = 0
+        self.jumps = 0
+        self.reset()
+
+    def reset(self):
+        """!
+        Forget all references and start a new part of the motion.
+
+        The last point is kept, so that duplicates are still detected.
+        """
+        self.count = 0
+        # the last two points of the part and the sum of the jump reference
+        self.recent = numpy.empty((0, 3))
+        self.distanceSum = 0.0
+        self.first = None
+        self.last = None
+        self.positionSum = numpy.zeros(3)
+        self.rotationSum = numpy.zeros((4,4))
+        self.rotationDirection = numpy.zeros(4)
+        self.minimums = numpy.full(3, numpy.inf)
+        self.maximums = numpy.full(3, -numpy.inf)
+        self.t = numpy.zeros(3)
+        # if the samples changed since the median was calculated, and the number of frames at that time
+        self.samplesChanged = False
+        self.medianCount = None
+        self.r = numpy.array([1.0,0.0,0.0,0.0])
+        self.s = numpy.zeros(3)
+        if self.resampler is not None:
+            self.resampler.reset()
+
+    def parameters(self):
+        """!
+        Get the current normalization parameters.
+
+        @return: The translation, rotation and scaling references
+        """
+        return self.translation().copy(), self.r.copy(), self.s.copy()
+
+    def push(self, frames):
+        """!
+        Add frames to the stream and normalize them.
+
+        @param frames numpy.array: The new frames, one per row
+        @return: The normalized frames which weren't removed by cleaning (or the resampled frames)
+        """
+        frames = numpy.atleast_2d(numpy.asarray(frames, dtype=float))
+        if self.clean:
+            frames = self.removeDoublePoints(frames)
+        parts = [numpy.empty((0, frames.shape[1]))]
+        while len(frames) > 0:
+            end = self.findJump(frames) if self.clean else len(frames)
+            if end > 0:
+                normalized = self.normalize(frames[:end])
+                if self.resampler is not None:
+                    normalized = self.resampler.push(normalized)
+                parts.append(normalized)
+                frames = frames[end:]
+            if len(frames) > 0:
+                self.jumps += 1
+                self.reset()
+        return numpy.concatenate(parts)
+
+    def removeDoublePoints(self, frames):
+        """!
+        Remove all frames which are at the same position as the last kept frame.
+
+        @param frames numpy.array: The new frames
+        @return: The frames without duplicates
+        """
+        keep = distinctPoints(frames[:,1:4], self.threshold, previous=self.previous)
+        self.removed += len(frames) - numpy.count_nonzero(keep)
+        if numpy.any(keep):
+            self.previous = frames[keep][-1,1:4].copy()
+        return frames[keep]
+
+    def distances(self, positions):
+        """!
+        Calculate the distance of new points of the current part to the previous point,
+        and their contribution to the jump reference (see 'cleaning.removeInvalidParts').
+
+        @param positions numpy.array: The new positions
+        @return: The distances and the reference distances, zero for the first point of the part
+        """
+        points = numpy.vstack((self.recent, positions))
+        index = len(self.recent) + numpy.arange(len(positions))
+        frame = self.count + numpy.arange(len(positions))
+        distances = numpy.zeros(len(positions))
+        second = frame >= 1
+        distances[second] = length(points[index[second]] - points[index[second] - 1])
+        reference = distances.copy()
+        # the jump reference compares each point (except the second) with the point two frames earlier
+        later = frame >= 2
+        reference[later] = length(points[index[later]] - points[index[later] - 2])
+        return distances, reference
+
+    def findJump(self, frames):
+        """!
+        Find the first frame which is too far away from the previous frame,
+        compared to the mean distance of the earlier points of the part.
+
+        @param frames numpy.array: The frames without duplicates
+        @return: The index of the first jump, or the number of frames if there is none
+        """
+        distances, reference = self.distances(frames[:,1:4])
+        # number and sum of the reference distances before each frame
+        counts = self.count - 1 + numpy.arange(len(frames))
+        sums = self.distanceSum + numpy.concatenate(([0.0], numpy.cumsum(reference)[:-1]))
+        jumps = (counts >= max(self.warmup, 1)) & (distances * counts > self.factor * sums)
+        if numpy.any(jumps):
+            return int(numpy.argmax(jumps))
+        return len(frames)
+
+    def normalize(self, frames):
+        """!
+        Update the references with frames of the current part and normalize them.
+
+        @param frames numpy.array: The frames without duplicates or jumps
+        @return: The normalized frames
+        """
+        self.update(frames)
+        q = quaternion.conjugate(quaternion.normalized(self.r))
+        R = quaternion.toMatrix(q)
+        rotated = frames[:,1:4].dot(R.T)
+        self.minimums = numpy.minimum(self.minimums, numpy.min(rotated, axis=0))
+        self.maximums = numpy.maximum(self.maximums, numpy.max(rotated, axis=0))
+        # extent of the translated and rotated part
+        shift = R.dot(self.translation())
+        minimums = self.minimums - shift
+        maximums = self.maximums - shift
+        with numpy.errstate(divide='ignore'):
+            factors = scaling.factors(minimums, maximums, self.scale)
+        if factors is not None:
+            # no scaling as long as the part has no extent in a dimension
+            factors = numpy.where(numpy.isfinite(factors), factors, 1.0)
+
+        out = numpy.empty(frames.shape)
+        out[:,1:4] = rotated - shift
+        if factors is None:
+            self.s = numpy.zeros(3)
+        else:
+            self.s = factors
+            out[:,1:4] *= factors
+            out[:,1:4] += (maximums + minimums) / 2 * (1 - factors)
+        out[:,4:8] = frames[:,4:8].dot(quaternion.productMatrix(q))
+        out[:,8:] = frames[:,8:]
+        if self.clean:
+            out[:,0] = self.count - len(frames) + numpy.arange(1, len(frames) + 1)
+        else:
+            out[:,0] = frames[:,0]
+        return out
+
+    def update(self, frames):
+        """!
+        Update the running statistics with frames of the current part.
+
+        @param frames numpy.array: The frames without duplicates or jumps
+        """
+        positions = frames[:,1:4]
+        rotations = frames[:,4:8]
+        if self.clean:
+            _, reference = self.distances(positions)
+            self.distanceSum += numpy.sum(reference)
+            self.recent = numpy.vstack((self.recent, positions[-2:]))[-2:]
+        if self.first is None:
+            self.first = frames[0].copy()
+        self.last = frames[-1].copy()
+        self.updateSamples(positions)
+        self.count += len(frames)
+        self.positionSum += numpy.sum(positions, axis=0)
+        self.rotationSum += rotations.T.dot(rotations)
+        self.rotationDirection += numpy.sum(rotations, axis=0)
+
+        if 'start' in self.translate:
+            self.t = self.first[1:4].copy()
+        elif 'median' in self.translate:
+            # calculated when needed, see 'translation'
+            pass
+        elif 'mean' in self.translate:
+            self.t = self.positionSum / self.count
+        elif 'end' in self.translate:
+            self.t = self.last[1:4].copy()
+
+        if 'mean' in self.rotate:
+            self.r = largestEigenVector(self.rotationSum / self.count, self.rotationDirection)
+        elif 'start' in self.rotate:
+            self.r = self.first[4:8].copy()
+        elif 'end' in self.rotate:
+            self.r = self.last[4:8].copy()
+
+    def translation(self):
+        """!
+        Get the translation reference.
+
+        The approximate median takes time linear in 'medianSamples', so it is
+        only calculated again if the samples changed and at least
+        'medianInterval' frames were added since the last calculation (and
+        for the first frames of a part). This costs about
+        medianSamples / medianInterval steps per frame, independent of the
+        size of the chunks. Until then, the frames are normalized with the
+        earlier median.
+
+        @return: The translation reference
+        """
+        if self.samplesChanged and (self.medianCount is None or self.count - self.medianCount >= self.medianInterval):
+            self.t = numpy.median(self.samples[:min(self.count, len(self.samples))], axis=0)
+            self.samplesChanged = False
+            self.medianCount = self.count
+        return self.t
+
+    def updateSamples(self, positions):
+        """!
+        Keep a uniform random sample of all positions of the current part (reservoir sampling).
+
+        @param positions numpy.array: The new positions
+        """
+        size = len(self.samples)
+        index = self.count + numpy.arange(len(positions))
+        # fill the sample with the first positions
+        fill = index < size
+        self.samples[index[fill]] = positions[fill]
+        changed = numpy.any(fill)
+        # replace random samples with decreasing probability
+        later = numpy.flatnonzero(~fill)
+        if len(later) > 0:
+            slots = self.random.integers(0, index[later] + 1)
+            replace = slots < size
+            self.samples[slots[replace]] = positions[later[replace]]
+            changed = changed or numpy.any(replace)
+        if changed and 'median' in self.translate:
+            self.samplesChanged = True
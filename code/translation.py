@@ -23,42 +23,77 @@ def translate(motion, mode=''):
     @param options: The translation reference, choose one of the options above
     @return: The normalization translation for each dimension
     """
+    center = reference(motion, mode)
+    moveByVector(motion, center)
+    return center
+
+def reference(motion, mode=''):
+    """!
+    Calculate the translation reference of a motion without changing it.
+
+    See 'translate' for the available options and the motion format.
+
+    @param motion numpy.array: The positions of the motion
+    @param mode: The translation reference
+    @return: The normalization translation for each dimension
+    """
     if 'start' in mode:
-        return toStartPoint(motion)
+        return numpy.array(motion[0], dtype=float)
     if 'median' in mode:
-        return toMedianCenter(motion)
+        return numpy.median(motion, axis=0)
     if 'mean' in mode:
-        return toMeanCenter(motion)
+        return numpy.mean(motion, axis=0)
     if 'end' in mode:
-        return toEndPoint(motion)
+        return numpy.array(motion[-1], dtype=float)
     return numpy.zeros(3)
 
+def referenceBatch(motion, offsets, mode=''):
+    """!
+    Calculate the translation references of many motions at once.
+
+    The motions are concatenated in one array, with the index of the first
+    row of each motion in 'offsets'. See 'translate' for the available options.
+
+    @param motion numpy.array: The positions of all motions
+    @param offsets numpy.array: The index of the first row of each motion, in increasing order
+    @param mode: The translation reference
+    @return: The normalization translation for each motion and dimension
+    """
+    offsets = numpy.asarray(offsets, dtype=numpy.intp)
+    lengths = numpy.diff(numpy.append(offsets, len(motion)))
+    if 'start' in mode:
+        return numpy.array(motion[offsets], dtype=float)
+    if 'median' in mode:
+        # sort the values of each motion, then pick the middle value(s)
+        motionIndex = numpy.repeat(numpy.arange(len(offsets)), lengths)
+        lower = offsets + (lengths - 1) // 2
+        upper = offsets + lengths // 2
+        center = numpy.empty((len(offsets), 3))
+        for dimension in range(3):
+            values = motion[numpy.lexsort((motion[:,dimension], motionIndex)), dimension]
+            center[:,dimension] = (values[lower] + values[upper]) / 2
+        return center
+    if 'mean' in mode:
+        return numpy.add.reduceat(motion, offsets, axis=0) / lengths[:,None]
+    if 'end' in mode:
+        return numpy.array(motion[offsets + lengths - 1], dtype=float)
+    return numpy.zeros((len(offsets), 3))
+
 # translate to move the mean in the three directions to the origin
 def toMeanCenter(motion):
-    center = numpy.mean(motion, axis=0)
-    moveByVector(motion, center)
-    return center
+    return translate(motion, 'mean')
 
 # translate to move the median in the three directions to the origin
 def toMedianCenter(motion):
-    center = numpy.median(motion, axis=0)
-    moveByVector(motion, center)
-    return center
+    return translate(motion, 'median')
 
 # translate to move the start point to the origin
 def toStartPoint(motion):
-    center = motion[0]
-    moveByVector(motion, center)
-    return center
+    return translate(motion, 'start')
 
 def toEndPoint(motion):
-    center = motion[end]
-    moveByVector(motion, center)
-    return center
+    return translate(motion, 'end')
 
 # substract the motion by a given vector
 def moveByVector(motion, vector):
-    for pose in motion:
-        pose[0] -= vector[0]
-        pose[1] -= vector[1]
-        pose[2] -= vector[2]
+    motion[:,0:3] -= vector
@@ -0,0 +1,62 @@
+# Shared setup of the regression tests.
+#
+# The modules in code/ import each other by name (the scripts are run from
+# code/), so the directory is added to the module path. The tests run on the
+# recordings in data/.
+#
+
+import os
+import sys
+import glob
+import pytest
+
+codePath = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'code')
+dataPath = os.path.join(os.path.dirname(codePath), 'data')
+sys.path.insert(0, codePath)
+
+@pytest.fixture(scope='session')
+def files():
+    """!
+    @return The paths of all recordings in data/
+    """
+    return sorted(glob.glob(dataPath + '/*/*/*.csv'))
+
+@pytest.fixture(scope='session')
+def motions(files):
+    """!
+    @return The parsed motions of all recordings in data/
+    """
+    import input
+    return [input.readBulk(file)[0] for file in files]
+
+@pytest.fixture(scope='session')
+def smallData(tmp_path_factory):
+    """!
+    @return A data directory with two motion types and a few recordings of each, for quick training
+    """
+    import shutil
+    path = tmp_path_factory.mktemp('data')
+    for motion in ('flipping', 'wiping'):
+        for variation, count in (('training', 3), ('testing', 2)):
+            folder = path / motion / variation
+            folder.mkdir(parents=True)
+            for file in sorted(glob.glob(dataPath + '/' + motion + '/' + variation + '/*.csv'))[:count]:
+                shutil.copy(file, str(folder))
+    return str(path)
+
+@pytest.fixture
+def training(monkeypatch):
+    """!
+    Prepare quick training: no plots, and no mixture components
+    (the old sklearn class used by 'learning.createGMMComponents' is gone).
+    """
+    import learning
+    import plot
+    import modelStore
+    import normalization
+    monkeypatch.setattr(learning, 'createGMMComponents', lambda components: [])
+    plot.setPlotMode('disabled')
+    yield
+    plot.setPlotMode('inline')
+    modelStore.setStoreDirectory('')
+    normalization.setResampling()
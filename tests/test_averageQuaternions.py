@@ -0,0 +1,60 @@
+# Tests of the batched quaternion averaging ('averageQuaternions') against
+# the original loops over the quaternions.
+#
+
+import numpy
+import averageQuaternions
+
+def weightedAverageLoop(Q, w):
+    """!
+    Average quaternions one outer product at a time, as in the original implementation.
+
+    @return The average quaternion (the sign is arbitrary)
+    """
+    A = numpy.zeros((4, 4))
+    weightSum = 0
+    for i in range(len(Q)):
+        A = w[i] * numpy.outer(Q[i], Q[i]) + A
+        weightSum += w[i]
+    eigenValues, eigenVectors = numpy.linalg.eig(A / weightSum)
+    return numpy.real(eigenVectors[:, eigenValues.argsort()[::-1]][:, 0])
+
+def randomSets(random, sizes):
+    """!
+    @return Sets of unit quaternions near a random orientation each, with random signs
+    """
+    sets = []
+    for size in sizes:
+        Q = random.normal(0, 1, 4) + random.normal(0, 0.2, (size, 4))
+        Q /= numpy.linalg.norm(Q, axis=1)[:, None]
+        sets.append(Q * random.choice([-1, 1], (size, 1)))
+    return sets
+
+def assertSameOrientation(actual, expected, direction):
+    # same orientation, with the sign pointing towards the majority of the input
+    numpy.testing.assert_allclose(numpy.abs(actual.dot(expected)), 1, rtol=1E-9)
+    assert actual.dot(direction) >= 0
+
+def test_averageMatchesLoop():
+    random = numpy.random.RandomState(0)
+    for Q in randomSets(random, [1, 2, 5, 100]):
+        w = numpy.ones(len(Q))
+        assertSameOrientation(averageQuaternions.averageQuaternions(Q), weightedAverageLoop(Q, w), numpy.sum(Q, axis=0))
+        w = random.uniform(0.1, 2, len(Q))
+        assertSameOrientation(averageQuaternions.weightedAverageQuaternions(Q, w), weightedAverageLoop(Q, w), w.dot(Q))
+
+def test_batchesMatchSingleSets():
+    random = numpy.random.RandomState(1)
+    stacked = numpy.stack(randomSets(random, [20] * 6))
+    w = random.uniform(0.1, 2, stacked.shape[:2])
+    numpy.testing.assert_allclose(averageQuaternions.averageQuaternions(stacked),
+        [averageQuaternions.averageQuaternions(Q) for Q in stacked], rtol=1E-9, atol=1E-12)
+    numpy.testing.assert_allclose(averageQuaternions.weightedAverageQuaternions(stacked, w),
+        [averageQuaternions.weightedAverageQuaternions(Q, weights) for Q, weights in zip(stacked, w)], rtol=1E-9, atol=1E-12)
+    sets = randomSets(random, [1, 7, 30, 3])
+    offsets = numpy.cumsum([0] + [len(Q) for Q in sets[:-1]])
+    weights = [random.uniform(0.1, 2, len(Q)) for Q in sets]
+    numpy.testing.assert_allclose(averageQuaternions.segmentAverageQuaternions(numpy.concatenate(sets), offsets),
+        [averageQuaternions.averageQuaternions(Q) for Q in sets], rtol=1E-9, atol=1E-12)
+    numpy.testing.assert_allclose(averageQuaternions.segmentAverageQuaternions(numpy.concatenate(sets), offsets, numpy.concatenate(weights)),
+        [averageQuaternions.weightedAverageQuaternions(Q, w) for Q, w in zip(sets, weights)], rtol=1E-9, atol=1E-12)
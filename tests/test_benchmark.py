@@ -0,0 +1,36 @@
+# Tests of the benchmark with synthetic motions ('benchmark').
+#
+
+import os
+import json
+import numpy
+import benchmark
+import input
+import cleaning
+
+def test_generatedMotionRoundTrip(tmp_path):
+    repeated = benchmark.generateMotion(500, numpy.random.default_rng(1), duplicates=0.05)
+    _, removed = cleaning.removeDoublePoints(repeated)
+    assert removed > 0
+    motion = benchmark.generateMotion(500, numpy.random.default_rng(0))
+    assert motion.shape == (500, 8)
+    numpy.testing.assert_allclose(numpy.linalg.norm(motion[:, 4:8], axis=1), 1, rtol=1E-12)
+    file, = benchmark.generateFiles(str(tmp_path), 1, 500, numpy.random.default_rng(0))
+    # the file has the header of the recordings, and the values with 7 digits
+    parsed, dropped = input.readBulk(file)
+    assert dropped == 0
+    numpy.testing.assert_allclose(parsed, motion, rtol=1E-6, atol=1E-7)
+    assert os.path.basename(file) == 'motion00000.csv'
+
+def test_run(tmp_path):
+    report = benchmark.run([200], [2], fileFrames=50, repeat=1, hmmFrames=200, directory=str(tmp_path))
+    json.dumps(report)
+    stages = [(result['benchmark'], result['stage']) for result in report['results']]
+    assert stages == [('stages', name) for name in ['read', 'clean', 'translate', 'rotate', 'scale', 'averageQuaternions',
+        'normalize', 'end to end', 'hmm fit', 'hmm score']] + [('files', name) for name in ['read', 'normalize each', 'normalize batch']]
+    for result in report['results']:
+        assert result['frames'] == (200 if result['benchmark'] == 'stages' else 100)
+        assert 0 < result['min'] <= result['median']
+    assert report['settings']['seed'] == 0
+    # the synthetic files are removed
+    assert [name for _, _, files in os.walk(str(tmp_path)) for name in files] == []
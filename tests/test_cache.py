@@ -0,0 +1,58 @@
+# Tests of the cache of parsed motions ('cache').
+#
+
+import os
+import shutil
+import numpy
+import pytest
+import cache
+import input
+
+@pytest.fixture
+def cached(tmp_path, files):
+    """!
+    @return Three copies of a recording (with entries of the same size), with the cache in a temporary directory
+    """
+    copies = []
+    for i in range(3):
+        copies.append(str(tmp_path / (str(i) + '.csv')))
+        shutil.copy(files[0], copies[-1])
+    cache.setCacheDirectory(str(tmp_path / 'cache'))
+    yield copies
+    cache.setCacheDirectory('')
+
+def entries():
+    return sorted(name for name in os.listdir(cache.cacheDirectory) if name.endswith('.npz'))
+
+def test_readFromCache(cached):
+    motion = input.read(cached[0])
+    assert len(entries()) == 1
+    numpy.testing.assert_array_equal(cache.load(cached[0]), motion)
+    numpy.testing.assert_array_equal(input.read(cached[0]), input.readBulk(cached[0])[0])
+    # the separator is part of the key
+    assert cache.load(cached[0], ';') is None
+
+def test_changedFileIsParsedAgain(cached):
+    input.read(cached[0])
+    with open(cached[0], 'a') as f:
+        f.write('0,1,2,3,1,0,0,0\n')
+    assert cache.load(cached[0]) is None
+    assert entries() == []
+    motion = input.read(cached[0])
+    numpy.testing.assert_array_equal(motion[-1], [0, 1, 2, 3, 1, 0, 0, 0])
+    numpy.testing.assert_array_equal(cache.load(cached[0]), motion)
+
+def test_leastRecentlyUsedIsEvicted(cached):
+    for file in cached[:2]:
+        input.read(file)
+    paths = [cache.entryPath(file, ',') for file in cached]
+    # the first entry is older, but is used again
+    os.utime(paths[0], ns=(10**18, 10**18))
+    os.utime(paths[1], ns=(11 * 10**17, 11 * 10**17))
+    assert cache.load(cached[0]) is not None
+    sizes = [os.path.getsize(path) for path in paths[:2]]
+    cache.setCacheDirectory(cache.cacheDirectory, maxSize=sum(sizes) + 100)
+    input.read(cached[2])
+    assert os.path.exists(paths[0]) and os.path.exists(paths[2])
+    assert not os.path.exists(paths[1])
+    assert cache.usedSize <= cache.cacheSize
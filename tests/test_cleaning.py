@@ -0,0 +1,115 @@
+# Regression tests of the vectorized cleaning ('cleaning.clean' and
+# 'cleaning.cleanBatch') against the original loops over the points.
+#
+
+import numpy
+import cleaning
+import normalization
+
+def removeDoublePointsLoop(motion, threshold=1E-7):
+    """!
+    Remove duplicate points one by one, as in the original implementation.
+
+    @return The mask of the kept points
+    """
+    keep = numpy.zeros(len(motion), dtype=bool)
+    p = numpy.array([0.0, 0.0, 0.0])
+    for i, item in enumerate(motion):
+        distance = numpy.sqrt((p[0]-item[1])**2 + (p[1]-item[2])**2 + (p[2]-item[3])**2)
+        if distance > threshold:
+            keep[i] = True
+            p = item[1:4]
+    return keep
+
+def removeInvalidPartsLoop(motion, factor=3):
+    """!
+    Select the largest part between jumps, as in the original implementation.
+
+    @return The first and last (exclusive) index of the part
+    """
+    rows = len(motion)
+    distances = []
+    p = motion[0][1:4]
+    for index, item in enumerate(motion[1:]):
+        distances.append(numpy.sqrt((p[0]-item[1])**2 + (p[1]-item[2])**2 + (p[2]-item[3])**2))
+        p = motion[index][1:4]
+    m = numpy.mean(distances)
+    jumps = []
+    p = motion[0][1:4]
+    for index, item in enumerate(motion[1:]):
+        distance = numpy.sqrt((p[0]-item[1])**2 + (p[1]-item[2])**2 + (p[2]-item[3])**2)
+        if distance / m > factor:
+            jumps.append(index+1)
+        p = item[1:4]
+    jumps.append(rows)
+    start, end, prev, m = 0, rows, 0, 0
+    for item in jumps:
+        if item - prev > m:
+            m = item - prev
+            start, end = prev, item
+        prev = item
+    return start, end
+
+def withDuplicates(motion, seed):
+    """!
+    Repeat some poses of a motion, and let some points drift by less than the threshold.
+    """
+    random = numpy.random.RandomState(seed)
+    rows = numpy.sort(numpy.concatenate((numpy.arange(len(motion)), random.randint(0, len(motion), len(motion) // 4))))
+    out = motion[rows].copy()
+    drift = random.rand(len(out)) < 0.1
+    out[drift, 1:4] += random.uniform(-4E-8, 4E-8, (numpy.sum(drift), 3))
+    return out
+
+def test_removeDoublePointsMatchesLoop(motions):
+    for seed, motion in enumerate(motions):
+        for candidate in (motion, withDuplicates(motion, seed)):
+            out, count = cleaning.removeDoublePoints(candidate)
+            keep = removeDoublePointsLoop(candidate)
+            numpy.testing.assert_array_equal(out[:,1:], candidate[keep, 1:])
+            numpy.testing.assert_array_equal(out[:,0], numpy.arange(1, len(out) + 1))
+            assert count == len(candidate) - numpy.sum(keep)
+
+def test_distinctPointsDrift():
+    # points creeping away from the last kept point by less than the threshold each
+    positions = numpy.zeros((50, 3))
+    positions[:,0] = numpy.arange(50) * 3E-8 + 1
+    motion = numpy.hstack((numpy.zeros((50, 1)), positions))
+    numpy.testing.assert_array_equal(cleaning.distinctPoints(positions), removeDoublePointsLoop(motion))
+
+def test_removeInvalidPartsMatchesLoop(motions):
+    for motion in motions:
+        distinct, _ = cleaning.removeDoublePoints(motion)
+        out, count = cleaning.removeInvalidParts(distinct)
+        start, end = removeInvalidPartsLoop(distinct)
+        numpy.testing.assert_array_equal(out[:,1:], distinct[start:end, 1:])
+        assert count == len(distinct) - end + start
+
+def test_removeInvalidPartsWithJump(motions):
+    motion = motions[0].copy()
+    middle = len(motion) // 3
+    motion[middle:, 1:4] += 10
+    out, count = cleaning.removeInvalidParts(motion)
+    start, end = removeInvalidPartsLoop(motion)
+    assert (start, end) == (middle, len(motion))
+    numpy.testing.assert_array_equal(out[:,1:], motion[start:end, 1:])
+
+def test_cleanBatchMatchesClean(motions):
+    candidates = [withDuplicates(motion, seed) for seed, motion in enumerate(motions)]
+    concatenated, offsets = normalization.concatenate(candidates)
+    out, newOffsets, counts = cleaning.cleanBatch(concatenated, offsets)
+    for i, cleaned in enumerate(normalization.split(out, newOffsets)):
+        expected, count = cleaning.clean(candidates[i])
+        numpy.testing.assert_array_equal(cleaned, expected)
+        assert counts[i] == count
+
+def test_cleanRemovesDuplicatesBeforeJumps(motions):
+    # the original implementation selected the largest part of the motion with the duplicates
+    for seed, motion in enumerate(motions[::5]):
+        candidate = withDuplicates(motion, seed)
+        out, count = cleaning.clean(candidate)
+        distinct = candidate[removeDoublePointsLoop(candidate)]
+        start, end = removeInvalidPartsLoop(distinct)
+        numpy.testing.assert_array_equal(out[:,1:], distinct[start:end, 1:])
+        assert count == len(candidate) - end + start
+        assert numpy.all(cleaning.length(numpy.diff(out[:,1:4], axis=0)) > 1E-7)
@@ -0,0 +1,57 @@
+# Tests of the packed corpus of normalized motions ('corpus').
+#
+
+import glob
+import numpy
+import corpus
+import input
+import learning
+import normalization
+
+translate, rotate, scale = 'median', 'mean', 'largest'
+
+def test_packRoundTrip(smallData, tmp_path):
+    path = str(tmp_path / 'corpus')
+    corpus.pack(path, smallData, translate, rotate, scale)
+    data, index = corpus.load(path)
+    assert list(index['classNames']) == ['flipping', 'wiping']
+    assert list(index['variationNames']) == ['testing', 'training']
+    for motion in index['classNames']:
+        for variation in index['variationNames']:
+            files = sorted(glob.glob(smallData + '/' + motion + '/' + variation + '/*.csv'))
+            motions, names = corpus.motions(data, index, motion, variation)
+            X, lengths = corpus.motionsAndLengths(data, index, motion, variation)
+            assert len(motions) == len(files)
+            expected = [normalization.normalize(input.read(file), translate, rotate, scale)[0] for file in files]
+            for file, name, packed, normalized in zip(files, names, motions, expected):
+                assert file.endswith('/' + name + '.csv')
+                numpy.testing.assert_array_equal(packed, normalized)
+            numpy.testing.assert_array_equal(X, numpy.concatenate(expected))
+            assert lengths == [len(motion) for motion in expected]
+    motions, _ = corpus.motions(data, index, 'throwing')
+    assert motions == []
+
+def test_matchesNormalization(smallData, tmp_path):
+    path = str(tmp_path / 'corpus')
+    corpus.pack(path, smallData, translate, rotate, scale)
+    _, index = corpus.load(path)
+    assert corpus.matchesNormalization(index, translate, rotate, scale)
+    assert not corpus.matchesNormalization(index, 'mean', rotate, scale)
+    assert not corpus.matchesNormalization(index, translate, rotate, scale, clean=False)
+    normalization.setResampling('arclength', spacing=0.05)
+    try:
+        assert not corpus.matchesNormalization(index, translate, rotate, scale)
+    finally:
+        normalization.setResampling()
+
+def test_trainingFromCorpus(smallData, tmp_path, training):
+    path = str(tmp_path / 'corpus')
+    corpus.pack(path, smallData, translate, rotate, scale)
+    # the models are initialized with the global random state of numpy
+    numpy.random.seed(0)
+    expected = learning.learnMotions(1, 3, 2, smallData, translate, rotate, scale)
+    numpy.random.seed(0)
+    models = learning.learnMotions(1, 3, 2, smallData, translate, rotate, scale, corpusPath=path)
+    for model, reference in zip(models, expected):
+        numpy.testing.assert_allclose(model.means_, reference.means_, rtol=1E-9)
+        numpy.testing.assert_allclose(model.transmat_, reference.transmat_, rtol=1E-9, atol=1E-12)
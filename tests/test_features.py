@@ -0,0 +1,53 @@
+# Tests of the feature projection ('features.Projection') and of its storage
+# with the trained models.
+#
+
+import numpy
+import features
+import learning
+import modelStore
+
+def test_featuresWithVelocity():
+    X = numpy.arange(24, dtype=float).reshape(6, 4) ** 2
+    projection = features.Projection([0, 2], True)
+    out = projection.transform(X, [2, 4])
+    numpy.testing.assert_array_equal(out[:, :2], X[:, [0, 2]])
+    # the velocity of the frame number is left out, and each motion starts at rest
+    expected = numpy.zeros(6)
+    expected[1:] = numpy.diff(X[:, 2])
+    expected[[0, 2]] = 0
+    numpy.testing.assert_array_equal(out[:, 2], expected)
+
+def test_principalComponents(motions):
+    X = numpy.concatenate(motions[:10])
+    projection = features.Projection([1, 2, 3, 4, 5, 6, 7], False, 3)
+    assert projection.needsFit()
+    projection.fit(X)
+    out = projection.transform(X)
+    centered = X[:, 1:] - numpy.mean(X[:, 1:], axis=0)
+    values = numpy.linalg.svd(centered, compute_uv=False) ** 2 / (len(X) - 1)
+    numpy.testing.assert_allclose(numpy.var(out, axis=0, ddof=1), values[:3], rtol=1E-9)
+    numpy.testing.assert_allclose(out.T.dot(out) / (len(X) - 1), numpy.diag(values[:3]), atol=1E-9 * values[0])
+
+def test_arraysRoundTrip(motions):
+    projection = features.Projection([1, 2, 3], True, 2)
+    projection.fit(motions[0])
+    copy = features.fromArrays(projection.arrays())
+    assert copy.key() == projection.key()
+    numpy.testing.assert_array_equal(copy.transform(motions[1]), projection.transform(motions[1]))
+
+def test_storedProjectionIsReused(smallData, tmp_path, training, monkeypatch):
+    modelStore.setStoreDirectory(str(tmp_path))
+    fits = []
+    fit = learning.fitProjection
+    monkeypatch.setattr(learning, 'fitProjection', lambda *arguments: fits.append(1) or fit(*arguments))
+    first = features.Projection([1, 2, 3], True, 4)
+    models = learning.learnMotions(1, 3, 2, smallData, 'median', 'mean', 'largest', projection=first)
+    assert isinstance(models, list) and not first.needsFit()
+    second = features.Projection([1, 2, 3], True, 4)
+    again = learning.learnMotions(1, 3, 2, smallData, 'median', 'mean', 'largest', projection=second)
+    assert len(fits) == 1
+    assert second.key() == first.key()
+    assert modelStore.loadProjection(first.key()).key() == first.key()
+    for a, b in zip(models, again):
+        numpy.testing.assert_array_equal(a.means_, b.means_)
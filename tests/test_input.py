@@ -0,0 +1,62 @@
+# Regression tests of the vectorized parsing of motion files ('input.parse').
+#
+
+import numpy
+import input
+
+def readLoop(file, separator=','):
+    """!
+    Read a motion line by line, as in the original implementation, but only
+    remove the line break (the original removed the last character of each
+    line, which cut a digit off a last line without a line break).
+
+    @return The motion
+    """
+    motion = []
+    for line in open(file):
+        itemList = line.rstrip('\n').split(separator)
+        try:
+            motion.append([float(item) for item in itemList])
+        except ValueError:
+            pass
+    return numpy.array(motion)
+
+def test_readBulkMatchesLoop(files):
+    for file in files:
+        motion, dropped = input.readBulk(file)
+        numpy.testing.assert_array_equal(motion, readLoop(file))
+        assert dropped == 0
+
+def test_parseHeader():
+    content = b'Recording for Right controller\r\nFrame,PosX,PosY\r\n1,2,3\r\n4,5,6\r\n'
+    motion, dropped = input.parse(content)
+    numpy.testing.assert_array_equal(motion, [[1, 2, 3], [4, 5, 6]])
+    assert dropped == 0
+
+def test_parseDropsLaterText():
+    # only the lines before the first line of numbers are headers
+    motion, dropped = input.parse(b'Frame,X\n1,2\nPaused\n3,4\n5\n')
+    numpy.testing.assert_array_equal(motion, [[1, 2], [3, 4]])
+    assert dropped == 2
+
+def test_parseNanAndInf():
+    # values which float() accepts are kept, also in a leading line, which isn't a header
+    motion, dropped = input.parse(b'nan,3\n1,inf\n-Infinity,5')
+    numpy.testing.assert_array_equal(motion, [[numpy.nan, 3], [1, numpy.inf], [-numpy.inf, 5]])
+    assert dropped == 0
+
+def test_parseCorruptFirstLine():
+    # the number of columns is taken from the first line which can be converted
+    motion, dropped = input.parse(b'Recording\nFrame,X\n1,2,3,\n4,5,6\n7,8,9\n')
+    numpy.testing.assert_array_equal(motion, [[4, 5, 6], [7, 8, 9]])
+    assert dropped == 1
+
+def test_parseWithoutNumbers():
+    for content in (b'Frame,X\n', b'1,2.3.4\n', b''):
+        motion, _ = input.parse(content)
+        assert motion.shape == (0,)
+
+def test_parseWithoutHeader():
+    motion, dropped = input.parse(b'Frame,X\n1,2\n', columns=2, header=False)
+    numpy.testing.assert_array_equal(motion, [[1, 2]])
+    assert dropped == 1
@@ -0,0 +1,66 @@
+# Tests of the measurements of the processing stages ('instrumentation').
+#
+
+import json
+import threading
+import pytest
+import instrumentation
+import normalization
+
+@pytest.fixture
+def measured():
+    instrumentation.setEnabled(True)
+    yield
+    instrumentation.setEnabled(False)
+
+def test_disabled():
+    instrumentation.setEnabled(False)
+    with instrumentation.stage('read', 10) as measurement:
+        assert measurement is None
+    instrumentation.count('read.parsed')
+    assert instrumentation.report()['stages'] == {}
+    assert instrumentation.report()['counters'] == {}
+
+def test_stagesAndCounters(measured):
+    for _ in range(3):
+        with instrumentation.stage('read', 10) as measurement:
+            measurement.rows = 20
+    instrumentation.count('clean.duplicates', 4)
+    instrumentation.count('clean.duplicates')
+    report = instrumentation.report()
+    assert report['stages']['read']['calls'] == 3
+    assert report['stages']['read']['rows'] == 60
+    assert report['stages']['read']['wall'] >= 0 and report['wall'] >= report['stages']['read']['wall']
+    assert report['counters'] == {'clean.duplicates': 5}
+
+def test_mergeAndExport(measured, tmp_path):
+    instrumentation.add('hmm.fit', 1.0, 0.5, 100)
+    other = {'stages': {'hmm.fit': {'calls': 2, 'wall': 2.0, 'cpu': 1.0, 'rows': 50}}, 'counters': {'read.parsed': 3}}
+    instrumentation.merge(other)
+    instrumentation.merge(other)
+    instrumentation.export(str(tmp_path / 'instrumentation.json'))
+    with open(str(tmp_path / 'instrumentation.json')) as f:
+        report = json.load(f)
+    assert report['stages']['hmm.fit'] == {'calls': 5, 'wall': 5.0, 'cpu': 2.5, 'rows': 200}
+    assert report['counters'] == {'read.parsed': 6}
+
+def test_threads(measured):
+    def work():
+        for _ in range(1000):
+            instrumentation.add('score', 0.001, rows=1)
+            instrumentation.count('scored')
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report = instrumentation.report()
+    assert report['stages']['score']['calls'] == report['stages']['score']['rows'] == 4000
+    assert report['counters']['scored'] == 4000
+
+def test_normalizeStages(measured, motions):
+    normalization.normalize(motions[0], 'median', 'mean', 'largest', resample='arclength', spacing=0.05)
+    stages = instrumentation.report()['stages']
+    for name in ['normalize.translation', 'normalize.rotation', 'normalize.scaling', 'normalize.clean', 'normalize.resample']:
+        assert stages[name]['calls'] == 1
+    assert stages['normalize.translation']['rows'] == len(motions[0])
@@ -0,0 +1,46 @@
+# Tests of the training and recognition ('learning'): parallel workers
+# against sequential runs.
+#
+
+import glob
+import types
+import functools
+import numpy
+import pytest
+from hmmlearn import hmm
+import learning
+
+translate, rotate, scale = 'median', 'mean', 'largest'
+
+@pytest.fixture
+def seeded(monkeypatch, training):
+    """!
+    Initialize each model with the same random state, also in worker processes,
+    so that models trained in different processes can be compared.
+    """
+    # the models keep the class of hmmlearn, so that they can be returned from the workers
+    monkeypatch.setattr(learning, 'hmm', types.SimpleNamespace(GMMHMM=functools.partial(hmm.GMMHMM, random_state=0)))
+
+def test_parallelTrainingMatchesSequential(smallData, seeded, capsys):
+    expected = learning.learnMotions(1, 3, 2, smallData, translate, rotate, scale)
+    sequentialOutput = capsys.readouterr().out
+    models = learning.learnMotions(1, 3, 2, smallData, translate, rotate, scale, workers=2)
+    assert capsys.readouterr().out == sequentialOutput
+    assert len(models) == len(expected) == 2
+    for model, reference in zip(models, expected):
+        numpy.testing.assert_array_equal(model.means_, reference.means_)
+        numpy.testing.assert_array_equal(model.transmat_, reference.transmat_)
+        numpy.testing.assert_array_equal(model.covars_, reference.covars_)
+
+def test_parallelRecognitionMatchesSequential(smallData, seeded):
+    models = learning.learnMotions(1, 3, 2, smallData, translate, rotate, scale)
+    folders = sorted(glob.glob(smallData + '/*/*/'))
+    expected = list(learning.recognizeFolders(models, folders, translate, rotate, scale))
+    results = list(learning.recognizeFolders(models, folders, translate, rotate, scale, workers=2))
+    assert len(results) == len(folders)
+    for (scores, tr, ro, sc, names), (eScores, eTr, eRo, eSc, eNames) in zip(results, expected):
+        assert names == eNames
+        numpy.testing.assert_allclose(scores, eScores, rtol=1E-12)
+        numpy.testing.assert_allclose(tr, eTr, rtol=1E-12)
+        numpy.testing.assert_allclose(ro, eRo, rtol=1E-12)
+        numpy.testing.assert_allclose(sc, eSc, rtol=1E-12)
@@ -0,0 +1,75 @@
+# Tests of the buffered log ('logger.Logger') and of passing the log of
+# worker processes to the main process.
+#
+
+import os
+import sys
+import json
+import subprocess
+import threading
+import pytest
+import logger
+import input
+import learning
+
+def test_jsonLinesWithContext(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    log = logger.Logger(path, run='test')
+    context = log.context(**{'class': 'wiping'})
+    context.log('Training', file='a.csv')
+    context.context(file='b.csv').log('Scoring')
+    log.close()
+    records = [json.loads(line) for line in open(path)]
+    assert [record['message'] for record in records] == ['Training', 'Scoring']
+    assert all(record['run'] == 'test' and record['class'] == 'wiping' for record in records)
+    assert [record['file'] for record in records] == ['a.csv', 'b.csv']
+
+def test_textWithThreads(tmp_path):
+    path = str(tmp_path / 'log.txt')
+    log = logger.Logger(path, format='text', maxRecords=10)
+    def write(thread):
+        for i in range(100):
+            log.log(str(thread) + ' ' + str(i))
+    threads = [threading.Thread(target=write, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.log('no line break', end='')
+    log.close()
+    lines = open(path).read().split('\n')
+    assert lines[-1] == 'no line break'
+    for thread in range(4):
+        # the records of each thread stay in order
+        assert [line for line in lines if line.startswith(str(thread) + ' ')] == [str(thread) + ' ' + str(i) for i in range(100)]
+    log.log('after closing')
+    assert open(path).read().split('\n')[-1] == 'no line break'
+
+def test_capturedRecords(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    main = logger.Logger(path)
+    worker = logger.Logger(run=main.run)
+    worker.log('In worker', file='a.csv')
+    records = worker.records()
+    assert worker.records() == []
+    main.extend(records)
+    main.close()
+    record = json.loads(open(path).read())
+    assert record['message'] == 'In worker' and record['run'] == main.run
+
+def test_writtenAtExit(tmp_path):
+    # the records are written when the program exits without closing the logger
+    path = str(tmp_path / 'log.jsonl')
+    script = 'import logger\nlog = logger.Logger(%r, flushInterval=60)\nlog.log("Before exit")\n' % path
+    subprocess.run([sys.executable, '-c', script], check=True, cwd=os.path.dirname(logger.__file__))
+    assert json.loads(open(path).read())['message'] == 'Before exit'
+
+def test_workerErrorKeepsLog(monkeypatch):
+    def failing(*arguments):
+        input.log('Training', file='a.csv')
+        raise ValueError('Invalid motion')
+    monkeypatch.setattr(learning, 'learnMotion', failing)
+    with pytest.raises(ValueError) as error:
+        learning.learnMotionInWorker('folder', 1, 3, 2, '', '', '', '', 'test')
+    assert [record['message'] for record in error.value.logRecords] == ['Training']
+    assert input.activeLogger is None
@@ -0,0 +1,92 @@
+# Tests of the store of trained models ('modelStore'), used by
+# 'learning.learnMotions'.
+#
+
+import os
+import shutil
+import numpy
+import pytest
+import learning
+import modelStore
+
+translate, rotate, scale = 'median', 'mean', 'largest'
+
+@pytest.fixture
+def store(smallData, tmp_path, training, monkeypatch):
+    """!
+    @return A copy of the small data set (which can be changed), and the list of
+    the motion types and initial models of each training
+    """
+    data = str(tmp_path / 'data')
+    shutil.copytree(smallData, data)
+    modelStore.setStoreDirectory(str(tmp_path / 'store'))
+    trained = []
+    learnMotion = learning.learnMotion
+    def counting(folder, *arguments):
+        trained.append((os.path.basename(os.path.dirname(folder)), arguments[8] if len(arguments) > 8 else None))
+        return learnMotion(folder, *arguments)
+    monkeypatch.setattr(learning, 'learnMotion', counting)
+    return data, trained
+
+def changeFile(data, motion):
+    """!
+    Add a pose to the end of the first training file of a motion type.
+    """
+    folder = os.path.join(data, motion, 'training')
+    file = os.path.join(folder, sorted(os.listdir(folder))[0])
+    with open(file) as f:
+        last = f.read().rstrip('\n').split('\n')[-1].split(',')
+    last[0] = str(int(float(last[0])) + 1)
+    last[1] = str(float(last[1]) + 1E-3)
+    with open(file, 'a') as f:
+        f.write('\n' + ','.join(last) + '\n')
+
+def test_saveAndLoad(store):
+    data, _ = store
+    model = learning.learnMotions(1, 3, 2, data, translate, rotate, scale)[0]
+    modelStore.save('test', model)
+    loaded = modelStore.load('test')
+    for name in modelStore.parameterNames:
+        numpy.testing.assert_array_equal(getattr(loaded, name), getattr(model, name))
+    assert modelStore.load('missing') is None
+
+def test_storeHitAndMiss(store):
+    data, trained = store
+    models = learning.learnMotions(1, 3, 2, data, translate, rotate, scale)
+    assert [motion for motion, _ in trained] == ['flipping', 'wiping']
+    # hit: same data and settings
+    again = learning.learnMotions(1, 3, 2, data, translate, rotate, scale)
+    assert len(trained) == 2
+    for model, reference in zip(again, models):
+        numpy.testing.assert_array_equal(model.means_, reference.means_)
+    # miss: other settings
+    learning.learnMotions(1, 3, 3, data, translate, rotate, scale)
+    assert len(trained) == 4
+    # miss for the changed motion type only, with a new initialization
+    changeFile(data, 'wiping')
+    changed = learning.learnMotions(1, 3, 2, data, translate, rotate, scale)
+    assert trained[4:] == [('wiping', None)]
+    numpy.testing.assert_array_equal(changed[0].means_, models[0].means_)
+    # a changed modification time alone is still a hit
+    for root, _, files in os.walk(data):
+        for file in files:
+            os.utime(os.path.join(root, file))
+    learning.learnMotions(1, 3, 2, data, translate, rotate, scale)
+    assert len(trained) == 5
+
+def test_incrementalRefitsChangedMotion(store):
+    data, trained = store
+    models = learning.learnMotions(1, 3, 2, data, translate, rotate, scale)
+    changeFile(data, 'flipping')
+    changed = learning.learnMotions(1, 3, 2, data, translate, rotate, scale, incremental=True)
+    # only the changed motion type is trained, starting from its previous model
+    assert [motion for motion, _ in trained[2:]] == ['flipping']
+    initial = trained[2][1]
+    assert initial is not None
+    for name in modelStore.parameterNames:
+        numpy.testing.assert_array_equal(getattr(changed[1], name), getattr(models[1], name))
+    assert changed[0] is initial
+    assert not numpy.array_equal(changed[0].means_, models[0].means_)
+    # the continued model is stored for the new data
+    learning.learnMotions(1, 3, 2, data, translate, rotate, scale, incremental=True)
+    assert len(trained) == 3
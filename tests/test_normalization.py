@@ -0,0 +1,116 @@
+# Regression tests of the fused normalization ('normalization.normalize' and
+# 'normalization.normalizeBatch') against the original sequential
+# translation, rotation and scaling of each pose.
+#
+
+import numpy
+import pytest
+import normalization
+import rotation
+import input
+
+def hamilton(a, b):
+    """!
+    @return The product of two quaternions (w, x, y, z)
+    """
+    return numpy.array([a[0]*b[0] - a[1]*b[1] - a[2]*b[2] - a[3]*b[3],
+        a[0]*b[1] + a[1]*b[0] + a[2]*b[3] - a[3]*b[2],
+        a[0]*b[2] - a[1]*b[3] + a[2]*b[0] + a[3]*b[1],
+        a[0]*b[3] + a[1]*b[2] - a[2]*b[1] + a[3]*b[0]])
+
+def sequential(motion, translate, rotate, scale):
+    """!
+    Normalize a motion pose by pose, in the order of the original implementation.
+
+    @return The normalized motion (not cleaned) and the normalization parameters
+    """
+    out = motion.copy()
+    positions = out[:,1:4]
+    center = numpy.zeros(3)
+    if 'start' in translate:
+        center = positions[0].copy()
+    elif 'median' in translate:
+        center = numpy.median(positions, axis=0)
+    elif 'mean' in translate:
+        center = numpy.mean(positions, axis=0)
+    elif 'end' in translate:
+        center = positions[-1].copy()
+    for pose in positions:
+        pose -= center
+    reference = rotation.reference(out[:,1:8], rotate)
+    q = reference / numpy.linalg.norm(reference) * [1, -1, -1, -1]
+    inverse = q * [1, -1, -1, -1]
+    for pose in out:
+        pose[1:4] = hamilton(hamilton(q, numpy.concatenate(([0], pose[1:4]))), inverse)[1:]
+        pose[4:8] = hamilton(pose[4:8], q)
+    maximums = numpy.max(positions, axis=0)
+    minimums = numpy.min(positions, axis=0)
+    diff = maximums - minimums
+    factors = numpy.zeros(3)
+    if 'components' in scale:
+        factors = 1 / diff
+    elif 'largest' in scale:
+        factors = numpy.full(3, 1 / numpy.max(diff))
+    elif 'smallest' in scale:
+        factors = numpy.full(3, 1 / numpy.min(diff))
+    if factors.any():
+        c = (maximums + minimums) / 2
+        for pose in positions:
+            pose[:] = c + (pose - c) * factors
+    return out, center, reference, factors
+
+@pytest.mark.parametrize('translate, rotate, scale', [
+    ('', '', ''),
+    ('median', 'mean', 'largest'),
+    ('mean', 'start', 'components'),
+    ('start', 'end', 'smallest'),
+    ('end', 'mean', ''),
+    ('', 'start', 'largest')])
+def test_normalizeMatchesSequential(motions, translate, rotate, scale):
+    for motion in motions:
+        expected, t, r, s = sequential(motion, translate, rotate, scale)
+        out, tr, ro, sc = normalization.normalize(motion, translate, rotate, scale, False, resample='')
+        numpy.testing.assert_allclose(out, expected, rtol=1E-9, atol=1E-9)
+        numpy.testing.assert_allclose(tr, t, rtol=1E-12, atol=1E-12)
+        numpy.testing.assert_allclose(ro, r, rtol=1E-12, atol=1E-12)
+        numpy.testing.assert_allclose(sc, s, rtol=1E-12, atol=1E-12)
+
+def test_normalizeKeepsInput(motions):
+    motion = motions[0]
+    copy = motion.copy()
+    normalization.normalize(motion, 'median', 'mean', 'largest', resample='')
+    numpy.testing.assert_array_equal(motion, copy)
+
+@pytest.mark.parametrize('translate, rotate, scale', [('median', 'mean', 'largest'), ('start', 'end', 'components')])
+def test_normalizeBatchMatchesNormalize(motions, translate, rotate, scale):
+    concatenated, offsets = normalization.concatenate(motions)
+    out, newOffsets, tr, ro, sc = normalization.normalizeBatch(concatenated, offsets, translate, rotate, scale, resample='')
+    for i, normalized in enumerate(normalization.split(out, newOffsets)):
+        expected, t, r, s = normalization.normalize(motions[i], translate, rotate, scale, resample='')
+        numpy.testing.assert_allclose(normalized, expected, rtol=1E-9, atol=1E-9)
+        numpy.testing.assert_allclose(tr[i], t, rtol=1E-9, atol=1E-12)
+        numpy.testing.assert_allclose(ro[i], r, rtol=1E-9, atol=1E-12)
+        numpy.testing.assert_allclose(sc[i], s, rtol=1E-9, atol=1E-12)
+
+@pytest.mark.parametrize('cleaning, resample', [(False, ''), (True, 'frames'), (True, 'arclength')])
+def test_normalizeBatchOptions(motions, cleaning, resample):
+    selected = motions[::4]
+    concatenated, offsets = normalization.concatenate(selected)
+    out = numpy.empty(concatenated.shape)
+    result, newOffsets, tr, ro, sc = normalization.normalizeBatch(concatenated, offsets, 'mean', 'mean', 'largest', cleaning, out=out,
+        resample=resample, samples=30, spacing=0.1)
+    if resample == '' and not cleaning:
+        # the result is written to the given array
+        assert result is out
+    for i, normalized in enumerate(normalization.split(result, newOffsets)):
+        expected = normalization.normalize(selected[i], 'mean', 'mean', 'largest', cleaning, resample=resample, samples=30, spacing=0.1)[0]
+        numpy.testing.assert_allclose(normalized, expected, rtol=1E-9, atol=1E-9)
+
+def test_readNormalizedBatchMatchesNormalize(files):
+    selected = files[::6]
+    motions, tr, ro, sc = normalization.readNormalizedBatch(selected, 'median', 'mean', 'largest', resample='')
+    assert len(motions) == len(selected)
+    for i, file in enumerate(selected):
+        expected, t, r, s = normalization.normalize(input.read(file), 'median', 'mean', 'largest', resample='')
+        numpy.testing.assert_allclose(motions[i], expected, rtol=1E-9, atol=1E-9)
+        numpy.testing.assert_allclose(tr[i], t, rtol=1E-9, atol=1E-12)
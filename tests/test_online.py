@@ -0,0 +1,76 @@
+# Regression tests of the online scoring ('online.OnlineScorer') and of the
+# shared scoring engine against the forward algorithm of hmmlearn.
+#
+
+import numpy
+import pytest
+from hmmlearn import hmm
+import online
+import features
+import normalization
+import learning
+
+def createModel(random, poses, covarianceType, states=4, mix=2):
+    """!
+    Create a model with random parameters near some poses.
+
+    @return The model
+    """
+    n = poses.shape[1]
+    model = hmm.GMMHMM(n_components=states, n_mix=mix, covariance_type=covarianceType, init_params='')
+    model.startprob_ = random.dirichlet(numpy.ones(states))
+    model.transmat_ = random.dirichlet(numpy.ones(states), states)
+    model.weights_ = random.dirichlet(numpy.ones(mix), states)
+    model.means_ = poses[random.randint(0, len(poses), (states, mix))] + random.normal(0, 0.05, (states, mix, n))
+    if covarianceType == 'diag':
+        model.covars_ = random.uniform(0.01, 0.1, (states, mix, n))
+    elif covarianceType == 'spherical':
+        model.covars_ = random.uniform(0.01, 0.1, (states, mix))
+    else:
+        shape = (states, mix) if covarianceType == 'full' else (states,)
+        a = random.normal(0, 0.1, shape + (n, n))
+        model.covars_ = numpy.matmul(a, numpy.swapaxes(a, -1, -2)) + 0.01 * numpy.eye(n)
+    model.n_features = n
+    return model
+
+@pytest.fixture(scope='module')
+def normalized(motions):
+    return [normalization.normalize(motion, 'median', 'mean', 'largest', False, resample='')[0] for motion in motions[::15]]
+
+@pytest.mark.parametrize('covarianceType', ['diag', 'full', 'spherical', 'tied'])
+def test_onlineMatchesHmmlearn(normalized, covarianceType):
+    random = numpy.random.RandomState(len(covarianceType))
+    models = [createModel(random, numpy.concatenate(normalized), covarianceType) for _ in range(3)]
+    for motion in normalized:
+        expected = numpy.array([model.score(motion) for model in models])
+        numpy.testing.assert_allclose(learning.scoreMotion(models, motion), expected, rtol=1E-9)
+        scorer = online.OnlineScorer(models, clean=False, resampling=('', 100, 0.05))
+        for begin in range(0, len(motion), 13):
+            scorer.push(motion[begin:begin + 13])
+        numpy.testing.assert_allclose(scorer.scores(), expected, rtol=1E-9)
+
+def test_onlineWithProjection(normalized):
+    random = numpy.random.RandomState(1)
+    projection = features.Projection([1, 2, 3], True, 4)
+    projection.fit(numpy.concatenate(normalized), [len(motion) for motion in normalized])
+    models = [createModel(random, projection.transform(numpy.concatenate(normalized)), 'diag') for _ in range(3)]
+    for motion in normalized:
+        expected = numpy.array([model.score(projection.transform(motion)) for model in models])
+        scorer = online.OnlineScorer(models, clean=False, resampling=('', 100, 0.05), projection=projection)
+        for begin in range(0, len(motion), 7):
+            scorer.push(motion[begin:begin + 7])
+        numpy.testing.assert_allclose(scorer.scores(), expected, rtol=1E-9)
+
+def test_onlineWindow(normalized):
+    random = numpy.random.RandomState(2)
+    models = [createModel(random, numpy.concatenate(normalized), 'diag') for _ in range(2)]
+    motion = normalized[0]
+    window, stride = 40, 10
+    scorer = online.OnlineScorer(models, clean=False, window=window, stride=stride, resampling=('', 100, 0.05))
+    for begin in range(0, len(motion), stride):
+        scorer.push(motion[begin:begin + stride])
+    # the oldest hypothesis covers the last frames of the window
+    start = scorer.hypotheses[0].start
+    assert len(motion) - window <= start <= len(motion) - window + stride
+    expected = numpy.array([model.score(motion[start:]) for model in models])
+    numpy.testing.assert_allclose(scorer.scores(), expected, rtol=1E-9)
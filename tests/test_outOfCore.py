@@ -0,0 +1,60 @@
+# Regression tests of the out-of-core normalization ('outOfCore.normalizeFile')
+# and of its exact radix selection of the median.
+#
+
+import numpy
+import pytest
+import outOfCore
+import normalization
+import input
+
+@pytest.mark.parametrize('chunkSize, digits', [(1000, 16), (64, 8), (7, 11)])
+def test_orderStatisticsMatchesSort(chunkSize, digits):
+    random = numpy.random.RandomState(chunkSize)
+    data = numpy.empty((5000, 4))
+    data[:,0] = random.normal(0, 1E6, len(data))
+    data[:,1] = numpy.round(random.normal(0, 2, len(data)), 1)
+    data[:,2] = random.uniform(-1E-300, 1E-300, len(data))
+    data[:,3] = random.choice([-0.5, 0.0, 0.25, 3.0], len(data))
+    columns = numpy.repeat(numpy.arange(4), 5)
+    ranks = numpy.tile([0, 1, 2499, 2500, 4999], 4)
+    selected = outOfCore.orderStatistics(data, columns, ranks, chunkSize, digits)
+    ordered = numpy.sort(data, axis=0)
+    numpy.testing.assert_array_equal(selected, ordered[ranks, columns])
+
+@pytest.mark.parametrize('rows', [1, 2, 9, 10])
+def test_medianMatchesNumpy(rows):
+    random = numpy.random.RandomState(rows)
+    data = random.normal(0, 1, (rows, 8))
+    median = outOfCore.translationReference(data, {'rows': rows}, 'median', 3)
+    numpy.testing.assert_allclose(median, numpy.median(data[:,1:4], axis=0), rtol=0, atol=1E-15)
+
+@pytest.mark.parametrize('translate, rotate, scale', [('median', 'mean', 'largest'), ('start', 'end', 'components'), ('mean', '', '')])
+def test_normalizeFileMatchesNormalize(files, tmp_path, translate, rotate, scale):
+    for file in files[::10]:
+        out, tr, ro, sc = outOfCore.normalizeFile(file, str(tmp_path / 'motion.npy'), translate, rotate, scale,
+            chunkSize=50, resampling=('', 100, 0.05))
+        expected, t, r, s = normalization.normalize(input.readBulk(file)[0], translate, rotate, scale, resample='')
+        numpy.testing.assert_allclose(out, expected, rtol=1E-9, atol=1E-9)
+        numpy.testing.assert_allclose(tr, t, rtol=1E-12, atol=1E-12)
+        numpy.testing.assert_allclose(ro, r, rtol=1E-9, atol=1E-9)
+        numpy.testing.assert_allclose(sc, s, rtol=1E-9, atol=1E-9)
+        del out
+
+@pytest.mark.parametrize('clean, resampling', [(False, ('', 100, 0.05)), (True, ('arclength', 100, 0.05)), (True, ('frames', 40, 0.05))])
+def test_normalizeFileWithoutScratch(files, tmp_path, clean, resampling):
+    # the motion is normalized in the output file, no other file is left
+    file = files[3]
+    out, _, _, _ = outOfCore.normalizeFile(file, str(tmp_path / 'motion.npy'), 'median', 'mean', 'largest', clean,
+        chunkSize=50, resampling=resampling)
+    expected = normalization.normalize(input.readBulk(file)[0], 'median', 'mean', 'largest', clean, resample=resampling[0],
+        samples=resampling[1], spacing=resampling[2])[0]
+    numpy.testing.assert_allclose(out, expected, rtol=1E-9, atol=1E-9)
+    del out
+    assert [path.name for path in tmp_path.iterdir()] == ['motion.npy']
+
+def test_normalizeFileWithoutData(tmp_path):
+    (tmp_path / 'empty.csv').write_text('Frame,X\n')
+    with pytest.raises(ValueError):
+        outOfCore.normalizeFile(str(tmp_path / 'empty.csv'), str(tmp_path / 'motion.npy'))
+    assert [path.name for path in tmp_path.iterdir()] == ['empty.csv']
@@ -0,0 +1,62 @@
+# Regression tests of the decimation of the plotted paths ('plot.decimate').
+#
+
+import numpy
+import pytest
+import plot
+import cleaning
+
+def douglasPeucker(points, tolerance):
+    """!
+    The recursive Ramer-Douglas-Peucker algorithm with a distance tolerance.
+
+    @return The mask of the kept points
+    """
+    keep = numpy.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    parts = [(0, len(points) - 1)]
+    while len(parts) > 0:
+        start, end = parts.pop()
+        if end - start < 2:
+            continue
+        direction = points[end] - points[start]
+        distances = [numpy.linalg.norm(numpy.cross(point - points[start], direction)) / numpy.linalg.norm(direction)
+            for point in points[start + 1:end]]
+        i = int(numpy.argmax(distances))
+        if distances[i] > tolerance:
+            keep[start + 1 + i] = True
+            parts.extend([(start, start + 1 + i), (start + 1 + i, end)])
+    return keep
+
+@pytest.fixture(scope='module')
+def paths(motions):
+    return [cleaning.removeDoublePoints(motion)[0][:,1:4] for motion in motions[::5]]
+
+def test_decimateKeepsShortPaths(paths):
+    for path in paths:
+        assert plot.decimate(path, 0) is path
+        assert plot.decimate(path, len(path)) is path
+
+@pytest.mark.parametrize('tolerance', [0.001, 0.01, 0.05])
+def test_decimateMatchesDouglasPeucker(paths, tolerance):
+    for path in paths:
+        expected = path[douglasPeucker(path, tolerance)]
+        numpy.testing.assert_array_equal(plot.decimate(path, len(path) - 1, tolerance), expected)
+
+def test_decimateBudget(paths):
+    for path in paths:
+        previous = None
+        for budget in (2, 10, 50):
+            decimated = plot.decimate(path, budget)
+            assert len(decimated) == budget
+            numpy.testing.assert_array_equal(decimated[[0, -1]], path[[0, -1]])
+            # the points of a smaller budget are kept with a larger one, in the order of the path
+            rows = numpy.flatnonzero((path[:, None] == decimated[None]).all(axis=2).any(axis=1))
+            assert len(rows) == budget
+            if previous is not None:
+                assert set(previous) <= set(rows)
+            previous = rows
+
+def test_decimateStraightLine():
+    line = numpy.outer(numpy.linspace(0, 1, 100), [1.0, 2.0, 3.0])
+    numpy.testing.assert_array_equal(plot.decimate(line, 10, 1E-9), line[[0, -1]])
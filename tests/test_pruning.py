@@ -0,0 +1,53 @@
+# Tests of the pruned scoring ('learning.scoreMotionPruned') against scoring
+# with all models.
+#
+
+import numpy
+import pytest
+import learning
+import normalization
+from test_online import createModel
+
+@pytest.fixture(scope='module')
+def normalized(motions):
+    return [normalization.normalize(motion, 'median', 'mean', 'largest', resample='')[0] for motion in motions[::9]]
+
+@pytest.fixture(scope='module')
+def models(normalized):
+    random = numpy.random.RandomState(3)
+    return [createModel(random, numpy.concatenate(normalized), 'diag') for _ in range(6)]
+
+@pytest.mark.parametrize('prefix, decimate', [(0.25, 0), (0.5, 0), (0.25, 4)])
+def test_prunedMatchesFullRanking(normalized, models, prefix, decimate):
+    for motion in normalized:
+        full = numpy.array([model.score(motion) for model in models])
+        part = motion[::decimate] if decimate > 1 else motion[:max(1, int(round(len(motion) * prefix)))]
+        first = numpy.array([model.score(part) for model in models])
+        margin = numpy.sort(first)[-1] - numpy.sort(first)[-3] + 1E-6
+        scores = learning.scoreMotionPruned(models, motion, margin, prefix, decimate)
+        # the models within the margin of the first stage keep their full scores
+        survivors = first >= numpy.max(first) - margin
+        assert numpy.count_nonzero(survivors) >= 3
+        numpy.testing.assert_allclose(scores[survivors], full[survivors], rtol=1E-9)
+        assert numpy.all(numpy.isneginf(scores[~survivors]))
+        # the surviving models are ranked as with the full scores
+        order = numpy.argsort(-full)
+        numpy.testing.assert_array_equal(numpy.argsort(-scores)[:numpy.count_nonzero(survivors)], order[survivors[order]])
+        # without a limit, all models are scored
+        numpy.testing.assert_allclose(learning.scoreMotionPruned(models, motion, numpy.inf, prefix, decimate), full, rtol=1E-9)
+
+def test_pruningStatistics(normalized, models):
+    learning.setPruning(margin=1E-9, compare=True)
+    try:
+        changed = 0
+        for motion in normalized:
+            scores = learning.scoreMotion(models, motion)
+            full = numpy.array([model.score(motion) for model in models])
+            changed += int(numpy.argmax(scores) != numpy.argmax(full))
+        statistics = dict(learning.pruningStatistics)
+    finally:
+        learning.setPruning()
+    assert statistics['motions'] == statistics['compared'] == len(normalized)
+    assert statistics['scores'] == len(normalized) * len(models)
+    assert statistics['pruned'] == len(normalized) * (len(models) - 1)
+    assert statistics['changed'] == changed
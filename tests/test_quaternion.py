@@ -0,0 +1,56 @@
+# Tests of the vectorized quaternion operations ('quaternion') against
+# products and rotations of single quaternions.
+#
+
+import numpy
+import pytest
+import quaternion
+
+def multiplyOne(a, b):
+    """!
+    @return The Hamilton product of two quaternions, written out term by term
+    """
+    w1, x1, y1, z1 = a
+    w2, x2, y2, z2 = b
+    return numpy.array([
+        w1*w2 - x1*x2 - y1*y2 - z1*z2,
+        w1*x2 + x1*w2 + y1*z2 - z1*y2,
+        w1*y2 - x1*z2 + y1*w2 + z1*x2,
+        w1*z2 + x1*y2 - y1*x2 + z1*w2])
+
+def rotateOne(q, v):
+    """!
+    @return A vector rotated as the product q * (0,v) * conjugate(q) of a unit quaternion
+    """
+    q = q / numpy.linalg.norm(q)
+    return multiplyOne(multiplyOne(q, numpy.concatenate(([0.0], v))), q * [1, -1, -1, -1])[1:]
+
+@pytest.fixture(scope='module')
+def random():
+    return numpy.random.RandomState(0)
+
+def test_multiplyMatchesProduct(random):
+    a = random.normal(0, 1, (50, 4))
+    b = random.normal(0, 1, (50, 4))
+    expected = numpy.array([multiplyOne(p, q) for p, q in zip(a, b)])
+    numpy.testing.assert_allclose(quaternion.multiply(a, b), expected, rtol=1E-12, atol=1E-14)
+    # a single quaternion is broadcast against all rows
+    numpy.testing.assert_allclose(quaternion.multiply(a, b[0]), [multiplyOne(p, b[0]) for p in a], rtol=1E-12, atol=1E-14)
+    numpy.testing.assert_allclose(a.dot(quaternion.productMatrix(b[0])), quaternion.multiply(a, b[0]), rtol=1E-12, atol=1E-14)
+
+def test_inverse(random):
+    q = random.normal(0, 1, (50, 4))
+    identity = numpy.zeros((50, 4))
+    identity[:,0] = 1
+    numpy.testing.assert_allclose(quaternion.multiply(q, quaternion.inverse(q)), identity, atol=1E-12)
+    unit = quaternion.normalized(q)
+    numpy.testing.assert_allclose(quaternion.norm(unit), 1, rtol=1E-12)
+    numpy.testing.assert_allclose(quaternion.inverse(unit), quaternion.conjugate(unit), rtol=1E-12, atol=1E-14)
+
+def test_rotateMatchesProduct(random):
+    q = random.normal(0, 1, (50, 4))
+    v = random.normal(0, 1, (50, 3))
+    expected = numpy.array([rotateOne(p, u) for p, u in zip(q, v)])
+    numpy.testing.assert_allclose(quaternion.rotate(q, v), expected, rtol=1E-9, atol=1E-12)
+    for p in q[:5]:
+        numpy.testing.assert_allclose(v.dot(quaternion.toMatrix(p).T), quaternion.rotate(p, v), rtol=1E-9, atol=1E-12)
@@ -0,0 +1,68 @@
+# Regression tests of the temporal resampling ('resampling.resample',
+# 'resampling.resampleBatch' and 'resampling.PathResampler').
+#
+
+import numpy
+import pytest
+import resampling
+import normalization
+
+def alongPath(positions, spacing):
+    """!
+    Walk along a path segment by segment, and take a point every 'spacing'.
+
+    @return The points
+    """
+    points = [positions[0]]
+    travelled = 0.0
+    target = spacing
+    for a, b in zip(positions[:-1], positions[1:]):
+        step = numpy.linalg.norm(b - a)
+        while step > 0 and target <= travelled + step:
+            points.append(a + (target - travelled) / step * (b - a))
+            target += spacing
+        travelled += step
+    return numpy.array(points)
+
+@pytest.fixture(scope='module')
+def normalized(motions):
+    return [normalization.normalize(motion, 'median', 'mean', 'largest', resample='')[0] for motion in motions[::7]]
+
+@pytest.mark.parametrize('spacing', [0.05, 0.2])
+def test_arclengthMatchesWalk(normalized, spacing):
+    for motion in normalized:
+        out = resampling.resample(motion, 'arclength', spacing=spacing)
+        numpy.testing.assert_allclose(out[:,1:4], alongPath(motion[:,1:4], spacing), rtol=1E-9, atol=1E-9)
+        numpy.testing.assert_array_equal(out[:,0], numpy.arange(1, len(out) + 1))
+        numpy.testing.assert_allclose(numpy.linalg.norm(out[:,4:8], axis=1), 1, rtol=1E-6)
+
+def test_framesMatchesInterpolation(normalized):
+    for motion in normalized:
+        out = resampling.resample(motion, 'frames', samples=50)
+        assert len(out) == 50
+        index = numpy.linspace(0, len(motion) - 1, 50)
+        for column in range(1, 4):
+            numpy.testing.assert_allclose(out[:,column], numpy.interp(index, numpy.arange(len(motion)), motion[:,column]),
+                rtol=1E-9, atol=1E-12)
+        numpy.testing.assert_allclose(out[[0, -1], 1:], motion[[0, -1], 1:], rtol=1E-9, atol=1E-12)
+
+@pytest.mark.parametrize('mode', ['frames', 'arclength'])
+def test_resampleBatchMatchesResample(normalized, mode):
+    concatenated, offsets = normalization.concatenate(normalized)
+    out, newOffsets = resampling.resampleBatch(concatenated, offsets, mode, 40, 0.1)
+    for i, resampled in enumerate(normalization.split(out, newOffsets)):
+        numpy.testing.assert_allclose(resampled, resampling.resample(normalized[i], mode, 40, 0.1), rtol=1E-9, atol=1E-12)
+
+def test_pathResamplerMatchesResample(normalized):
+    for motion in normalized:
+        resampler = resampling.PathResampler(0.05)
+        parts = [resampler.push(motion[begin:begin + 11]) for begin in range(0, len(motion), 11)]
+        numpy.testing.assert_allclose(numpy.concatenate(parts), resampling.resample(motion, 'arclength', spacing=0.05),
+            rtol=1E-9, atol=1E-9)
+
+def test_resampleWithoutMovement():
+    motion = numpy.tile([0, 1.0, 2.0, 3.0, 1.0, 0.0, 0.0, 0.0], (5, 1))
+    motion[:,0] = numpy.arange(5)
+    out = resampling.resample(motion, 'arclength')
+    assert len(out) == 1
+    numpy.testing.assert_array_equal(out[0,1:], motion[0,1:])
@@ -0,0 +1,107 @@
+# Regression tests of the recognition results ('results.Results').
+#
+
+import numpy
+import results
+
+def randomResults(seed, classes=4, variations=('training', 'testing', 'rotated')):
+    """!
+    @return Results with random scores, where the last motion type has no files
+    """
+    random = numpy.random.RandomState(seed)
+    collected = results.Results(['class' + str(i) for i in range(classes)])
+    for motion in range(classes - 1):
+        for variation in variations:
+            count = random.randint(1, 6)
+            scores = random.normal(-1000, 100, (count, classes))
+            scores[:, motion] += random.normal(100, 100, count)
+            collected.add(motion, variation, ['file' + str(i) for i in range(count)], scores,
+                random.rand(count, 3), random.rand(count, 4), random.rand(count, 3))
+    return collected
+
+def test_summaryMatchesLoop():
+    collected = randomResults(0)
+    summary = collected.summary()
+    arrays = collected.arrays()
+    classes, variations = len(collected.classNames), len(collected.variationNames)
+    confusion = numpy.zeros((classes, classes), dtype=int)
+    counts = numpy.zeros((classes, variations), dtype=int)
+    hits = numpy.zeros((classes, variations), dtype=int)
+    for motion, variation, scores in zip(arrays['motion'], arrays['variation'], arrays['scores']):
+        predicted = int(numpy.argmax(scores))
+        confusion[motion, predicted] += 1
+        counts[motion, variation] += 1
+        hits[motion, variation] += predicted == motion
+    numpy.testing.assert_array_equal(summary['confusion'], confusion)
+    numpy.testing.assert_array_equal(summary['classVariationCounts'], counts)
+    numpy.testing.assert_array_equal(summary['classCounts'], numpy.sum(counts, axis=1))
+    numpy.testing.assert_array_equal(summary['variationCounts'], numpy.sum(counts, axis=0))
+    assert summary['accuracy'] == numpy.trace(confusion) / numpy.sum(confusion)
+    for motion in range(classes - 1):
+        assert summary['classAccuracy'][motion] == confusion[motion, motion] / numpy.sum(confusion[motion])
+        for variation in range(variations):
+            assert summary['classVariationAccuracy'][motion, variation] == hits[motion, variation] / counts[motion, variation]
+    for variation in range(variations):
+        assert summary['variationAccuracy'][variation] == numpy.sum(hits[:, variation]) / numpy.sum(counts[:, variation])
+    for i, scores in enumerate(arrays['scores']):
+        ordered = numpy.sort(scores)
+        motion = arrays['motion'][i]
+        assert summary['margins'][i] == ordered[-1] - ordered[-2]
+        assert summary['trueMargins'][i] == scores[motion] - numpy.max(numpy.delete(scores, motion))
+
+def test_summaryWithoutFiles():
+    summary = randomResults(1).summary()
+    # the last motion type has no files
+    assert summary['classCounts'][-1] == 0
+    assert numpy.isnan(summary['classAccuracy'][-1])
+    assert numpy.all(numpy.isnan(summary['classVariationAccuracy'][-1]))
+    assert not numpy.any(numpy.isnan(summary['classAccuracy'][:-1]))
+    empty = results.Results(['a', 'b']).summary()
+    assert numpy.isnan(empty['accuracy'])
+    assert empty['confusion'].shape == (2, 2)
+    numpy.testing.assert_array_equal(empty['classCounts'], [0, 0])
+
+def test_saveAndLoad(tmp_path):
+    collected = randomResults(2)
+    collected.save(str(tmp_path / 'results.npz'))
+    loaded = results.load(str(tmp_path / 'results.npz'))
+    assert loaded.classNames == collected.classNames
+    assert loaded.variationNames == collected.variationNames
+    for name, array in collected.arrays().items():
+        numpy.testing.assert_array_equal(loaded.arrays()[name], array)
+    with numpy.load(str(tmp_path / 'results.npz')) as data:
+        numpy.testing.assert_array_equal(data['classVariationCounts'], collected.summary()['classVariationCounts'])
+
+def csvLine(collected, arrays, i):
+    """!
+    Format a line of the csv file value by value, as in the original implementation.
+
+    @return The line
+    """
+    motion = arrays['motion'][i]
+    t, r, s = arrays['translation'][i], arrays['rotation'][i], arrays['scaling'][i]
+    line = collected.classNames[motion] + ',' + collected.variationNames[arrays['variation'][i]] + ',{:<20},'.format(arrays['names'][i])
+    line += "{:8.3f},{:8.3f},{:8.3f}".format(t[0], t[1], t[2])
+    line += ",{:8.3f},{:8.3f},{:8.3f},{:8.3f}".format(r[0], r[1], r[2], r[3])
+    line += ",{:8.3f},{:8.3f},{:8.3f}".format(s[0], s[1], s[2])
+    for score in arrays['scores'][i]:
+        if numpy.isfinite(score):
+            line += ",{:7d}".format(int(score))
+        else:
+            line += ",{:>7}".format(str(score))
+    predicted = arrays['predicted'][i]
+    return line + ',' + collected.classNames[predicted] + ',' + str(predicted == motion)
+
+def test_writeCsv(tmp_path):
+    collected = randomResults(3)
+    # scores of pruned models, and scores which are cut to zero
+    collected.add(0, 'testing', ['pruned', 'small'], numpy.array([[-5.0, -numpy.inf, numpy.nan, -numpy.inf], [-0.4, 0.4, -1.6, -12.0]]),
+        numpy.zeros((2, 3)), numpy.ones((2, 4)), numpy.zeros((2, 3)))
+    collected.writeCsv(str(tmp_path / 'scores.csv'))
+    with open(str(tmp_path / 'scores.csv')) as f:
+        lines = f.read().splitlines()
+    arrays = collected.arrays()
+    assert len(lines) == len(arrays['names']) + 1
+    assert lines[0].split(',')[13:] == collected.classNames + ['Recognized', 'Correct']
+    for i, line in enumerate(lines[1:]):
+        assert line == csvLine(collected, arrays, i)
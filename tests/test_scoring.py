@@ -0,0 +1,41 @@
+# Tests of the scoring of motions with all models at once
+# ('scoring.ScoringEngine') against the scores of hmmlearn.
+#
+
+import numpy
+import pytest
+import scoring
+import normalization
+from test_online import createModel
+
+@pytest.fixture(scope='module')
+def normalized(motions):
+    return [normalization.normalize(motion, 'median', 'mean', 'largest', resample='')[0] for motion in motions[::12]]
+
+@pytest.fixture(scope='module')
+def models(normalized):
+    # different covariance types and numbers of states and mixtures in one engine
+    random = numpy.random.RandomState(4)
+    poses = numpy.concatenate(normalized)
+    return [createModel(random, poses, covarianceType, states, mix) for covarianceType, states, mix in
+        [('diag', 4, 2), ('full', 3, 1), ('spherical', 5, 3), ('tied', 2, 2), ('diag', 1, 1)]]
+
+def test_scoreMatchesHmmlearn(normalized, models):
+    engine = scoring.ScoringEngine(models)
+    assert len(engine) == len(models)
+    for motion in normalized:
+        numpy.testing.assert_allclose(engine.score(motion), [model.score(motion) for model in models], rtol=1E-9)
+
+def test_scoreBatchMatchesHmmlearn(normalized, models):
+    # small blocks, so that the emissions are calculated in several steps
+    engine = scoring.ScoringEngine(models, blockSize=5000)
+    X, _ = normalization.concatenate(normalized)
+    scores = engine.score(X, [len(motion) for motion in normalized])
+    expected = [[model.score(motion) for model in models] for motion in normalized]
+    numpy.testing.assert_allclose(scores, expected, rtol=1E-9)
+
+def test_scoreSubsetOfModels(normalized, models):
+    engine = scoring.ScoringEngine(models)
+    for motion in normalized[:3]:
+        numpy.testing.assert_allclose(engine.score(motion, models=[3, 0]), [models[3].score(motion), models[0].score(motion)], rtol=1E-9)
+    assert list(engine.subsets) == [(3, 0)]
@@ -0,0 +1,150 @@
+# Tests of the local recognition service ('service.RecognitionService' and
+# its HTTP server).
+#
+
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+import numpy
+import pytest
+from hmmlearn import hmm
+import service
+import learning
+import modelStore
+import normalization
+import input
+
+translate, rotate, scale = 'median', 'mean', 'largest'
+
+def randomModel(random, poses, states=3, mix=2):
+    """!
+    @return A model with random parameters near some poses
+    """
+    model = hmm.GMMHMM(n_components=states, n_mix=mix, covariance_type='diag', init_params='')
+    model.startprob_ = random.dirichlet(numpy.ones(states))
+    model.transmat_ = random.dirichlet(numpy.ones(states), states)
+    model.weights_ = random.dirichlet(numpy.ones(mix), states)
+    model.means_ = poses[random.randint(0, len(poses), (states, mix))]
+    model.covars_ = random.uniform(0.01, 0.1, (states, mix, poses.shape[1]))
+    model.n_features = poses.shape[1]
+    return model
+
+@pytest.fixture(scope='module')
+def models(motions):
+    random = numpy.random.RandomState(0)
+    poses = numpy.concatenate([normalization.normalize(motion, translate, rotate, scale, resample='')[0] for motion in motions[::20]])
+    return [randomModel(random, poses) for _ in range(3)]
+
+@pytest.fixture
+def server(models):
+    recognition = service.RecognitionService(models, ['a', 'b', 'c'], translate, rotate, scale, batchWindow=0.05,
+        resampling=('', 100, 0.05))
+    httpServer = service.createServer(recognition, port=0)
+    thread = threading.Thread(target=httpServer.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:' + str(httpServer.server_address[1])
+    httpServer.shutdown()
+    httpServer.server_close()
+
+def post(url, content, contentType, headers={}):
+    """!
+    @return The status and the strictly parsed json response of a request
+    """
+    request = urllib.request.Request(url + '/score', data=content, headers=dict(headers, **{'Content-Type': contentType}))
+    try:
+        with urllib.request.urlopen(request) as response:
+            status, body = response.status, response.read()
+    except urllib.error.HTTPError as error:
+        status, body = error.code, error.read()
+    def invalid(constant):
+        raise ValueError('Invalid json constant ' + constant)
+    return status, json.loads(body, parse_constant=invalid)
+
+def expectedScores(models, motion):
+    normalized = normalization.normalize(motion, translate, rotate, scale, resample='')[0]
+    return numpy.array([model.score(normalized) for model in models])
+
+def test_scoreCsv(server, models, files):
+    with open(files[0], 'rb') as f:
+        content = f.read()
+    status, result = post(server, content, 'text/csv')
+    assert status == 200
+    expected = expectedScores(models, input.parse(content)[0])
+    numpy.testing.assert_allclose([result['scores'][name] for name in 'abc'], expected, rtol=1E-9)
+    assert result['recognized'] == 'abc'[int(numpy.argmax(expected))]
+    assert len(result['rotation']) == 4
+
+def test_scoreNpyAndRaw(server, models, motions):
+    motion = motions[30]
+    buffer = io.BytesIO()
+    numpy.save(buffer, motion)
+    expected = expectedScores(models, motion)
+    status, result = post(server, buffer.getvalue(), 'application/x-npy')
+    assert status == 200
+    numpy.testing.assert_allclose([result['scores'][name] for name in 'abc'], expected, rtol=1E-9)
+    status, result = post(server, motion.tobytes(), 'application/octet-stream', {'X-Columns': str(motion.shape[1])})
+    assert status == 200
+    numpy.testing.assert_allclose([result['scores'][name] for name in 'abc'], expected, rtol=1E-9)
+
+def test_invalidMotion(server):
+    status, result = post(server, b'1,2,3\n', 'text/csv')
+    assert status == 400
+    assert 'error' in result
+
+def test_stats(server, motions):
+    buffer = io.BytesIO()
+    numpy.save(buffer, motions[0])
+    for _ in range(3):
+        post(server, buffer.getvalue(), 'application/x-npy')
+    post(server, b'x', 'text/csv')
+    with urllib.request.urlopen(server + '/stats') as response:
+        stats = json.loads(response.read())
+    assert stats['requests'] == 4
+    assert stats['errors'] == 1
+    assert 0 <= stats['p50'] <= stats['p99'] <= stats['max']
+
+def test_concurrentRequestsAreBatched(server, models, motions):
+    selected = motions[::10]
+    results = [None] * len(selected)
+    def send(i):
+        buffer = io.BytesIO()
+        numpy.save(buffer, selected[i])
+        results[i] = post(server, buffer.getvalue(), 'application/x-npy')
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(len(selected))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for motion, (status, result) in zip(selected, results):
+        assert status == 200
+        numpy.testing.assert_allclose([result['scores'][name] for name in 'abc'], expectedScores(models, motion), rtol=1E-9)
+    with urllib.request.urlopen(server + '/stats') as response:
+        stats = json.loads(response.read())
+    assert stats['requests'] == len(selected)
+    assert stats['batches'] < len(selected)
+
+def test_prunedScoresAreNull(server, files):
+    learning.setPruning(margin=1E-9)
+    try:
+        with open(files[0], 'rb') as f:
+            status, result = post(server, f.read(), 'text/csv')
+    finally:
+        learning.setPruning()
+    assert status == 200
+    assert sum(score is None for score in result['scores'].values()) == 2
+    assert result['scores'][result['recognized']] is not None
+
+def test_storedModelsAndNames(smallData, tmp_path, training):
+    modelStore.setStoreDirectory(str(tmp_path))
+    with pytest.raises(ValueError):
+        learning.loadStoredModels(1, 3, 2, translate, rotate, scale)
+    trained = learning.learnMotions(1, 3, 2, smallData, translate, rotate, scale)
+    loaded = learning.loadStoredModels(1, 3, 2, translate, rotate, scale)
+    for a, b in zip(trained, loaded):
+        numpy.testing.assert_array_equal(a.means_, b.means_)
+    configuration = learning.trainingConfiguration(1, 3, 2, translate, rotate, scale)
+    assert modelStore.loadModelSet(configuration)['names'] == ['flipping', 'wiping']
+    with pytest.raises(ValueError):
+        learning.loadStoredModels(1, 3, 3, translate, rotate, scale)
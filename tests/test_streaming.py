@@ -0,0 +1,31 @@
+# Tests of the normalization of motion streams ('streaming.StreamingNormalizer').
+#
+
+import numpy
+import streaming
+import normalization
+
+def test_wholeMotionMatchesNormalize(motions):
+    for motion in motions[::15]:
+        expected, t, r, s = normalization.normalize(motion, 'median', 'mean', 'largest', False, resample='')
+        normalizer = streaming.StreamingNormalizer('median', 'mean', 'largest', clean=False, medianSamples=len(motion),
+            resampling=('', 100, 0.05))
+        numpy.testing.assert_allclose(normalizer.push(motion), expected, rtol=1E-9, atol=1E-12)
+        numpy.testing.assert_allclose(normalizer.parameters()[0], t, rtol=1E-12)
+
+def test_medianInterval(motions, monkeypatch):
+    calls = []
+    median = numpy.median
+    def counting(*arguments, **keywords):
+        calls.append(1)
+        return median(*arguments, **keywords)
+    monkeypatch.setattr(numpy, 'median', counting)
+    motion = motions[0]
+    normalizer = streaming.StreamingNormalizer('median', clean=False, medianInterval=10, resampling=('', 100, 0.05))
+    for frame in motion:
+        normalizer.push(frame)
+    # one calculation for the first frame, then one every 10 frames
+    assert len(calls) == 1 + (len(motion) - 1) // 10
+    # the median is calculated again at the end of the next interval
+    normalizer.push(motion[:10])
+    numpy.testing.assert_allclose(normalizer.parameters()[0], median(numpy.vstack((motion, motion[:10]))[:,1:4], axis=0))